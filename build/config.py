@@ -1,15 +1,27 @@
 import os
 from dataclasses import dataclass
 
-from agents import OpenAIChatCompletionsModel, AsyncOpenAI
+from agents import OpenAIChatCompletionsModel, AsyncOpenAI, Model
 from agents.extensions.models.litellm_model import LitellmModel
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from dotenv import load_dotenv
 load_dotenv("build/.env")
 
+from build.embedding import load_embedding_model
 from src.logger import logger
 
+
+def load_llm_tiers(names: str, client: AsyncOpenAI | None, anthropic_key: str | None) -> list[tuple[str, Model]]:
+    """Comma separated model names, cheapest first -> [(name, model)]: `claude-*` via LiteLLM, the rest via `client`"""
+    tiers = []
+    for name in (n.strip() for n in names.split(",") if n.strip()):
+        if name.startswith("claude"):
+            tiers.append((name, LitellmModel(model=name, api_key=anthropic_key)))
+        else:
+            tiers.append((name, OpenAIChatCompletionsModel(model=name, openai_client=client)))
+    return tiers
+
+
 @dataclass
 class Config:
     """Dataclass for singleton configurations"""
@@ -25,11 +37,114 @@ class Config:
     italy_bbox = [6.6, 36.6, 18.5, 47.1]
     DEFAULT_BOX = italy_bbox
 
-    QCLIENT = QdrantClient(url="localhost:6333")
+    QDRANT_HOST = "localhost"
+    QDRANT_PORT = 6333
+    QDRANT_GRPC_PORT = 6334
+    QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+
+    QCLIENT = QdrantClient(
+        host=QDRANT_HOST, port=QDRANT_PORT, grpc_port=QDRANT_GRPC_PORT, prefer_grpc=QDRANT_PREFER_GRPC
+    )
+    AQCLIENT = AsyncQdrantClient(
+        host=QDRANT_HOST, port=QDRANT_PORT, grpc_port=QDRANT_GRPC_PORT, prefer_grpc=QDRANT_PREFER_GRPC
+    )
+
+    # retrieval backend: "qdrant" or "numpy" (in-process exact cosine, no qdrant needed)
+    RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "qdrant")
+    NUMPY_INDEX_DIR = "data/cache/index"
+    RETRIEVAL_MIN_SCORE = 0.5 # cosine threshold for few-shot examples
+
+    # hybrid retrieval (opt-in): dense cosine fused with a local BM25 index per collection (nl + sql)
+    RETRIEVAL_HYBRID = os.getenv("RETRIEVAL_HYBRID", "false").lower() == "true"
+    HYBRID_ALPHA = 0.7 # weight of the dense score, 1 - alpha goes to the normalized BM25 score
+    HYBRID_CANDIDATES = 3 # candidates per retriever = top_k * HYBRID_CANDIDATES
+    HYBRID_MIN_SCORE = 0.4 # threshold on the fused score
+
+    # few-shot KB: `.sql` files and/or directories of `.sql` files, parsed once and cached
+    KB_SOURCES = ["sql/queries_example.sql", "sql/kb"]
+
+    # self-growing KB (opt-in): validated (question, sql) pairs of self-contained questions, written in background
+    KB_LEARNING = os.getenv("KB_LEARNING", "false").lower() == "true"
+    LEARNED_COLLECTION = "nl_to_sql_learned"
+    KB_DEDUP_THRESHOLD = 0.95 # cosine above which a question is already known
+    KB_WRITER_BATCH = 32 # pairs embedded/upserted together
+
+    # bulk imported pairs (`qdrant_ingestion --bulk-import`): own collection, untouched by the syncs with the local KB
+    BULK_COLLECTION = "nl_to_sql_bulk"
+    KB_BULK = os.getenv("KB_BULK", "false").lower() == "true" # retrieve examples from it too
+
+    # schema RAG: getMetadata returns the top columns (+ join keys) instead of whole tables
+    METADATA_MODE = os.getenv("METADATA_MODE", "relevant") # "relevant" or "full"
+    SCHEMA_COLLECTION = "schema_columns"
+    SCHEMA_TOP_K = 8
     
-    EMBEDDING_MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+    EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+    # embedding backend: "torch", "onnx" (ONNX Runtime) or "onnx-int8" (dynamic int8 quantized graph)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE") # None: the graph for this CPU (cfr. build/embedding.py)
+
+    EMBEDDING_MODEL = load_embedding_model(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_ONNX_INT8_FILE)
+    logger.info(f"Embedding model {EMBEDDING_MODEL_NAME} loaded with `{EMBEDDING_BACKEND}` backend.")
     EMBEDDING_CLIENT = None
     EMBEDDING_DIM = 384
+    EMBEDDING_BATCH_SIZE = 64 # sentences per forward pass
+    QDRANT_UPSERT_BATCH = 256 # points per upsert request
+    QDRANT_SCROLL_PAGE = 1000 # points per scroll page when diffing collections
+    BULK_CHUNK_SIZE = 512 # pairs per worker task in bulk imports (also the resume granularity)
+    BULK_SAVE_EVERY = 20 # numpy backend: chunks between index saves in bulk imports
+
+    # vector quantization for new collections: "none", "scalar" (int8) or "binary"
+    QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")
+    QDRANT_OVERSAMPLING = 2.0 # candidates fetched from quantized vectors, rescored on originals
+
+    # embedding cache: in-memory LRU + memory-mapped float32 store on disk
+    EMBEDDING_CACHE = True
+    EMBEDDING_CACHE_DIR = "data/cache/embeddings"
+    EMBEDDING_CACHE_SIZE = 4096 # vectors kept in memory
+
+    # semantic answer cache in front of the agent pipeline
+    SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = 0.92 # cosine between questions
+    SEMANTIC_CACHE_TTL = 3600 # seconds
+    SEMANTIC_CACHE_SIZE = 512
+
+    # router: simple questions skip the collector -> executor handoff
+    ROUTER = os.getenv("ROUTER", "true").lower() == "true"
+    PREFETCH = os.getenv("PREFETCH", "true").lower() == "true" # examples + schema injected before the first LLM call
+    ROUTER_MAX_WORDS = 20
+    ROUTER_SIMPLE_SCORE = 0.8 # a KB example this close makes the question simple
+
+    # conversation history sent to the model
+    HISTORY_TOKEN_BUDGET = 6000
+    HISTORY_KEEP_TURNS = 3 # last turns kept verbatim
+    HISTORY_MAX_ITEM_TOKENS = 300 # older answers above this are truncated to a handle
+
+    # concurrency limits shared by all the sessions of a process
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+    DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", 8))
+
+    # api server (scripts/server.py)
+    SERVER_MAX_ACTIVE_TURNS = 32 # turns running at once, the others wait in queue
+    SERVER_MAX_QUEUED = 128 # waiting turns beyond this are refused with a 503
+    SERVER_QUEUE_TIMEOUT = 30 # seconds a turn may wait for a slot
+    SERVER_MAX_SESSIONS = 1000
+    SERVER_SESSION_TTL = 1800 # idle seconds before a session is dropped
+    SERVER_DRAIN_TIMEOUT = 60 # seconds granted to running turns on shutdown
+
+    # durable sessions: compacted history persisted by a write-behind store ("sqlite", "postgres" or "none")
+    SESSION_STORE = os.getenv("SESSION_STORE", "sqlite").lower()
+    SESSION_DB_PATH = "data/sessions/sessions.sqlite3"
+    SESSION_FLUSH_INTERVAL = 2.0 # seconds between batched writes
+    SESSION_IDLE_RELEASE = 300 # idle seconds before a session's history is dropped from memory (reloaded on demand)
+    SESSION_RETENTION = 7 * 24 * 3600 # seconds before a stored session is purged
+
+    # telemetry: spans of LLM/tool/handoff calls exported as JSONL + Prometheus text
+    TELEMETRY = os.getenv("TELEMETRY", "true").lower() == "true"
+    TELEMETRY_DIR = "data/telemetry"
+    TELEMETRY_MAX_FILE_BYTES = 10 * 1024 * 1024 # a session file above this is rotated
+    TELEMETRY_MAX_FILES = 500 # oldest exported files beyond this are deleted
+    TELEMETRY_RETENTION = 7 * 24 * 3600 # seconds before an exported file is deleted
 
     # llms config
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -38,6 +153,20 @@ class Config:
     LLM_CLIENT = None
     MODEL = None
 
+    # per-agent model chains, cheapest first (comma separated): each failed `executeQuery` of the turn, and a
+    # low confidence collector report, move the next LLM call one tier up
+    COLLECTOR_MODELS = os.getenv("COLLECTOR_MODELS")
+    EXECUTOR_MODELS = os.getenv("EXECUTOR_MODELS")
+    # USD per 1M tokens: (input, cached input, output)
+    MODEL_PRICES = {
+        "gpt-4o-mini": (0.15, 0.075, 0.60),
+        "gpt-4o": (2.50, 1.25, 10.00),
+        "gpt-4.1-mini": (0.40, 0.10, 1.60),
+        "gpt-4.1": (2.00, 0.50, 8.00),
+        "claude-haiku-4-5-20251001": (1.00, 0.10, 5.00),
+        "claude-sonnet-4-5-20250929": (3.00, 0.30, 15.00),
+    }
+
     if OPENAI_API_KEY:
         LLM_CLIENT = AsyncOpenAI(api_key=OPENAI_API_KEY)
         MODEL = OpenAIChatCompletionsModel(
@@ -45,6 +174,8 @@ class Config:
             openai_client=LLM_CLIENT
         )
         logger.info(f"OpenAI client initialized and model {MODEL.model} set up.")
+        COLLECTOR_MODELS = COLLECTOR_MODELS or "gpt-4o-mini" # formats a report: the small model is enough
+        EXECUTOR_MODELS = EXECUTOR_MODELS or "gpt-4o-mini,gpt-4o" # PostGIS SQL: escalates to the strong one
 
     elif ANTHROPIC_API_KEY:
         MODEL = LitellmModel(
@@ -53,7 +184,26 @@ class Config:
             api_key=ANTHROPIC_API_KEY
             )
         logger.info(f"Anthropic client initialized and model {MODEL.model} set up.")
-        
+        COLLECTOR_MODELS = COLLECTOR_MODELS or "claude-haiku-4-5-20251001"
+        EXECUTOR_MODELS = EXECUTOR_MODELS or "claude-haiku-4-5-20251001,claude-sonnet-4-5-20250929"
+
+    # offline stand-in replaying scripted turns: benchmarks and regression runs without network nor key
+    LLM_OFFLINE = os.getenv("LLM_OFFLINE", "false").lower() == "true"
+    SCRIPTED_MODEL_FILE = os.getenv("SCRIPTED_MODEL_FILE", "test/fixtures/scripted_turns.json")
+
+    if LLM_OFFLINE:
+        from src.sql_agent.utils.scripted_model import ScriptedModel
+        MODEL = ScriptedModel.from_file(SCRIPTED_MODEL_FILE)
+        logger.warning(f"Offline mode: using the scripted model from `{SCRIPTED_MODEL_FILE}`.")
+        COLLECTOR_TIERS = EXECUTOR_TIERS = [(MODEL.model, MODEL)]
+    elif MODEL is None:
+        # no agent can run: `src.sql_agent.agent` refuses to start (embedding/ingestion scripts still work)
+        COLLECTOR_TIERS = EXECUTOR_TIERS = []
+    else:
+        COLLECTOR_TIERS = load_llm_tiers(COLLECTOR_MODELS, LLM_CLIENT, ANTHROPIC_API_KEY)
+        EXECUTOR_TIERS = load_llm_tiers(EXECUTOR_MODELS, LLM_CLIENT, ANTHROPIC_API_KEY)
+        logger.info(f"Model tiers: collector {[n for n, _ in COLLECTOR_TIERS]}, executor {[n for n, _ in EXECUTOR_TIERS]}")
+
             
 # Singleton
 config = Config()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import platform
+from pathlib import Path
+
+from sentence_transformers import SentenceTransformer
+
+from src.logger import logger
+
+# prebuilt int8 graphs in the `onnx/` folder of the sentence-transformers model repos, by instruction set
+INT8_FILES = {
+    "arm64": "onnx/model_qint8_arm64.onnx",
+    "avx512_vnni": "onnx/model_qint8_avx512_vnni.onnx",
+    "avx512": "onnx/model_qint8_avx512.onnx",
+    "avx2": "onnx/model_quint8_avx2.onnx",
+}
+
+
+def int8_file_for_cpu() -> str | None:
+    """Int8 graph matching this CPU (None when there is none, e.g. x86 without AVX2)"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return INT8_FILES["arm64"]
+
+    try:
+        flags = set(Path("/proc/cpuinfo").read_text().split())
+    except OSError: # not Linux: no flags to check
+        return None
+
+    if "avx512_vnni" in flags:
+        return INT8_FILES["avx512_vnni"]
+    if "avx512f" in flags:
+        return INT8_FILES["avx512"]
+    if "avx2" in flags:
+        return INT8_FILES["avx2"]
+    return None
+
+
+def onnx_session_options(threads: int):
+    """ONNX Runtime session on `threads` cores (its default intra-op pool takes all of them)"""
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return options
+
+
+def load_embedding_model(
+        name: str,
+        backend: str="torch",
+        int8_file: str | None=None,
+        *,
+        threads: int | None=None
+    ) -> SentenceTransformer:
+    """Load `name` with the given backend: "torch", "onnx" or "onnx-int8" (CPU only for the onnx ones).
+
+    "onnx-int8" uses `int8_file` or the graph built for this CPU's instruction set, falling back to the float32
+    onnx graph when there is none (an AVX2 graph on a CPU without AVX2 crashes or runs slower than float32).
+    `threads` caps the onnx session threads (torch threads are per process: `torch.set_num_threads`).
+    """
+    onnx_kwargs = {"session_options": onnx_session_options(threads)} if threads else {}
+
+    if backend == "onnx-int8":
+        int8_file = int8_file or int8_file_for_cpu()
+        if int8_file is None:
+            logger.warning("No int8 onnx graph for this CPU, using the float32 one.")
+            backend = "onnx"
+        else:
+            return SentenceTransformer(
+                name, backend="onnx", device="cpu", model_kwargs={"file_name": int8_file, **onnx_kwargs}
+            )
+
+    if backend == "onnx":
+        return SentenceTransformer(name, backend="onnx", device="cpu", model_kwargs=onnx_kwargs or None)
+
+    return SentenceTransformer(name)
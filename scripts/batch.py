@@ -0,0 +1,157 @@
+# Usage: python -m scripts.batch questions.txt --out data/batch/answers.jsonl --concurrency 8
+"""
+Batch NL -> SQL: answers a file of questions (`.txt`, one per line, or `.jsonl` with `question` and optional `id`)
+through the agent pipeline with bounded concurrency, appending one JSON line per question to `--out`:
+    {"id", "question", "sql", "rows", "answer", "route", "seconds", "tokens" (with model tiers and USD cost), "error"}
+
+`rows` is the list of records returned by the final SQL (re-executed when the answer comes from the semantic cache).
+Question embeddings are computed in one batched call up front. Re-running the same command resumes: questions already
+answered in `--out` are skipped (failed ones too, unless `--retry-failed`).
+"""
+import asyncio
+import hashlib
+import json
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from agents import set_tracing_disabled
+set_tracing_disabled(disabled=True)
+
+from src.sql_agent.agent import collector, executor, route_question
+from src.sql_agent.utils.repl import AgentRunner
+from src.sql_agent.utils.semantic_cache import semantic_cache
+from src.sql_agent.rag.kb_writer import kb_writer
+from src.sql_agent.rag.sql_rag import sql_retriever
+from src.sql_agent.tools import fetch_query, get_data_version
+from src.sql_agent.utils.limits import db_slots
+from build.config import config
+from src.logger import logger
+
+
+def question_id(question: str) -> str:
+    return hashlib.sha1(" ".join(question.lower().split()).encode()).hexdigest()[:12]
+
+
+def read_questions(path: str) -> list[dict]:
+    """Distinct questions of the file, in order"""
+    questions = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                row = json.loads(line)
+                question = row["question"].strip()
+                qid = str(row.get("id") or question_id(question))
+            else:
+                question = line.strip()
+                qid = question_id(question)
+            questions.setdefault(qid, {"id": qid, "question": question})
+    return list(questions.values())
+
+
+def read_done(path: Path, *, retry_failed: bool) -> set[str]:
+    if not path.exists():
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError: # truncated last line of an interrupted run
+                continue
+            if not (retry_failed and record.get("error")):
+                done.add(record["id"])
+    return done
+
+
+async def answer(item: dict) -> dict:
+    runner = AgentRunner(
+        starting_agent=collector,
+        enable_cli_prints=False,
+        semantic_cache=semantic_cache if config.SEMANTIC_CACHE else None, # paraphrases in the batch hit it
+        replay_agent=executor,
+        data_version=get_data_version,
+        kb_writer=kb_writer if config.KB_LEARNING else None,
+        router=route_question if config.ROUTER or config.PREFETCH else None,
+    )
+
+    record = {**item, "sql": None, "rows": None, "answer": None, "route": None, "seconds": None, "tokens": None, "error": None}
+    start = time.perf_counter()
+    try:
+        async for event in runner.stream_turn(item["question"]):
+            if event.type == "final":
+                record["answer"] = event.content
+
+        if runner.context.cached_sql is not None: # cached answer: the rows come from the validated SQL
+            record["sql"] = runner.context.cached_sql
+            async with db_slots:
+                df = await asyncio.to_thread(fetch_query, runner.context.cached_sql)
+            record["rows"] = df.to_dict(orient="records")
+        elif runner.context.executed_queries:
+            record["sql"] = runner.context.executed_queries[-1]
+            record["rows"] = runner.context.last_rows
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    record["route"] = next(iter(runner.latencies), None)
+    if runner.turn_usage:
+        usage = runner.turn_usage[-1]
+        record["tokens"] = {k: usage[k] for k in ("input_tokens", "cached_tokens", "output_tokens", "requests", "models", "cost")}
+    if record["error"] is None and record["sql"] is None:
+        record["error"] = "No query executed."
+    return record
+
+
+async def main():
+    parser = ArgumentParser(description="Answer a file of questions with the agent pipeline.")
+    parser.add_argument('questions', help="`.txt` (one question per line) or `.jsonl` file.")
+    parser.add_argument('--out', default=None, help="Output JSONL (default: data/batch/<questions name>.jsonl).")
+    parser.add_argument('--concurrency', type=int, default=4, help="Questions answered at once.")
+    parser.add_argument('--retry-failed', action="store_true", default=False, help="Re-run questions that failed.")
+    args = parser.parse_args()
+
+    out = Path(args.out or f"data/batch/{Path(args.questions).stem}.jsonl")
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    questions = read_questions(args.questions)
+    done = read_done(out, retry_failed=args.retry_failed)
+    todo = [q for q in questions if q["id"] not in done]
+    logger.info(f"{len(questions)} distinct questions, {len(done)} already answered, {len(todo)} to go.")
+    if not todo:
+        return
+
+    if sql_retriever.backend == "qdrant":
+        await sql_retriever.acheck_collection()
+    if config.KB_LEARNING:
+        kb_writer.start()
+
+    # one batched encode instead of one per question: later lookups are embedding cache hits
+    await asyncio.to_thread(sql_retriever.hf_embedder.get_embeddings, [q["question"] for q in todo])
+
+    slots = asyncio.Semaphore(args.concurrency)
+    written, failed, start = 0, 0, time.perf_counter()
+
+    with open(out, "a", encoding="utf-8") as f:
+        async def run(item: dict) -> None:
+            nonlocal written, failed
+            async with slots:
+                record = await answer(item)
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush() # a crash loses at most the running questions
+            written += 1
+            failed += record["error"] is not None
+            logger.info(f"[{written}/{len(todo)}] {record['route']} {record['seconds']}s | {item['question'][:60]}"
+                        + (f" | ERROR {record['error']}" if record["error"] else ""))
+
+        await asyncio.gather(*(run(item) for item in todo))
+
+    kb_writer.stop(timeout=30)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Batch done: {written} answered ({failed} failed) in {elapsed:.1f}s, {written / elapsed:.2f} questions/s -> `{out}`")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,13 +4,20 @@ AI Agent Runner - Execute agents with customizable streaming and input modes
 """
 import argparse
 import asyncio
+import os
 
 from agents.exceptions import MaxTurnsExceeded
 from agents import set_tracing_disabled
 set_tracing_disabled(disabled=True)
 
-from src.sql_agent.agent import collector as agent
+from src.sql_agent.agent import collector as agent, executor, route_question
 from src.sql_agent.utils.repl import AgentRunner
+from src.sql_agent.utils.telemetry import TelemetryHooks, format_summary
+from src.sql_agent.utils.semantic_cache import semantic_cache
+from src.sql_agent.rag.kb_writer import kb_writer
+from src.sql_agent.rag.sql_rag import sql_retriever
+from src.sql_agent.tools import get_data_version
+from build.config import config
 from src.logger import logger
 
 
@@ -49,13 +56,37 @@ async def main():
     logger.info(f"Starting agent: {agent.name}")
     logger.info(f"Input mode: {args.input_mode}")
 
+    # validate the few-shot collection once: searches then skip the existence check
+    if sql_retriever.backend == "qdrant":
+        await sql_retriever.acheck_collection()
+
+    if config.KB_LEARNING:
+        kb_writer.start() # creates the learned collection if missing
+
+    telemetry = TelemetryHooks(session_id=f"cli-{os.getpid()}") if config.TELEMETRY else None
+
     runner = AgentRunner(
         starting_agent=agent,
+        hooks=telemetry,
         input_data_custom=args.input_mode,
         enable_cli_prints=True,
+        semantic_cache=semantic_cache if config.SEMANTIC_CACHE else None,
+        replay_agent=executor,
+        data_version=get_data_version,
+        kb_writer=kb_writer if config.KB_LEARNING else None,
+        router=route_question if config.ROUTER or config.PREFETCH else None,
     )
 
     await runner.run_demo_loop()
+    kb_writer.stop(timeout=30) # flush pending examples
+    logger.info(f"Semantic cache: {semantic_cache.stats()}")
+    logger.info(f"Latency by route: {runner.latency_report()}")
+    logger.info(f"Prompt tokens: {runner.token_report()}")
+    logger.info(f"Model tiers: {runner.tier_report()}")
+    if telemetry is not None and telemetry.spans:
+        logger.info(f"Metrics exported to `{telemetry.export_prometheus()}`")
+        print(format_summary(telemetry.summary()))
+    logger.info(f"Learned examples: {kb_writer.written} written, {kb_writer.duplicates} duplicates")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+# Usage: python -m scripts.loadgen --url http://127.0.0.1:8080 --sessions 50 --concurrency 10 --turns 3
+"""
+Load generator for `scripts.server`: concurrent sessions each sending a few questions over the NDJSON endpoint.
+Reports sessions/s, turns/s, time to first event and turn latency percentiles, 503s and errors.
+"""
+import asyncio
+import json
+import time
+from argparse import ArgumentParser
+
+import httpx
+import numpy as np
+
+QUESTIONS = [
+    "Find scenes covering Rome.",
+    "Show me the clearest images of Milan from the last three months.",
+    "How many scenes are in the catalog?",
+    "Give me the latest scenes with less than 10% clouds.",
+]
+
+
+class Stats:
+    def __init__(self):
+        self.first_event: list[float] = []
+        self.turns: list[float] = []
+        self.sessions = 0
+        self.rejected = 0
+        self.errors = 0
+
+
+async def run_session(client: httpx.AsyncClient, stats: Stats, turns: int, offset: int) -> None:
+    response = await client.post("/sessions")
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+
+    try:
+        for j in range(turns):
+            start = time.perf_counter()
+            first = None
+            async with client.stream(
+                "POST", f"/sessions/{session_id}/messages",
+                json={"message": QUESTIONS[(offset + j) % len(QUESTIONS)]}
+            ) as stream:
+                if stream.status_code == 503:
+                    stats.rejected += 1
+                    continue
+                stream.raise_for_status()
+
+                async for line in stream.aiter_lines():
+                    if not line:
+                        continue
+                    first = first or time.perf_counter() - start
+                    if json.loads(line)["type"] == "error":
+                        stats.errors += 1
+
+            stats.first_event.append(first or 0.0)
+            stats.turns.append(time.perf_counter() - start)
+        stats.sessions += 1
+
+    finally:
+        await client.delete(f"/sessions/{session_id}")
+
+
+async def main():
+    parser = ArgumentParser(description="Load test the Galileo API server.")
+    parser.add_argument('--url', default="http://127.0.0.1:8080")
+    parser.add_argument('--sessions', type=int, default=50, help="Total sessions to run.")
+    parser.add_argument('--concurrency', type=int, default=10, help="Sessions running at once.")
+    parser.add_argument('--turns', type=int, default=3, help="Questions per session.")
+    parser.add_argument('--timeout', type=float, default=300, help="Per request timeout (seconds).")
+    args = parser.parse_args()
+
+    stats = Stats()
+    slots = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        async def bounded(j: int) -> None:
+            async with slots:
+                try:
+                    await run_session(client, stats, args.turns, j)
+                except Exception as e:
+                    stats.errors += 1
+                    print(f"session {j} failed: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(j) for j in range(args.sessions)))
+        elapsed = time.perf_counter() - start
+
+    def pct(values: list[float], q: int) -> float:
+        return float(np.percentile(values, q)) if values else float("nan")
+
+    print(f"\n{stats.sessions}/{args.sessions} sessions in {elapsed:.1f}s -> {stats.sessions / elapsed:.2f} sessions/s, "
+          f"{len(stats.turns) / elapsed:.2f} turns/s")
+    print(f"first event  p50={pct(stats.first_event, 50):.3f}s  p95={pct(stats.first_event, 95):.3f}s  p99={pct(stats.first_event, 99):.3f}s")
+    print(f"turn latency p50={pct(stats.turns, 50):.3f}s  p95={pct(stats.turns, 95):.3f}s  p99={pct(stats.turns, 99):.3f}s")
+    print(f"503 rejected: {stats.rejected} | errors: {stats.errors}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
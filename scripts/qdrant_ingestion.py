@@ -1,24 +1,50 @@
+import os
 from argparse import ArgumentParser
 
-from src.sql_agent.rag.sql_rag import sql_retriever
-
 def main():
     """Main function for sql ingestion on singleton qrant client of `sql_retriever`"""
-    
+    # imported here: the spawned --bulk-import workers re-import this module, and must not build the clients and models
+    from src.sql_agent.rag.sql_rag import sql_retriever
+    from src.sql_agent.rag.schema_rag import schema_retriever
+    from src.sql_agent.rag.bulk import BulkImporter
+    from build.config import config
+
     parser = ArgumentParser(description="Load vector data in SQL-RAG system.")
 
-    parser.add_argument('--collection', default="nl_to_sql", help="Qdrant collection name.")
+    parser.add_argument('--collection', default=None, help="Qdrant collection name (default: `nl_to_sql`, `nl_to_sql_bulk` for --bulk-import).")
     parser.add_argument('--update', action="store_true", default=False, help="Update collection with new vectors.")
     parser.add_argument('--rebuild', action="store_true", default=False, help="Rebuild the whole collection.")
     parser.add_argument('--create', action="store_true", default=False, help="Create a new collection.")
     parser.add_argument('--delete', action="store_true", default=False, help="Delete the specified collection.")
     parser.add_argument('--view', action="store_true", default=False, help="Get some stats of the existing collections.")
+    parser.add_argument('--schema', action="store_true", default=False, help="(Re)build the column-level schema collection from the live db.")
+    parser.add_argument('--quantization', choices=["none", "scalar", "binary"], default=None, help="Vector quantization for --create/--rebuild.")
+    parser.add_argument('--bulk-import', metavar="PATH", default=None, help="Import NL/SQL pairs from a .jsonl or .sql file with a process pool (resumable).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes for --bulk-import.")
+    parser.add_argument('--batch-size', type=int, default=None, help="Sentences per embedding forward pass.")
 
     args = parser.parse_args()
 
+    if args.batch_size:
+        sql_retriever.hf_embedder.batch_size = args.batch_size
+
+    quantization = {"quantization": args.quantization} if args.quantization else {}
+
+    if args.bulk_import:
+        BulkImporter(sql_retriever, workers=args.workers).run(
+            args.bulk_import, collection_name=args.collection or config.BULK_COLLECTION
+        )
+        return
+
+    args.collection = args.collection or "nl_to_sql"
+
+    if args.schema:
+        schema_retriever.build()
+        return
+
     if args.rebuild:
-        sql_retriever.create_collection(args.collection, force_rebuild=True)
-        sql_retriever.embed()
+        sql_retriever.create_collection(args.collection, force_rebuild=True, **quantization)
+        sql_retriever.embed(args.collection)
         return
 
     if args.update:
@@ -26,7 +52,7 @@ def main():
         return
 
     if args.create:
-        sql_retriever.create_collection(args.collection)
+        sql_retriever.create_collection(args.collection, **quantization)
         return
 
     if args.delete:
@@ -35,6 +61,7 @@ def main():
 
         else:
             sql_retriever.qclient.delete_collection(args.collection)
+            sql_retriever.checked_collections.discard(args.collection)
             print(f"Collection `{args.collection}` deleted.")
 
     if args.view:
@@ -45,8 +72,16 @@ def main():
             stats = info.model_dump()
             v_cfg = stats.get("config", {}).get("params", {}).get("vectors", {})
             points_count = stats.get("points_count")
-            print(f" Collection {j}:\t name=`{collection.name}`\n\t\t #points={points_count}\n\t\t vectors_dim={v_cfg.get("size")}\n\t\t metric={v_cfg.get("distance")}\n\t\t payload_on_disk={v_cfg.get("on_disk_payload")}\n")
+            print(f" Collection {j}:\t name=`{collection.name}`\n\t\t #points={points_count}\n\t\t vectors_dim={v_cfg.get("size")}\n\t\t metric={v_cfg.get("distance")}\n\t\t payload_on_disk={v_cfg.get("on_disk_payload")}")
+
+            if collection.name == args.collection:
+                report = sql_retriever.quantization_report(collection.name)
+                recall = report["recall@5"]
+                recall = f"{recall:.3f}" if recall is not None else "n/a (no KB questions to probe)"
+                print(f"\t\t quantization={report["quantization"]}\n\t\t vector_ram/point={report["vector_ram_bytes_per_point"]:.0f}B\n\t\t recall@5_vs_exact={recall}")
+            print()
 
+        print(f" Embedding cache: {sql_retriever.hf_embedder.cache_stats()}\n")
         return
 
 if __name__=="__main__":
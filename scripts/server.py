@@ -0,0 +1,369 @@
+# Usage: python -m scripts.server [--host 0.0.0.0 --port 8080]
+"""
+Headless API server: many concurrent `AgentRunner` sessions streaming `ReplEvent`s.
+
+    POST   /sessions                      -> {"session_id": ...}
+    POST   /sessions/{id}/messages        {"message": "..."} -> NDJSON stream of events
+    WS     /sessions/{id}/ws              send {"message": "..."}, receive events as JSON
+    DELETE /sessions/{id}
+    GET    /healthz, /metrics (Prometheus text)
+
+At most `SERVER_MAX_ACTIVE_TURNS` turns run at once; the others queue (up to `SERVER_MAX_QUEUED`, then 503)
+and wait at most `SERVER_QUEUE_TIMEOUT` seconds. LLM and db calls are further bounded process-wide (`src.sql_agent.utils.limits`).
+On SIGINT/SIGTERM new turns are refused and running ones (WebSocket included) get `SERVER_DRAIN_TIMEOUT` seconds to
+finish, before uvicorn closes the connections.
+
+With a session store (`SESSION_STORE`) the compacted history of every session is persisted: idle sessions drop their
+history from memory, and a session unknown to this process (restart, another replica) is reloaded from the store.
+"""
+import asyncio
+import json
+import time
+import uuid
+from argparse import ArgumentParser
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from agents import set_tracing_disabled
+set_tracing_disabled(disabled=True)
+
+from src.sql_agent.agent import collector, executor, route_question
+from src.sql_agent.utils.repl import AgentRunner, ReplEvent
+from src.sql_agent.utils.semantic_cache import semantic_cache
+from src.sql_agent.utils.telemetry import TelemetryHooks
+from src.sql_agent.utils.limits import slots_in_use
+from src.sql_agent.utils.session_store import get_session_store
+from src.sql_agent.utils.tiering import tier_report
+from src.sql_agent.rag.kb_writer import kb_writer
+from src.sql_agent.rag.sql_rag import sql_retriever
+from src.sql_agent.tools import get_data_version
+from build.config import config
+from src.logger import logger
+
+
+@dataclass
+class Session:
+    id: str
+    runner: AgentRunner
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock) # one turn at a time per session
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SessionManager:
+    """Sessions in memory with idle TTL and LRU eviction beyond `max_sessions`, backed by the session store if any"""
+
+    def __init__(
+            self,
+            *,
+            max_sessions: int=config.SERVER_MAX_SESSIONS,
+            ttl: float=config.SERVER_SESSION_TTL,
+            release_after: float=config.SESSION_IDLE_RELEASE
+        ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.release_after = release_after
+        self.sessions: dict[str, Session] = {}
+
+    def create(self, session_id: str | None=None) -> Session:
+        self.evict()
+        session_id = session_id or uuid.uuid4().hex
+        runner = AgentRunner(
+            starting_agent=collector,
+            hooks=TelemetryHooks(session_id=session_id) if config.TELEMETRY else None,
+            enable_cli_prints=False,
+            semantic_cache=semantic_cache if config.SEMANTIC_CACHE else None,
+            replay_agent=executor,
+            data_version=get_data_version,
+            kb_writer=kb_writer if config.KB_LEARNING else None,
+            router=route_question if config.ROUTER or config.PREFETCH else None,
+            session_store=session_store,
+            session_id=session_id,
+        )
+        session = self.sessions[session_id] = Session(session_id, runner)
+        return session
+
+    async def get(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None and session_store is not None:
+            # started by a previous process or another replica
+            restored = self.create(session_id)
+            if await restored.runner.rehydrate():
+                logger.info(f"Session {session_id} restored from the session store.")
+                session = restored
+            else:
+                self.sessions.pop(session_id, None)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Session `{session_id}` not found.")
+        session.last_used = time.monotonic()
+        return session
+
+    def drop(self, session_id: str) -> None:
+        """Forget the session in this process (it stays in the store)"""
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.runner.release()
+
+    def delete(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+        if session_store is not None:
+            session_store.delete(session_id)
+
+    def evict(self) -> None:
+        now = time.monotonic()
+        idle = [s for s in self.sessions.values() if not s.lock.locked()]
+        for session in idle:
+            if now - session.last_used > self.ttl:
+                self.drop(session.id)
+            elif now - session.last_used > self.release_after:
+                session.runner.release() # bounded memory: only the runner shell stays
+        if len(self.sessions) >= self.max_sessions:
+            for session in sorted(idle, key=lambda s: s.last_used)[:len(self.sessions) - self.max_sessions + 1]:
+                self.drop(session.id)
+
+
+class TurnGate:
+    """Global admission: bounded running turns, bounded queue and wait, refusal while draining"""
+
+    def __init__(
+            self,
+            *,
+            max_active: int=config.SERVER_MAX_ACTIVE_TURNS,
+            max_queued: int=config.SERVER_MAX_QUEUED,
+            timeout: float=config.SERVER_QUEUE_TIMEOUT
+        ):
+        self.slots = asyncio.Semaphore(max_active)
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.draining = False
+        self.latencies: list[float] = [] # seconds, last turns
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def check(self) -> None:
+        """Fast refusal, before a response starts"""
+        if self.draining:
+            raise HTTPException(status_code=503, detail="Server shutting down.")
+        if self.slots.locked() and self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many queued requests, retry later.")
+
+    @asynccontextmanager
+    async def turn(self):
+        self.check()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many concurrent requests, retry later.")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.idle.clear()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies = self.latencies[-999:] + [time.perf_counter() - start]
+            self.active -= 1
+            self.slots.release()
+            if not self.active:
+                self.idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        self.draining = True
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+session_store = get_session_store()
+sessions = SessionManager()
+gate = TurnGate()
+
+
+async def drain() -> None:
+    logger.info(f"Draining {gate.active} running turns...")
+    if not await gate.drain(config.SERVER_DRAIN_TIMEOUT):
+        logger.warning(f"{gate.active} turns still running after {config.SERVER_DRAIN_TIMEOUT}s, shutting down anyway.")
+
+
+class DrainingServer(uvicorn.Server):
+    """Drains the running turns as soon as a shutdown signal arrives: uvicorn closes the WebSockets (1012) and waits
+    on HTTP before the lifespan shutdown, too late to drain there"""
+
+    async def shutdown(self, sockets=None) -> None:
+        if not self.force_exit: # a second signal skips the drain
+            await drain()
+        await super().shutdown(sockets)
+
+
+# APP
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if sql_retriever.backend == "qdrant":
+        await sql_retriever.acheck_collection()
+    if config.KB_LEARNING:
+        kb_writer.start()
+
+    async def janitor():
+        while True:
+            await asyncio.sleep(60)
+            sessions.evict()
+            if session_store is not None:
+                try:
+                    await asyncio.to_thread(session_store.purge, config.SESSION_RETENTION)
+                except Exception as e:
+                    logger.error(f"Session store purge failed: {e}")
+
+    cleanup = asyncio.create_task(janitor())
+    logger.info("API server ready.")
+    yield
+
+    cleanup.cancel()
+    if not gate.draining: # not run by `DrainingServer`
+        await drain()
+    kb_writer.stop(timeout=30)
+    if session_store is not None:
+        session_store.stop(timeout=30) # pending sessions are written before exit
+    for session in sessions.sessions.values():
+        if session.runner.telemetry is not None:
+            session.runner.telemetry.flush()
+    logger.info("API server stopped.")
+
+
+app = FastAPI(title="Galileo SQL-Agent", lifespan=lifespan)
+
+
+class MessageIn(BaseModel):
+    message: str
+
+
+def _event_json(event: ReplEvent) -> str:
+    return json.dumps(asdict(event), ensure_ascii=False)
+
+
+@app.post("/sessions")
+async def create_session():
+    return {"session_id": sessions.create().id}
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    session = await sessions.get(session_id)
+    if session.lock.locked(): # the running turn would persist the session again
+        raise HTTPException(status_code=409, detail="A turn is running for this session, retry when it ends.")
+    async with session.lock:
+        await asyncio.to_thread(sessions.delete, session_id)
+    return {"deleted": session_id}
+
+
+@app.post("/sessions/{session_id}/messages")
+async def post_message(session_id: str, body: MessageIn):
+    session = await sessions.get(session_id)
+    if session.lock.locked():
+        raise HTTPException(status_code=409, detail="A turn is already running for this session.")
+    gate.check() # a full server answers 503 instead of starting a stream
+
+    async def stream():
+        try:
+            async with session.lock, gate.turn():
+                async for event in session.runner.stream_turn(body.message):
+                    yield _event_json(event) + "\n"
+        except HTTPException as e: # queue wait timed out
+            yield json.dumps({"type": "error", "content": e.detail}) + "\n"
+        except Exception as e:
+            logger.error(f"Session {session_id}: turn failed: {e}")
+            yield json.dumps({"type": "error", "content": str(e)}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.websocket("/sessions/{session_id}/ws")
+async def session_ws(websocket: WebSocket, session_id: str):
+    await websocket.accept()
+    try:
+        session = await sessions.get(session_id)
+    except HTTPException as e:
+        await websocket.close(code=4404, reason=e.detail)
+        return
+
+    try:
+        while True:
+            message = (await websocket.receive_json())["message"]
+            try:
+                async with session.lock, gate.turn():
+                    async for event in session.runner.stream_turn(message):
+                        await websocket.send_text(_event_json(event)) # awaits slow clients: backpressure
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "content": e.detail})
+            if gate.draining: # current turn finished: the client reconnects to another replica
+                await websocket.close(code=1012, reason="Server restarting.")
+                return
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/healthz")
+async def healthz():
+    return {
+        "status": "draining" if gate.draining else "ok",
+        "sessions": len(sessions.sessions),
+        "active_turns": gate.active,
+        "waiting_turns": gate.waiting,
+        "slots_in_use": slots_in_use(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    in_use = slots_in_use()
+    lines = [
+        f"galileo_sessions {len(sessions.sessions)}",
+        f"galileo_turns_active {gate.active}",
+        f"galileo_turns_waiting {gate.waiting}",
+        f"galileo_turns_rejected_total {gate.rejected}",
+        f'galileo_slots_in_use{{kind="llm"}} {in_use["llm"]}',
+        f'galileo_slots_in_use{{kind="db"}} {in_use["db"]}',
+    ]
+    if gate.latencies:
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'galileo_turn_seconds{{quantile="{q}"}} {np.percentile(gate.latencies, q * 100):.4f}')
+    for key, stats in tier_report().items(): # last LLM calls of all sessions, per agent and model tier
+        agent, _, model = key.partition("@")
+        labels = f'agent="{agent}",model="{model}"'
+        lines += [
+            f"galileo_llm_calls{{{labels}}} {stats['calls']}",
+            f'galileo_llm_seconds{{{labels},quantile="0.5"}} {stats["p50"]}',
+            f'galileo_llm_seconds{{{labels},quantile="0.95"}} {stats["p95"]}',
+            f"galileo_llm_cost_usd{{{labels}}} {stats['cost']:.6f}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = ArgumentParser(description="Run the Galileo API server.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    server = DrainingServer(uvicorn.Config(
+        app, host=args.host, port=args.port, timeout_graceful_shutdown=config.SERVER_DRAIN_TIMEOUT
+    ))
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
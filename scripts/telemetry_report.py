@@ -0,0 +1,44 @@
+# Usage: python -m scripts.telemetry_report [data/telemetry | spans-<session>.jsonl]
+from argparse import ArgumentParser
+
+from build.config import config
+from src.sql_agent.utils.telemetry import format_summary, load_spans, summarize
+
+
+def main():
+    """p50/p95 per pipeline stage from the exported telemetry spans"""
+    parser = ArgumentParser(description="Summarize agent telemetry spans.")
+    parser.add_argument('path', nargs="?", default=config.TELEMETRY_DIR, help="Spans directory or JSONL file.")
+    parser.add_argument('--session', default=None, help="Only spans of this session.")
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    if args.session:
+        spans = [s for s in spans if s["session"] == args.session]
+
+    if not spans:
+        print("No spans found.")
+        return
+
+    print(f"{len(spans)} spans, {len({s['session'] for s in spans})} sessions\n")
+    print(format_summary(summarize(spans)))
+
+    llm = [s for s in spans if s["stage"] == "llm"]
+    if llm:
+        input_tokens = sum(s["input_tokens"] or 0 for s in llm)
+        cached = sum(s["cached_tokens"] or 0 for s in llm)
+        output_tokens = sum(s["output_tokens"] or 0 for s in llm)
+        print(f"\nLLM tokens: input {input_tokens} (cached {cached}), output {output_tokens}")
+
+        cost = sum(s.get("cost") or 0.0 for s in llm)
+        if cost:
+            print(f"LLM cost: ${cost:.4f}")
+            by_model: dict[str, list[float]] = {}
+            for s in llm:
+                by_model.setdefault(f"{s['name']}@{s.get('model')}", []).append(s.get("cost") or 0.0)
+            for key, costs in sorted(by_model.items()):
+                print(f"  {key:<46}{len(costs):>6} calls  ${sum(costs):.4f}  (${sum(costs) / len(costs):.5f}/call)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,173 @@
 # usage: uv run -m chainlit run scripts/ui.py -w
 import re
+import time
+
 import chainlit as cl
+from chainlit.types import ThreadDict
 from agents import set_tracing_disabled
 set_tracing_disabled(disabled=True)
 from agents.exceptions import MaxTurnsExceeded
 
-from src.sql_agent.agent import collector as galileo
+from src.sql_agent.agent import collector as galileo, executor, route_question
 from src.sql_agent.utils.repl import AgentRunner
+from src.sql_agent.utils.semantic_cache import semantic_cache
+from src.sql_agent.utils.telemetry import TelemetryHooks
+from src.sql_agent.utils.session_store import get_session_store
+from src.sql_agent.rag.kb_writer import kb_writer
+from src.sql_agent.rag.sql_rag import sql_retriever
+from src.sql_agent.tools import get_data_version
+from build.config import config
 from src.logger import logger
 
+# Images handling
+THUMBNAIL_PREFIX = "https://datahub.creodias.eu/odata/v1/Assets("
+THUMBNAIL_REGEX = re.compile(
+    r"(?<!!\[\]\()https:\/\/datahub\.creodias\.eu\/odata\/v1\/Assets\([^)]+\)\/\$value"
+)
+
+# deltas are coalesced into frames of at least this many chars, or sent after this many seconds
+FRAME_CHARS = 32
+FRAME_SECONDS = 0.05
+
+
+def _embed_thumbnails(text: str) -> str:
+    """
+    Converte tutti i link thumbnail CREODIAS in Markdown image embeds.
+    """
+    return THUMBNAIL_REGEX.sub(lambda m: f"![]({m.group(0)})", text)
+
+
+class ThumbnailStream:
+    """Incremental `_embed_thumbnails`: text is released as soon as it cannot be part of an incomplete
+    thumbnail url, which is held back until its `/$value` suffix arrives"""
+
+    CONTEXT = 4 # len("![](") for the regex lookbehind
+
+    def __init__(self):
+        self.pending = ""
+        self.emitted_tail = ""
+
+    def _safe_end(self) -> int:
+        start = self.pending.rfind(THUMBNAIL_PREFIX)
+        if start != -1 and "/$value" not in self.pending[start:]:
+            return start
+        for k in range(min(len(THUMBNAIL_PREFIX), len(self.pending)), 0, -1): # partial prefix at the end
+            if self.pending.endswith(THUMBNAIL_PREFIX[:k]):
+                return len(self.pending) - k
+        return len(self.pending)
+
+    def _emit(self, end: int) -> str:
+        chunk, self.pending = self.pending[:end], self.pending[end:]
+        text = _embed_thumbnails(self.emitted_tail + chunk)[len(self.emitted_tail):]
+        self.emitted_tail = (self.emitted_tail + chunk)[-self.CONTEXT:]
+        return text
+
+    def feed(self, delta: str) -> str:
+        self.pending += delta
+        return self._emit(self._safe_end())
+
+    def flush(self) -> str:
+        return self._emit(len(self.pending))
+
+
+def _new_runner(thread_id: str) -> AgentRunner:
+    # one runner per chat session: the conversation history survives across messages,
+    # and across restarts/replicas through the session store (keyed by the chainlit thread)
+    return AgentRunner(
+        starting_agent=galileo,
+        hooks=TelemetryHooks(session_id=cl.context.session.id) if config.TELEMETRY else None,
+        enable_cli_prints=False,
+        semantic_cache=semantic_cache if config.SEMANTIC_CACHE else None, # shared by all sessions
+        replay_agent=executor,
+        data_version=get_data_version,
+        kb_writer=kb_writer if config.KB_LEARNING else None,
+        router=route_question if config.ROUTER or config.PREFETCH else None,
+        session_store=get_session_store(),
+        session_id=thread_id,
+    )
+
 
 @cl.on_chat_start
 async def start():
-    agent = galileo
-    cl.user_session.set("agent", agent)
+    if sql_retriever.backend == "qdrant":
+        await sql_retriever.acheck_collection() # cached after the first session
+
+    if config.KB_LEARNING:
+        kb_writer.start() # creates the learned collection if missing
+
+    cl.user_session.set("runner", _new_runner(cl.context.session.thread_id))
 
     await cl.Message(
         content="## Hello there! 🌍"
-                "\n\n> Here's Galileo, a specialized `SQL-Agent` for Earth Observation databases. Think of me as your translator between human curiosity and satellite data."  
+                "\n\n> Here's Galileo, a specialized `SQL-Agent` for Earth Observation databases. Think of me as your translator between human curiosity and satellite data."
                 "\n\n#### What'd you like to discover? 🛰️"
     ).send()
 
 
+@cl.on_chat_resume
+async def resume(thread: ThreadDict):
+    # history is reloaded from the session store at the next message
+    cl.user_session.set("runner", _new_runner(thread["id"]))
+
+
 @cl.on_message
 async def main(message: cl.Message):
+    runner: AgentRunner = cl.user_session.get("runner")
+    logger.info(f"Starting agent run for: {message.content}")
 
-    # Images handling
-    THUMBNAIL_REGEX = re.compile(
-        r"(?<!!\[\]\()https:\/\/datahub\.creodias\.eu\/odata\/v1\/Assets\([^)]+\)\/\$value"
-    )
+    # Messaggio temporaneo per gli eventi
+    status_msg = cl.Message(content="🔭 Starting analysis...", author="Galileo")
+    await status_msg.send()
+
+    final_msg = cl.Message(content="", author="🛰️ Galileo")
+    thumbnails = ThumbnailStream()
+    frame, last_frame, streamed = "", time.perf_counter(), False
+    current_agent = None
 
-    def _embed_thumbnails(text: str) -> str:
-        """
-        Converte tutti i link thumbnail CREODIAS in Markdown image embeds.
-        """
-        return THUMBNAIL_REGEX.sub(lambda m: f"![]({m.group(0)})", text)
+    async def send_frame() -> None:
+        nonlocal frame, last_frame, streamed
+        if frame:
+            await final_msg.stream_token(frame)
+            frame, last_frame, streamed = "", time.perf_counter(), True
 
     try:
-        agent = cl.user_session.get("agent")
-        runner = AgentRunner(starting_agent=agent)
-        
-        logger.info(f"Starting agent run for: {message.content}")
-        
-        # Messaggio temporaneo per gli eventi
-        status_msg = cl.Message(content="🔭 Starting analysis...", author="Galileo")
-        await status_msg.send()
-        
-        final_response = ""
-        
-        async for event in runner.run_demo_loop(ui=True, user_q=message.content):
-            if event.type == "agent_switch":
+        async for event in runner.stream_turn(message.content):
+            if event.type == "text_delta":
+                if current_agent != executor.name: # only the answer is shown, not the collector's reasoning
+                    continue
+                frame += thumbnails.feed(event.content)
+                # the first frame goes out at once: time to first visible token = model time to first token
+                if not streamed or len(frame) >= FRAME_CHARS or time.perf_counter() - last_frame >= FRAME_SECONDS:
+                    await send_frame()
+
+            elif event.type == "agent_switch":
+                current_agent = event.content
                 if event.content == "Galileo":
                     status_msg.content = f"🔭 `{event.content}` is looking at the sky..."
                 elif event.content == "Executor":
                     status_msg.content = f"🤖 `Galileo` is querying the database..."
                 await status_msg.update()
-                
+
             elif event.type == "tool_call":
                 status_msg.content = f"🔧 {event.content}"
                 await status_msg.update()
-                
+
             elif event.type == "final":
-                final_response = _embed_thumbnails(event.content)
-        
-        # Rimuovi il messaggio di stato
-        await status_msg.remove()
-        
-        # Messaggio finale pulito
-        final_msg = cl.Message(content="", author="🛰️ Galileo")
-        await final_msg.send()
-        
-        for char in final_response:
-            await final_msg.stream_token(char)
-        
-        await final_msg.update()
-    
+                frame += thumbnails.flush()
+                await send_frame()
+                if not streamed: # semantic cache hit: no deltas, the whole answer at once
+                    final_msg.content = _embed_thumbnails(event.content)
+                    await final_msg.send()
+                    streamed = True
+
     except MaxTurnsExceeded:
-        logger.error("Max turn exceeded (10).")
\ No newline at end of file
+        logger.error("Max turn exceeded (10).")
+        if not streamed:
+            final_msg.content = "Sorry, I could not complete this request."
+            await final_msg.send()
+            streamed = True
+
+    # Rimuovi il messaggio di stato
+    await status_msg.remove()
+    if streamed:
+        await final_msg.update()
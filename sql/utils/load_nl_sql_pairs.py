@@ -1,17 +1,30 @@
+import hashlib
+import json
+import threading
+import time
 from pathlib import Path
+from typing import Callable
+from uuid import UUID, uuid5
+
+from src.logger import logger
+
+# Bump when `parse_queries` changes: cached parses of another version are discarded
+KB_CACHE_VERSION = 1
+
+# Namespace for content-hash point ids of the few-shot KB
+KB_NAMESPACE = UUID("6f1c2a4e-8b1d-5c3e-9a7f-2d4b6e8f0a13")
+
+
+def kb_point_id(nl_quest: str, sql_answ: str) -> str:
+    """Stable point id from the content of a KB entry: same (nl, sql) pair -> same id, whatever its position"""
+    return str(uuid5(KB_NAMESPACE, f"{nl_quest}\n{sql_answ}"))
 
-def load_queries(sql_file: str="sql/queries_example.sql") -> list[dict]:
-    """Load queries from a sql file.
-    
-    Args: 
-        sql_file: The path to the sql file where read queries in format
-                    --nl description
-                    SELECT ...sql query
-    Returns:
-        List of dicts storing nl questions and sql answers with a unique id.
-    """
-    content = Path(sql_file).read_text(encoding="utf-8")
 
+def parse_queries(content: str) -> list[dict]:
+    """Parse NL/SQL pairs from the content of a sql file in format
+            --nl description
+            SELECT ...sql query
+    """
     entries = []
     current_nl = None
     current_sql_lines = []
@@ -42,14 +55,135 @@ def load_queries(sql_file: str="sql/queries_example.sql") -> list[dict]:
             "sql_answ": "\n".join(current_sql_lines).strip()
         })
 
-    for j, entry in enumerate(entries):
-        entry["id"] = j+1
+    for entry in entries:
+        entry["id"] = kb_point_id(entry["nl_quest"], entry["sql_answ"])
 
     return entries
 
 
+def load_queries(sql_file: str="sql/queries_example.sql") -> list[dict]:
+    """Load queries from a sql file.
+
+    Args:
+        sql_file: The path to the sql file where read queries in format
+                    --nl description
+                    SELECT ...sql query
+    Returns:
+        List of dicts storing nl questions and sql answers with a content-hash id.
+    """
+    return parse_queries(Path(sql_file).read_text(encoding="utf-8"))
+
+
+class KBIndex:
+    """Few-shot KB loaded from `.sql` files and directories of `.sql` files.
+
+    Parsed entries are cached on disk per file, keyed by (mtime, size) with the content sha256 as second chance,
+    so a warm start only stats the files. Entries are loaded lazily on first access; afterwards an access re-stats
+    the files at most every `check_interval` seconds and reloads them when edited, added or removed.
+    Indexes built from the entries register with `on_reload` to be invalidated by `reload`.
+    """
+
+    def __init__(self, sources: list[str], *, cache_file: str="data/cache/kb_index.json", check_interval: float=5.0):
+        self.sources = sources
+        self.cache_file = Path(cache_file)
+        self.check_interval = check_interval
+        self._entries: list[dict] | None = None
+        self._signature: dict[str, tuple[int, int]] = {}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[], None]] = []
+
+    def files(self) -> list[Path]:
+        files = []
+        for source in map(Path, self.sources):
+            if source.is_dir():
+                files.extend(sorted(source.glob("*.sql")))
+            elif source.exists():
+                files.append(source)
+            else:
+                logger.debug(f"KB source `{source}` not found, skipped.")
+        return files
+
+    def _stat(self) -> dict[str, tuple[int, int]]:
+        """(mtime, size) of every KB file"""
+        signature = {}
+        for file in self.files():
+            stat = file.stat()
+            signature[str(file.resolve())] = (stat.st_mtime_ns, stat.st_size)
+        return signature
+
+    def _read_cache(self) -> dict:
+        try:
+            cache = json.loads(self.cache_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return cache.get("files", {}) if cache.get("version") == KB_CACHE_VERSION else {}
+
+    def _load(self) -> list[dict]:
+        cache, fresh = self._read_cache(), {}
+        dirty = False
+        self._signature, self._checked = {}, time.monotonic()
+
+        for file in self.files():
+            key, stat = str(file.resolve()), file.stat()
+            self._signature[key] = (stat.st_mtime_ns, stat.st_size)
+            record = cache.get(key)
+
+            if not (record and record["mtime_ns"] == stat.st_mtime_ns and record["size"] == stat.st_size):
+                content = file.read_bytes()
+                sha = hashlib.sha256(content).hexdigest()
+
+                if not (record and record["sha256"] == sha): # touched but unchanged files are not reparsed
+                    record = {"sha256": sha, "entries": parse_queries(content.decode("utf-8"))}
+                    logger.debug(f"KB file `{file}` parsed: {len(record['entries'])} entries.")
+
+                record.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                dirty = True
+
+            fresh[key] = record
+
+        if dirty or fresh.keys() != cache.keys():
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_file.write_text(
+                json.dumps({"version": KB_CACHE_VERSION, "files": fresh}, ensure_ascii=False), encoding="utf-8"
+            )
+
+        # one entry per content id, first file wins
+        entries = {}
+        for record in fresh.values():
+            for entry in record["entries"]:
+                entries.setdefault(entry["id"], entry)
+        return list(entries.values())
+
+    @property
+    def entries(self) -> list[dict]:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+                    logger.debug(f"KB loaded with {len(self._entries)} entries from {len(self.sources)} sources.")
+
+        elif time.monotonic() - self._checked > self.check_interval:
+            self._checked = time.monotonic()
+            if self._stat() != self._signature:
+                logger.info("KB files changed, reloading them.")
+                self.reload()
+        return self._entries
+
+    def reload(self) -> list[dict]:
+        """Pick up edits to the KB files (cheap: unchanged files are cache hits)"""
+        with self._lock:
+            self._entries = self._load()
+        for listener in self._listeners:
+            listener()
+        return self._entries
+
+    def on_reload(self, listener: Callable[[], None]) -> None:
+        self._listeners.append(listener)
+
+    def as_dict(self) -> dict[str, str]:
+        return {item["nl_quest"]: item["sql_answ"] for item in self.entries}
+
+
 def get_queries_dict(sql_file: str="sql/queries_example.sql"):
     return {item["nl_quest"]: item["sql_answ"] for item in load_queries(sql_file)}
-
-# Singleton for `queries_dict`
-queries_dict = get_queries_dict()
\ No newline at end of file
@@ -34,4 +34,36 @@ def get_metadata_query(table: str, *, schema: str='public'):
         AND c.table_name   = '{table}'
         ORDER BY c.ordinal_position
         ;
-    """
\ No newline at end of file
+    """
+
+def get_schema_columns_query(*, schema: str='public'):
+    """All the columns of `schema` with type, key flags and comment"""
+    return f"""
+        SELECT
+            c.table_name,
+            c.column_name,
+            c.data_type,
+            bool_or(tc.constraint_type = 'PRIMARY KEY') IS TRUE AS primary_key,
+            bool_or(tc.constraint_type = 'FOREIGN KEY') IS TRUE AS foreign_key,
+            pgd.description
+        FROM information_schema.columns c
+        -- KEYS
+        LEFT JOIN information_schema.key_column_usage kcu
+        ON kcu.table_schema = c.table_schema
+        AND kcu.table_name  = c.table_name
+        AND kcu.column_name = c.column_name
+        LEFT JOIN information_schema.table_constraints tc
+        ON tc.constraint_name = kcu.constraint_name
+        AND tc.table_schema   = kcu.table_schema
+        -- COLUMN COMMENTS
+        LEFT JOIN pg_catalog.pg_statio_all_tables st
+        ON st.schemaname = c.table_schema
+        AND st.relname   = c.table_name
+        LEFT JOIN pg_catalog.pg_description pgd
+        ON pgd.objoid   = st.relid
+        AND pgd.objsubid = c.ordinal_position
+        WHERE c.table_schema = '{schema}'
+        GROUP BY c.table_name, c.column_name, c.data_type, c.ordinal_position, pgd.description
+        ORDER BY c.table_name, c.ordinal_position
+        ;
+    """
@@ -1,23 +1,46 @@
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Literal
+
 from agents import Agent, handoff, ModelSettings
 from agents.extensions.handoff_prompt import prompt_with_handoff_instructions
 
-from src.sql_agent.prompts import EXECUTOR_PROMPT, COLLECTOR_PROMPT
+from src.sql_agent.prompts import (
+    EXECUTOR_PROMPT,
+    COLLECTOR_PROMPT,
+    PREFETCHED_CONTEXT,
+    assemble,
+    prompt_cache_settings,
+)
 from src.sql_agent.tools import (
     getMetadata,
     retrieveQueries,
-    executeQuery
+    executeQuery,
+    resolveHandle,
+    retrieve_examples,
+    format_examples,
+    get_metadata,
+    get_tables,
 )
 from src.sql_agent.utils.handoff import log_handoff, SQLReport
+from src.sql_agent.utils.limits import LimitedModel, db_slots
+from src.sql_agent.utils.tiering import TieredModel
 from build.config import config
 
+if not config.EXECUTOR_TIERS:
+    raise RuntimeError("No LLM configured: set OPENAI_API_KEY or ANTHROPIC_API_KEY (or LLM_OFFLINE=true for the scripted model).")
+
 # Sub agent
 executor = Agent(
     name="Executor",
-    instructions=EXECUTOR_PROMPT,
-    tools=[executeQuery],
+    instructions=assemble(EXECUTOR_PROMPT),
+    tools=[executeQuery, resolveHandle],
     handoff_description="Agent that runs PostgreSQL query on database",
-    model=config.MODEL,
-    model_settings=ModelSettings(tool_choice="required") # always execute queries
+    model=LimitedModel(TieredModel(
+        config.EXECUTOR_TIERS, agent="Executor", settings=lambda model: prompt_cache_settings(model, "executor")
+    )),
+    model_settings=ModelSettings(tool_choice="required"), # always execute queries
 )
 
 executor_handoff = handoff(
@@ -30,12 +53,74 @@ executor_handoff = handoff(
 # Agent
 collector = Agent(
     name="Galileo",
-    instructions=prompt_with_handoff_instructions(COLLECTOR_PROMPT),
+    instructions=assemble(prompt_with_handoff_instructions(COLLECTOR_PROMPT)),
     tools=[
         retrieveQueries,
         getMetadata, 
+        resolveHandle,
     ],
     handoffs=[executor_handoff,],
     handoff_description="Agent that explores db and collects useful data for writing a SQL query",
-    model=config.MODEL,
-)
\ No newline at end of file
+    model=LimitedModel(TieredModel(
+        config.COLLECTOR_TIERS, agent="Galileo", settings=lambda model: prompt_cache_settings(model, "collector")
+    )),
+)
+
+
+# Router
+RouteName = Literal["simple", "complex"]
+
+# intents needing the collector's analysis: multi-step spatial ops, comparisons, aggregations
+COMPLEX_HINTS = re.compile(
+    r"\b(compare|vs|versus|distance|between|convex|polygon|geodesic|simplif\w*|orientation|topology|"
+    r"path|coast\w*|midpoint|buffer|within|similar|overlap\w*|each|per|average|trend)\b",
+    re.IGNORECASE
+)
+SIMPLE_HINTS = re.compile(
+    r"^\s*(how many|count|list|show( me)?|give me|(what is|what are|find) the (latest|most recent|last)|latest|most recent)\b",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class Route:
+    name: RouteName
+    agent: Agent
+    context: str | None = None # pre-fetched context appended to the user message
+
+
+async def _prefetch_metadata(question: str) -> str:
+    async with db_slots:
+        return await asyncio.to_thread(lambda: get_metadata(get_tables(), question))
+
+
+async def prefetch_context(question: str, *, top_k: int=5) -> tuple[list[dict], str]:
+    """Few-shot examples and relevant schema for `question`, fetched concurrently"""
+    return await asyncio.gather(
+        retrieve_examples(question, top_k=top_k),
+        _prefetch_metadata(question),
+    )
+
+
+async def route_question(question: str) -> Route:
+    """Cheap complexity routing: short questions matching a simple intent, or very close to a KB example, go
+    straight to the executor; the rest take the collector -> executor pipeline.
+    With `PREFETCH` both routes get the pre-fetched examples and schema, so the first LLM call already has its
+    context; without it only the best example score is fetched, and only when the hints do not decide"""
+    is_complex = len(question.split()) > config.ROUTER_MAX_WORDS or COMPLEX_HINTS.search(question)
+
+    context = None
+    if config.PREFETCH:
+        examples, metadata = await prefetch_context(question)
+        context = PREFETCHED_CONTEXT.format(examples=format_examples(examples), metadata=metadata)
+    elif config.ROUTER and not is_complex and not SIMPLE_HINTS.search(question):
+        examples = await retrieve_examples(question, top_k=1)
+    else:
+        examples = []
+    best_score = examples[0]["score"] if examples else 0.0
+
+    is_simple = not is_complex and (SIMPLE_HINTS.search(question) or best_score >= config.ROUTER_SIMPLE_SCORE)
+
+    if config.ROUTER and is_simple:
+        return Route("simple", executor, context)
+    return Route("complex", collector, context)
@@ -1,4 +1,15 @@
+from dataclasses import dataclass, field
+
 from src.sql_agent.utils.base_context import BaseContext
 
+@dataclass
 class SQLContext(BaseContext):
-    pass
\ No newline at end of file
+    """Per-turn run context shared by the agents and their tools"""
+    user_query: str = ""
+    executed_queries: list[str] = field(default_factory=list) # successful SQL, in order
+    failed_queries: list[str] = field(default_factory=list)
+    last_rows: list[dict] | None = None # records returned by the last successful query
+    cached_sql: str | None = None # SQL of the semantic cache entry that answered the turn
+    history_handles: dict[str, str] = field(default_factory=dict) # full text of the elided history items (`resolveHandle`)
+    low_confidence: bool = False # set by the collector report: the executor starts on a stronger model
+    llm_calls: list[dict] = field(default_factory=list) # model tier, latency, tokens and cost of every LLM call
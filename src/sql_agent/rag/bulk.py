@@ -0,0 +1,177 @@
+"""
+Bulk import of NL/SQL pairs: embedding sharded across a process pool, vectors streamed into chunked upserts,
+with a checkpoint file so an interrupted import resumes from the last durably written chunk.
+"""
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from build.config import config
+from sql.utils.load_nl_sql_pairs import kb_point_id, load_queries
+from src.sql_agent.rag.bulk_worker import embed_chunk, init_worker
+from src.sql_agent.rag.sql_rag import SQLRetriever
+from src.logger import logger
+
+
+def read_pairs(path: str) -> list[dict]:
+    """Pairs from a `.sql` file in the KB format or a `.jsonl` with `nl_quest`/`question` and `sql_answ`/`sql` keys"""
+    if path.endswith(".sql"):
+        return load_queries(path)
+
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            nl, sql = row.get("nl_quest", row.get("question")), row.get("sql_answ", row.get("sql"))
+            if nl and sql:
+                items.append({"id": kb_point_id(nl, sql), "nl_quest": nl, "sql_answ": sql})
+    return items
+
+
+# IMPORT
+class BulkImporter:
+    def __init__(
+            self,
+            retriever: SQLRetriever,
+            *,
+            workers: int=os.cpu_count() or 1,
+            chunk_size: int=config.BULK_CHUNK_SIZE,
+            save_every: int=config.BULK_SAVE_EVERY,
+            checkpoint_dir: str="data/cache/bulk"
+        ):
+        self.retriever = retriever
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.save_every = max(1, save_every)
+        self.checkpoint_dir = Path(checkpoint_dir)
+
+    def _checkpoint(self, path: str, collection_name: str) -> Path:
+        stat = Path(path).stat()
+        digest = hashlib.sha256(f"{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime}:{self.chunk_size}".encode()).hexdigest()[:16]
+        return self.checkpoint_dir / f"{collection_name}-{digest}.done"
+
+    def _verified(self, checkpoint: Path, chunks: list[list[dict]], collection_name: str) -> set[int]:
+        """Chunks of the checkpoint still in `collection_name` (gone if it was rebuilt or deleted since)"""
+        done = {int(line) for line in checkpoint.read_text().split()} if checkpoint.exists() else set()
+        done = {j for j in done if j < len(chunks)}
+        if not done:
+            return set()
+
+        # the last point of a chunk is written last: if it is there, the whole chunk is
+        last_ids = {chunks[j][-1]["id"]: j for j in done}
+        kept = {last_ids[pid] for pid in self.retriever.existing_ids(list(last_ids), collection_name=collection_name)}
+        if len(kept) < len(done):
+            logger.warning(f"{len(done) - len(kept)} checkpointed chunks are no longer in `{collection_name}`: re-importing them.")
+            checkpoint.write_text("".join(f"{j}\n" for j in sorted(kept)))
+        return kept
+
+    def run(self, path: str, *, collection_name: str=config.BULK_COLLECTION) -> int:
+        """Import `path` into `collection_name`; returns the number of points written in this run"""
+        if collection_name == "nl_to_sql":
+            raise ValueError("`nl_to_sql` mirrors the local KB and its syncs would delete bulk pairs: import into another collection.")
+
+        items = read_pairs(path)
+        chunks = [items[j:j + self.chunk_size] for j in range(0, len(items), self.chunk_size)]
+
+        checkpoint = self._checkpoint(path, collection_name)
+        checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        self.retriever.ensure_collection(collection_name)
+        done = self._verified(checkpoint, chunks, collection_name)
+        todo = [j for j in range(len(chunks)) if j not in done]
+
+        if done:
+            logger.info(f"Resuming bulk import: {len(done)}/{len(chunks)} chunks already written.")
+        if not todo:
+            logger.info("Nothing to import.")
+            return 0
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        written, start_time = 0, time.perf_counter()
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"), # no fork after torch/qdrant threads started
+            initializer=init_worker,
+            initargs=(threads, config.EMBEDDING_MODEL_NAME, config.EMBEDDING_BACKEND, config.EMBEDDING_ONNX_INT8_FILE)
+        ) as pool:
+            pending, queued, unsaved = set(), iter(todo), []
+            buffered: list[tuple[list[dict], np.ndarray]] = [] # numpy: chunks not yet in the index
+
+            def submit_next() -> None:
+                j = next(queued, None)
+                if j is not None:
+                    sentences = [item["nl_quest"] for item in chunks[j]]
+                    pending.add(pool.submit(embed_chunk, j, sentences, config.EMBEDDING_BATCH_SIZE))
+
+            # bounded in-flight chunks: memory stays O(workers * chunk_size)
+            for _ in range(2 * self.workers):
+                submit_next()
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending.discard(future)
+                    j, vectors = future.result()
+
+                    if self.retriever.backend == "numpy":
+                        buffered.append((chunks[j], vectors))
+                    else:
+                        self._upsert(chunks[j], vectors, collection_name)
+                    unsaved.append(j)
+                    # qdrant upserts are durable on return, the numpy index only once saved
+                    if self.retriever.backend != "numpy" or len(unsaved) >= self.save_every:
+                        self._commit(unsaved, buffered, checkpoint, collection_name)
+
+                    written += len(chunks[j])
+                    elapsed = time.perf_counter() - start_time
+                    logger.info(f"Chunk {j + 1}/{len(chunks)} written | {written} points | {written / elapsed:.1f} points/s")
+                    submit_next()
+
+            self._commit(unsaved, buffered, checkpoint, collection_name)
+
+        logger.info(f"Bulk import done: {written} points in {time.perf_counter() - start_time:.1f}s with {self.workers} workers.")
+        return written
+
+    def _upsert(self, items: list[dict], vectors: np.ndarray, collection_name: str) -> None:
+        for j in range(0, len(items), config.QDRANT_UPSERT_BATCH):
+            self.retriever.upsert_vectors(
+                items[j:j + config.QDRANT_UPSERT_BATCH],
+                vectors[j:j + config.QDRANT_UPSERT_BATCH],
+                collection_name=collection_name
+            )
+
+    def _commit(
+            self,
+            chunk_ids: list[int],
+            buffered: list[tuple[list[dict], np.ndarray]],
+            checkpoint: Path,
+            collection_name: str
+        ) -> None:
+        """Make the written chunks durable, then checkpoint them.
+
+        numpy backend: the buffered chunks go into the index in one append and one save, so an import costs
+        O(n / save_every) copies of the matrix instead of one per chunk.
+        """
+        if not chunk_ids:
+            return
+        if buffered:
+            items = [item for chunk, _ in buffered for item in chunk]
+            index = self.retriever.indexes[collection_name]
+            index.add(
+                ids=[item["id"] for item in items],
+                vectors=np.concatenate([vectors for _, vectors in buffered]),
+                payloads=[self.retriever._payload(item) for item in items]
+            )
+            index.save()
+            buffered.clear()
+        with open(checkpoint, "a") as f:
+            f.write("".join(f"{j}\n" for j in chunk_ids))
+        chunk_ids.clear()
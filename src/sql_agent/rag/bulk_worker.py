@@ -0,0 +1,22 @@
+"""
+Embedding workers of `BulkImporter`, in their own module: a spawned worker imports only this one (numpy and the
+embedding model), not `build.config` with its qdrant clients, LLM models and eager embedding model.
+"""
+import numpy as np
+
+from build.embedding import load_embedding_model
+
+_model = None # per worker process
+
+
+def init_worker(threads: int, model_name: str, backend: str, int8_file: str | None) -> None:
+    """Split the cores between workers instead of letting each one grab them all, then load the model once"""
+    global _model
+    import torch
+    torch.set_num_threads(threads)
+    _model = load_embedding_model(model_name, backend, int8_file, threads=threads) # onnx sessions too
+
+
+def embed_chunk(chunk_id: int, sentences: list[str], batch_size: int) -> tuple[int, np.ndarray]:
+    vectors = _model.encode(sentences, batch_size=batch_size, convert_to_numpy=True)
+    return chunk_id, vectors.astype(np.float32)
@@ -0,0 +1,226 @@
+import fcntl
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from src.logger import logger
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: in-memory LRU tier on top of a memory-mapped float32 store on disk.
+
+    Vectors are keyed by (model name, sha256 of the text). The disk tier lives in
+    `cache_dir/<model name>/` as two append-only files:
+        keys.txt     one text hash per line, line j <-> row j
+        vectors.f32  raw float32 rows of size `dimension`
+    The directory is shared by processes (server, CLI, bulk workers): appends hold an exclusive `flock` on
+    `cache.lock` and first read the rows appended by the others, so row numbers always follow the files.
+    """
+
+    def __init__(
+            self,
+            model_name: str,
+            dimension: int,
+            *,
+            cache_dir: str="data/cache/embeddings",
+            max_items: int=4096
+        ):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_items = max_items
+
+        self.path = Path(cache_dir) / model_name.replace("/", "__")
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.keys_file = self.path / "keys.txt"
+        self.vectors_file = self.path / "vectors.f32"
+        self.lock_file = self.path / "cache.lock"
+
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._rows: dict[str, int] = {}
+        self._n_rows = 0 # lines of `keys.txt` read so far (duplicates included)
+        self._keys_offset = 0 # bytes of `keys.txt` read so far
+        self._mmap: np.memmap | None = None
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        with self._file_lock(fcntl.LOCK_EX):
+            self._load_index()
+
+    # INDEX
+    def _file_lock(self, mode: int) -> "_FileLock":
+        return _FileLock(self.lock_file, mode)
+
+    def _n_vectors(self) -> int:
+        return self.vectors_file.stat().st_size // (4 * self.dimension) if self.vectors_file.exists() else 0
+
+    def _load_index(self) -> None:
+        """Read the row index, dropping rows half-written by an interrupted append (exclusive file lock held)"""
+        self._rows, self._n_rows, self._keys_offset, self._mmap = {}, 0, 0, None
+        if not self.keys_file.exists():
+            return
+
+        keys = self.keys_file.read_text(encoding="utf-8").split()
+        n_vectors = self._n_vectors()
+        n_rows = min(len(keys), n_vectors)
+
+        if n_rows < len(keys) or n_rows < n_vectors:
+            logger.warning(f"Embedding cache `{self.path}` is inconsistent: keeping first {n_rows} rows.")
+            self.keys_file.write_text("".join(f"{k}\n" for k in keys[:n_rows]), encoding="utf-8")
+            with open(self.vectors_file, "r+b") as f:
+                f.truncate(n_rows * 4 * self.dimension)
+
+        self._read_keys()
+        logger.debug(f"Embedding cache `{self.path}` loaded with {self._n_rows} vectors.")
+
+    def _read_keys(self) -> None:
+        """Index the complete lines appended to `keys.txt` since the last read (file lock held)"""
+        if not self.keys_file.exists():
+            return
+        with open(self.keys_file, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        data = data[:data.rfind(b"\n") + 1] # a line being written by another process is read next time
+        for k in data.decode("utf-8").split():
+            self._rows.setdefault(k, self._n_rows)
+            self._n_rows += 1
+        if data:
+            self._keys_offset += len(data)
+            self._mmap = None
+
+    def _refresh(self) -> None:
+        """Pick up the rows appended by other processes"""
+        if self.keys_file.exists() and self.keys_file.stat().st_size > self._keys_offset:
+            with self._file_lock(fcntl.LOCK_SH):
+                self._read_keys()
+
+    def _vectors(self) -> np.memmap | None:
+        """Lazily (re)map the on-disk vectors"""
+        if self._mmap is None and self._n_rows:
+            self._mmap = np.memmap(
+                self.vectors_file,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._n_rows, self.dimension)
+            )
+        return self._mmap
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # LOOKUP
+    def get_many(self, texts: list[str]) -> list[np.ndarray | None]:
+        """Return the cached vector for each text, `None` for misses"""
+        found = []
+        with self._lock:
+            if any(self.key(text) not in self._lru and self.key(text) not in self._rows for text in texts):
+                self._refresh()
+            for text in texts:
+                k = self.key(text)
+
+                if k in self._lru:
+                    self._lru.move_to_end(k)
+                    self.memory_hits += 1
+                    found.append(self._lru[k])
+
+                elif k in self._rows:
+                    vector = np.array(self._vectors()[self._rows[k]])
+                    self._remember(k, vector)
+                    self.disk_hits += 1
+                    found.append(vector)
+
+                else:
+                    self.misses += 1
+                    found.append(None)
+
+        return found
+
+    def put_many(self, texts: list[str], vectors: np.ndarray) -> None:
+        """Store new vectors in both tiers"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+
+        with self._lock:
+            new_keys, new_rows = {}, []
+            for text, vector in zip(texts, vectors):
+                self._remember(self.key(text), vector)
+
+            with self._file_lock(fcntl.LOCK_EX):
+                self._read_keys()
+                if self._n_vectors() != self._n_rows: # orphan rows of an interrupted append
+                    self._load_index()
+
+                for text, vector in zip(texts, vectors):
+                    k = self.key(text)
+                    if k not in self._rows and k not in new_keys:
+                        new_keys[k] = None
+                        new_rows.append(vector)
+
+                if not new_keys:
+                    return
+
+                # vectors first: a crash between the two writes leaves orphan rows, trimmed by the next writer
+                with open(self.vectors_file, "ab") as f:
+                    f.write(np.stack(new_rows).astype(np.float32).tobytes())
+                with open(self.keys_file, "a", encoding="utf-8") as f:
+                    f.writelines(f"{k}\n" for k in new_keys)
+                self._read_keys()
+
+    def _remember(self, k: str, vector: np.ndarray) -> None:
+        self._lru[k] = vector
+        self._lru.move_to_end(k)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    # STATS
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "memory_items": len(self._lru),
+            "disk_items": len(self._rows),
+        }
+
+
+class _FileLock:
+    """`flock` on `path` for the duration of a `with` block (`LOCK_SH` or `LOCK_EX`)"""
+
+    def __init__(self, path: Path, mode: int):
+        self.path = path
+        self.mode = mode
+        self._file = None
+
+    def __enter__(self) -> "_FileLock":
+        self._file = open(self.path, "a")
+        fcntl.flock(self._file, self.mode)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+_caches: dict[tuple[str, str], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, dimension: int, *, cache_dir: str, max_items: int) -> EmbeddingCache:
+    """Shared cache per (model, directory) in the process; processes share the disk tier through file locks"""
+    with _caches_lock:
+        key = (model_name, str(Path(cache_dir).resolve()))
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(model_name, dimension, cache_dir=cache_dir, max_items=max_items)
+        return _caches[key]
@@ -1,17 +1,60 @@
+import numpy as np
+
 from build.config import config
+from src.sql_agent.rag.cache import get_embedding_cache
 
 class Embedder:
     """Embedder for SentenceTransformer by HuggingFace"""
     def __init__(
-            self, 
+            self,
             model=config.EMBEDDING_MODEL, # all-MiniLM-L6-v2
             client=config.EMBEDDING_CLIENT,
-            dimension=config.EMBEDDING_DIM
+            dimension=config.EMBEDDING_DIM,
+            batch_size: int=config.EMBEDDING_BATCH_SIZE,
+            model_name: str=config.EMBEDDING_MODEL_NAME,
+            backend: str=config.EMBEDDING_BACKEND,
+            use_cache: bool=config.EMBEDDING_CACHE
         ):
-        self.embedding_model = model 
+        self.embedding_model = model
         self.embedding_client = client
         self.embedding_dim = dimension
+        self.batch_size = batch_size
+        self.model_name = model_name
+        self.backend = backend
+        self.cache = get_embedding_cache(
+            self.key, # backends give slightly different vectors
+            dimension,
+            cache_dir=config.EMBEDDING_CACHE_DIR,
+            max_items=config.EMBEDDING_CACHE_SIZE
+        ) if use_cache else None
+
+    @property
+    def key(self) -> str:
+        """`model@backend`: vectors of different keys are not comparable"""
+        return f"{self.model_name}@{self.backend}"
+
+    def get_embeddings(self, sentences: list[str], *, batch_size: int | None=None) -> list[list[float]]:
+        """Encode `sentences` in batches of `batch_size`, running the model only on cache misses"""
+        if self.cache is None:
+            return self._encode(sentences, batch_size).tolist()
+
+        vectors = self.cache.get_many(sentences)
+        missing = list(dict.fromkeys(s for s, v in zip(sentences, vectors) if v is None))
+
+        if missing:
+            encoded = self._encode(missing, batch_size)
+            self.cache.put_many(missing, encoded)
+            fresh = dict(zip(missing, encoded))
+            vectors = [fresh[s] if v is None else v for s, v in zip(sentences, vectors)]
+
+        return np.stack(vectors).tolist() if vectors else []
+
+    def _encode(self, sentences: list[str], batch_size: int | None=None) -> np.ndarray:
+        return self.embedding_model.encode(
+            sentences,
+            batch_size=batch_size or self.batch_size,
+            convert_to_numpy=True,
+        )
 
-    def get_embeddings(self, sentences: list[str]) -> list[float]:
-        embeddings = self.embedding_model.encode(sentences)
-        return embeddings.tolist()
\ No newline at end of file
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else {}
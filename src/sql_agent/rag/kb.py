@@ -0,0 +1,5 @@
+from build.config import config
+from sql.utils.load_nl_sql_pairs import KBIndex
+
+# Singleton: the few-shot KB of `config.KB_SOURCES`
+kb_index = KBIndex(config.KB_SOURCES)
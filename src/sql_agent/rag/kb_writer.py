@@ -0,0 +1,113 @@
+import queue
+import threading
+
+import numpy as np
+
+from build.config import config
+from sql.utils.load_nl_sql_pairs import kb_point_id
+from src.sql_agent.rag.sql_rag import SQLRetriever, sql_retriever
+from src.logger import logger
+
+
+class KBWriter:
+    """Background writer growing the few-shot KB with validated (question, sql) pairs.
+
+    `submit` only enqueues, so the agent turn never waits on embedding or upserts. A daemon thread drains the queue
+    in batches, drops questions already covered by the curated or learned collections (cosine >= threshold) and
+    upserts the rest into `collection_name` with content-hash ids.
+    """
+
+    def __init__(
+            self,
+            retriever: SQLRetriever=sql_retriever,
+            *,
+            collection_name: str=config.LEARNED_COLLECTION,
+            threshold: float=config.KB_DEDUP_THRESHOLD,
+            batch_size: int=config.KB_WRITER_BATCH
+        ):
+        self.retriever = retriever
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.queue: queue.Queue[tuple[str, str] | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+        self.written = 0
+        self.duplicates = 0
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="kb-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None=None) -> None:
+        """Flush what is queued and stop the worker"""
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, question: str, sql: str) -> None:
+        self.start()
+        self.queue.put((question.strip(), sql.strip()))
+
+    # WORKER
+    def _run(self) -> None:
+        try:
+            self.retriever.ensure_collection(self.collection_name)
+        except Exception as e:
+            logger.error(f"KB writer: cannot create collection `{self.collection_name}`: {e}")
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"KB writer: failed to write {len(batch)} pairs: {e}")
+
+            if stop:
+                return
+
+    def _write(self, batch: list[tuple[str, str]]) -> None:
+        items = []
+        seen: list[np.ndarray] = []
+        vectors = self.retriever.hf_embedder.get_embeddings([q for q, _ in batch]) # cached for later lookups
+
+        for (question, sql), vector in zip(batch, vectors):
+            vector = np.asarray(vector) / (np.linalg.norm(vector) or 1)
+            if self._is_known(question) or any(float(vector @ v) >= self.threshold for v in seen):
+                self.duplicates += 1
+                continue
+
+            seen.append(vector)
+            items.append({"id": kb_point_id(question, sql), "nl_quest": question, "sql_answ": sql})
+
+        if items:
+            self.written += self.retriever.add_items(items, collection_name=self.collection_name)
+            logger.info(f"KB writer: {len(items)} new examples in `{self.collection_name}` ({self.duplicates} duplicates so far).")
+
+    def _is_known(self, question: str) -> bool:
+        for collection_name in ("nl_to_sql", self.collection_name):
+            hits = self.retriever.search(question, collection_name=collection_name, top_k=1)
+            if hits and hits[0]["score"] >= self.threshold:
+                return True
+        return False
+
+
+# Singleton
+kb_writer = KBWriter()
@@ -0,0 +1,105 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from src.logger import logger
+
+
+class NumpyIndex:
+    """In-process exact cosine index: a contiguous float32 matrix of L2-normalized vectors plus their payloads.
+
+    Saved in `index_dir/<collection name>/` as `vectors.npy` (memory-mapped on load) and `payloads.json`, with the
+    `meta` the index was built with (e.g. embedding model, KB hash) so a stale index can be told apart.
+    """
+
+    def __init__(self, collection_name: str="nl_to_sql", *, index_dir: str="data/cache/index"):
+        self.collection_name = collection_name
+        self.path = Path(index_dir) / collection_name
+        self.vectors: np.ndarray | None = None
+        self.ids: list = []
+        self.payloads: list[dict] = []
+        self.meta: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    @property
+    def loaded(self) -> bool:
+        return self.vectors is not None
+
+    def exists(self) -> bool:
+        return (self.path / "vectors.npy").exists() and (self.path / "payloads.json").exists()
+
+    def build(self, ids: list, vectors: list[list[float]], payloads: list[dict], *, meta: dict | None=None) -> None:
+        """Replace the index content with the given points"""
+        self.vectors = self._normalize(vectors, len(payloads))
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        if meta is not None:
+            self.meta = dict(meta)
+
+    def add(self, ids: list, vectors: list[list[float]], payloads: list[dict]) -> int:
+        """Append the points whose id is not indexed yet; returns how many were added"""
+        known = set(self.ids)
+        new = [(i, v, p) for i, v, p in zip(ids, vectors, payloads) if i not in known]
+        if not new:
+            return 0
+
+        new_ids, new_vectors, new_payloads = map(list, zip(*new))
+        if not len(self):
+            self.build(new_ids, new_vectors, new_payloads)
+        else:
+            # payloads first: a concurrent search only ever sees rows that have a payload
+            self.ids += new_ids
+            self.payloads += new_payloads
+            self.vectors = np.concatenate([self.vectors, self._normalize(new_vectors, len(new_payloads))])
+        return len(new)
+
+    @staticmethod
+    def _normalize(vectors: list[list[float]], n: int) -> np.ndarray:
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not n:
+            return matrix.reshape(0, 0)
+        matrix = matrix.reshape(n, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def save(self) -> None:
+        """Write to temporary files then rename: processes with the old `vectors.npy` memory-mapped keep reading
+        the old file, never a half-written one"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_vectors = self.path / f"vectors.npy.{os.getpid()}.tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, self.vectors)
+        tmp_payloads = self.path / f"payloads.json.{os.getpid()}.tmp"
+        tmp_payloads.write_text(
+            json.dumps({"meta": self.meta, "ids": self.ids, "payloads": self.payloads}, ensure_ascii=False),
+            encoding="utf-8"
+        )
+        os.replace(tmp_vectors, self.path / "vectors.npy")
+        os.replace(tmp_payloads, self.path / "payloads.json")
+        logger.info(f"Index `{self.collection_name}` saved with {len(self)} vectors in `{self.path}`.")
+
+    def load(self) -> None:
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        data = json.loads((self.path / "payloads.json").read_text(encoding="utf-8"))
+        self.ids, self.payloads = data["ids"], data["payloads"]
+        self.meta = data.get("meta", {}) # none in indexes saved before it existed: stale
+        logger.debug(f"Index `{self.collection_name}` loaded with {len(self)} vectors.")
+
+    def search(self, query: list[float], *, top_k: int=5) -> list[tuple[dict, float]]:
+        """Exact cosine top-k as (payload, score) pairs sorted by decreasing score"""
+        if not len(self):
+            return []
+
+        q = np.array(query, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1
+        scores = self.vectors @ q
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(self.payloads[j], float(scores[j])) for j in top]
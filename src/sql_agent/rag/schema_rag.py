@@ -0,0 +1,170 @@
+from uuid import NAMESPACE_URL, uuid5
+
+from pandas import DataFrame
+from psycopg2 import connect
+from psycopg2.extensions import connection
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct, VectorParams, Distance
+
+from build.config import config
+from sql.utils.metadata_general_query import get_schema_columns_query
+from src.ingestion.refiner import DBRefiner
+from src.sql_agent.rag.embedder import Embedder
+from src.sql_agent.rag.numpy_index import NumpyIndex
+from src.sql_agent.rag.sql_rag import RetrievalBackend
+from src.logger import logger
+
+
+class SchemaRetriever:
+    """Column-level schema RAG: one vector per `table.column` (type + comment), so `getMetadata`
+    can return only the columns relevant to a question plus the keys needed for joins"""
+
+    def __init__(
+            self,
+            qclient: QdrantClient=config.QCLIENT,
+            *,
+            backend: RetrievalBackend=config.RETRIEVAL_BACKEND,
+            embedder: Embedder | None=None,
+            collection_name: str=config.SCHEMA_COLLECTION
+        ):
+        self.qclient = qclient
+        self.backend = backend
+        self.hf_embedder = embedder or Embedder()
+        self.collection_name = collection_name
+        self._columns: list[dict] | None = None
+        self._index: NumpyIndex | None = None
+
+    # BUILD
+    def load_columns(self, conn: connection | None=None) -> list[dict]:
+        """Live columns from `information_schema` + `pg_description`, falling back to `DBRefiner.comments`"""
+        own_conn = conn is None
+        conn = conn or connect(**config.DB_CONFIG)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(get_schema_columns_query())
+                names = [col[0] for col in cursor.description]
+                rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            if own_conn:
+                conn.close()
+
+        for row in rows:
+            row["description"] = row["description"] or DBRefiner.comments.get(row["table_name"], {}).get(row["column_name"])
+        return rows
+
+    @staticmethod
+    def _document(column: dict) -> str:
+        return f"{column['table_name']}.{column['column_name']} ({column['data_type']}): {column['description'] or ''}"
+
+    def build(self, columns: list[dict] | None=None) -> int:
+        """(Re)create the schema collection from the live catalog"""
+        columns = columns or self.load_columns()
+        vectors = self.hf_embedder.get_embeddings([self._document(c) for c in columns])
+        ids = [str(uuid5(NAMESPACE_URL, f"{c['table_name']}.{c['column_name']}")) for c in columns]
+
+        if self.backend == "numpy":
+            index = NumpyIndex(self.collection_name, index_dir=config.NUMPY_INDEX_DIR)
+            index.build(ids=ids, vectors=vectors, payloads=columns, meta={"embedder": self.hf_embedder.key})
+            index.save()
+            self._index = index
+
+        else:
+            if self.qclient.collection_exists(self.collection_name):
+                self.qclient.delete_collection(self.collection_name)
+            self.qclient.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=self.hf_embedder.embedding_dim, distance=Distance.COSINE)
+            )
+            self.qclient.upsert(
+                collection_name=self.collection_name,
+                wait=True,
+                points=[
+                    PointStruct(id=pid, vector=vector, payload=column)
+                    for pid, vector, column in zip(ids, vectors, columns)
+                ]
+            )
+
+        self._columns = columns
+        logger.info(f"Schema collection `{self.collection_name}` built with {len(columns)} columns.")
+        return len(columns)
+
+    # LOOKUP
+    @property
+    def columns(self) -> list[dict]:
+        """Every indexed column (payloads), loaded once"""
+        if self._columns is None:
+            if self.backend == "numpy":
+                self._columns = self._get_index().payloads
+            else:
+                columns, offset = [], None
+                while True: # page by page, a large schema does not fit one scroll
+                    points, offset = self.qclient.scroll(
+                        collection_name=self.collection_name,
+                        limit=config.QDRANT_SCROLL_PAGE,
+                        offset=offset,
+                        with_payload=True,
+                        with_vectors=False
+                    )
+                    columns.extend(p.payload for p in points)
+                    if offset is None:
+                        break
+                self._columns = columns
+        return self._columns
+
+    def _get_index(self) -> NumpyIndex:
+        if self._index is None:
+            index = NumpyIndex(self.collection_name, index_dir=config.NUMPY_INDEX_DIR)
+            if not index.exists():
+                self.build()
+                return self._index
+            index.load()
+            if index.meta.get("embedder") != self.hf_embedder.key:
+                logger.info(f"Index `{self.collection_name}` built with another embedding model. Rebuilding it...")
+                self.build()
+                return self._index
+            self._index = index
+        return self._index
+
+    def search(self, user_query: str, *, tables: list[str] | None=None, top_k: int=config.SCHEMA_TOP_K) -> list[dict]:
+        """Top-k columns for `user_query` (restricted to `tables`), plus primary/foreign keys of the tables involved"""
+        query = self.hf_embedder.get_embeddings([user_query,])[0]
+        candidates = top_k * 3 if tables else top_k
+
+        if self.backend == "numpy":
+            hits = self._get_index().search(query, top_k=candidates)
+        else:
+            points = self.qclient.query_points(
+                collection_name=self.collection_name, query=query, limit=candidates, with_payload=True
+            ).points
+            hits = [(p.payload, p.score) for p in points]
+
+        selected = [
+            dict(column, score=score) for column, score in hits
+            if not tables or column["table_name"] in tables
+        ][:top_k]
+
+        involved = {c["table_name"] for c in selected}
+        chosen = {(c["table_name"], c["column_name"]) for c in selected}
+        keys = [
+            dict(column, score=None) for column in self.columns
+            if column["table_name"] in involved
+            and (column["primary_key"] or column["foreign_key"])
+            and (column["table_name"], column["column_name"]) not in chosen
+        ]
+
+        return selected + keys
+
+    @staticmethod
+    def format(columns: list[dict]) -> str:
+        """Render like `getMetadata`: one block per table"""
+        res = ""
+        for table_name in dict.fromkeys(c["table_name"] for c in columns):
+            rows = [c for c in columns if c["table_name"] == table_name]
+            res += f"\n--- Tabella: {table_name} ---\n"
+            df = DataFrame(rows, columns=["column_name", "data_type", "primary_key", "foreign_key", "description"])
+            res += df.to_string() + "\n"
+        return res
+
+
+# Singleton
+schema_retriever = SchemaRetriever()
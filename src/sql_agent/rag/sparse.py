@@ -0,0 +1,60 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN_REGEX = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase identifier-aware tokens: `ST_DWithin` -> st_dwithin, st, dwithin"""
+    tokens = []
+    for token in TOKEN_REGEX.findall(text.lower()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+class BM25Index:
+    """Local inverted index with Okapi BM25 scoring, for keyword-heavy intents dense embeddings miss"""
+
+    def __init__(self, *, k1: float=1.2, b: float=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[tuple[int, int]]] = defaultdict(list) # token -> [(doc, tf)]
+        self.doc_len: list[int] = []
+        self.payloads: list[dict] = []
+        self.avg_len = 0.0
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def build(self, documents: list[str], payloads: list[dict]) -> None:
+        self.postings.clear()
+        self.doc_len = []
+        self.payloads = list(payloads)
+
+        for j, document in enumerate(documents):
+            tokens = tokenize(document)
+            self.doc_len.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                self.postings[token].append((j, tf))
+
+        self.avg_len = sum(self.doc_len) / len(self.doc_len) if self.doc_len else 0.0
+
+    def _idf(self, token: str) -> float:
+        df = len(self.postings.get(token, ()))
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, *, top_k: int=5) -> list[tuple[dict, float]]:
+        """BM25 top-k as (payload, score) pairs, only documents sharing at least one token"""
+        scores: dict[int, float] = defaultdict(float)
+
+        for token in set(tokenize(query)):
+            idf = self._idf(token)
+            for doc, tf in self.postings.get(token, ()):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc] / self.avg_len)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [(self.payloads[doc], score) for doc, score in top]
@@ -1,33 +1,83 @@
-from typing import Optional
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance
+import asyncio
+import hashlib
+import time
+from typing import Literal, Optional
+import numpy as np
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    PointStruct,
+    PointIdsList,
+    VectorParams,
+    Distance,
+    SearchParams,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+)
 from qdrant_client.http.exceptions import UnexpectedResponse
 
 from build.config import config
 from src.sql_agent.rag.embedder import Embedder
-from sql.utils.load_nl_sql_pairs import load_queries
+from src.sql_agent.rag.numpy_index import NumpyIndex
+from src.sql_agent.rag.sparse import BM25Index
+from src.sql_agent.rag.kb import kb_index
+from sql.utils.load_nl_sql_pairs import KBIndex
 from src.logger import logger
 
 
+RetrievalBackend = Literal["qdrant", "numpy"]
+Quantization = Literal["none", "scalar", "binary"]
+
+
 class SQLRetriever:
-    def __init__(self, qclient: QdrantClient=config.QCLIENT):
-        """Initialize class for SQL retrieving with param a singleton qdrant client"""
-        self.hf_embedder = Embedder()
+    def __init__(
+            self,
+            qclient: QdrantClient=config.QCLIENT,
+            *,
+            aqclient: AsyncQdrantClient | None=config.AQCLIENT,
+            backend: RetrievalBackend=config.RETRIEVAL_BACKEND,
+            embedder: Embedder | None=None,
+            kb: KBIndex=kb_index
+        ):
+        """Initialize class for SQL retrieving with param a singleton qdrant client (and its async twin for `asearch`).
+
+        With `backend="numpy"` collections are served by an in-process `NumpyIndex` and qdrant is never contacted.
+        """
+        self.hf_embedder = embedder or Embedder()
         self.qclient = qclient
-        self.queries_kb = load_queries()
+        self.aqclient = aqclient
+        self.checked_collections: set[str] = set() # collections known to exist
+        self.backend = backend
+        self.indexes: dict[str, NumpyIndex] = {}
+        self.sparse_indexes: dict[str, BM25Index] = {} # BM25 per collection, built on first hybrid search
+        self.kb = kb
+        self.kb.on_reload(self._invalidate_kb)
         self.size = self.hf_embedder.embedding_dim
 
     def create_collection(
             self, 
             collection_name: str="nl_to_sql",
             force_rebuild: bool=False,
+            quantization: Quantization=config.QDRANT_QUANTIZATION,
         ) -> Optional[object] | None:
-        """Create a collection called `collection_name`"""
+        """Create a collection called `collection_name`.
+
+        With `quantization` other than "none", the compressed vectors stay in RAM and the float32 originals go on disk
+        (they are only read to rescore the oversampled candidates).
+        """
+
+        if self.backend == "numpy":
+            return self._build_index(collection_name) if force_rebuild else self._get_index(collection_name)
 
-        v_cfg = VectorParams(size=self.size, distance=Distance.COSINE)
+        v_cfg = VectorParams(size=self.size, distance=Distance.COSINE, on_disk=quantization != "none")
+        q_cfg = self._quantization_config(quantization)
 
         if force_rebuild:
             logger.debug(f"Force rebuild activated for collection `{collection_name}`.")
+            self.checked_collections.discard(collection_name)
 
             try:
                 logger.debug(f"Attempt to delete collection: `{collection_name}`.")
@@ -41,7 +91,8 @@ class SQLRetriever:
                 logger.debug(f"Creating collection `{collection_name}`...")
                 self.qclient.create_collection(
                     collection_name=collection_name,
-                    vectors_config=v_cfg
+                    vectors_config=v_cfg,
+                    quantization_config=q_cfg
                 )
                 logger.info(f"Collection `{collection_name}` created (force rebuild)")
 
@@ -67,7 +118,8 @@ class SQLRetriever:
             try:
                 self.qclient.create_collection(
                     collection_name=collection_name,
-                    vectors_config=v_cfg
+                    vectors_config=v_cfg,
+                    quantization_config=q_cfg
                 )
                 logger.info(f"Collection `{collection_name}` created.")
 
@@ -82,35 +134,209 @@ class SQLRetriever:
                 return None
 
 
+    @staticmethod
+    def _quantization_config(quantization: Quantization) -> ScalarQuantization | BinaryQuantization | None:
+        if quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    @staticmethod
+    def _search_params(*, exact: bool=False) -> SearchParams:
+        """Oversample + rescore on quantized collections (no-op otherwise); `exact` gives the full-precision baseline"""
+        if exact:
+            return SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+        return SearchParams(
+            quantization=QuantizationSearchParams(rescore=True, oversampling=config.QDRANT_OVERSAMPLING)
+        )
+
     def embed(self, collection_name: str="nl_to_sql") -> None:
         """Create vectors and embed them in the qdrant collection"""
-        
-        try:
-            self.qclient.collection_exists(collection_name)
-        
-        except Exception: # TODO: specialized exception
-            logger.error("Collection must exist.")
-
-        points = [
-            PointStruct(
-                id=item["id"],
-                vector=self.hf_embedder.get_embeddings([item["nl_quest"],])[0],
-                payload={
-                    "nl_quest": item["nl_quest"],
-                    "sql_answ": item["sql_answ"],
-                    "step_by_step": "<placeholder>"
-                }
-            )
-            for item in self.queries_kb
-        ]
+
+        if self.backend == "numpy":
+            self._build_index(collection_name)
+            return
+
+        if not self.check_collection(collection_name):
+            return
 
         logger.debug("Embedding points...")
+        n_points = self._upsert_items(self.queries_kb, collection_name=collection_name)
+        logger.info(f" >> Embedded {n_points} points in the collection `{collection_name}`.")
+
+    def _upsert_items(
+            self,
+            items: list[dict],
+            *,
+            collection_name: str="nl_to_sql",
+            chunk_size: int=config.QDRANT_UPSERT_BATCH
+    ) -> int:
+        """Embed `items` in batches and upsert them chunk by chunk, so memory stays bounded by `chunk_size`"""
+
+        start_time = time.perf_counter()
+
+        for j in range(0, len(items), chunk_size):
+            chunk = items[j:j + chunk_size]
+            vectors = self.hf_embedder.get_embeddings([item["nl_quest"] for item in chunk])
+            self.upsert_vectors(chunk, vectors, collection_name=collection_name)
+            logger.debug(f"Upserted chunk {j // chunk_size + 1} ({len(chunk)} points) in `{collection_name}`.")
+
+        elapsed = time.perf_counter() - start_time
+        if items:
+            logger.debug(f"Embedded {len(items)} items in {elapsed:.3f}s ({len(items) / elapsed:.1f} items/s).")
+            logger.debug(f"Embedding cache: {self.hf_embedder.cache_stats()}")
+
+        return len(items)
+
+    def upsert_vectors(self, items: list[dict], vectors, *, collection_name: str="nl_to_sql") -> None:
+        """Write already computed `vectors` of `items` in one qdrant request"""
         self.qclient.upsert(
             collection_name=collection_name,
             wait=True,
-            points=points
+            points=[
+                PointStruct(
+                    id=item["id"],
+                    vector=list(map(float, vector)),
+                    payload=self._payload(item)
+                )
+                for item, vector in zip(items, vectors)
+            ]
+        )
+
+    @staticmethod
+    def _payload(item: dict) -> dict:
+        return {
+            "nl_quest": item["nl_quest"],
+            "sql_answ": item["sql_answ"],
+            "step_by_step": "<placeholder>"
+        }
+
+    @staticmethod
+    def _to_result(payload: dict, score: float) -> dict:
+        return {
+            "nl": payload.get("nl_quest"),
+            "sql": payload.get("sql_answ"),
+            "dsc": payload.get("step_by_step"),
+            "score": score,
+        }
+
+    @property
+    def queries_kb(self) -> list[dict]:
+        """Few-shot KB entries, loaded lazily from the shared index"""
+        return self.kb.entries
+
+    # COLLECTION CHECKS
+    def check_collection(self, collection_name: str="nl_to_sql") -> bool:
+        """Check once that `collection_name` exists; only positive answers are cached"""
+        if collection_name in self.checked_collections:
+            return True
+
+        if self.qclient.collection_exists(collection_name):
+            self.checked_collections.add(collection_name)
+            return True
+
+        logger.error(f"Collection `{collection_name}` must exist.")
+        return False
+
+    async def acheck_collection(self, collection_name: str="nl_to_sql") -> bool:
+        """Async twin of `check_collection`"""
+        if collection_name in self.checked_collections:
+            return True
+
+        if await self.aqclient.collection_exists(collection_name):
+            self.checked_collections.add(collection_name)
+            return True
+
+        logger.error(f"Collection `{collection_name}` must exist.")
+        return False
+
+    # NUMPY BACKEND
+    def _build_index(self, collection_name: str="nl_to_sql", items: list[dict] | None=None) -> NumpyIndex:
+        """(Re)build the in-process index of `collection_name` from `items` (default: the local KB) and save it"""
+        from_kb = items is None
+        items = self.queries_kb if from_kb else items
+        index = NumpyIndex(collection_name, index_dir=config.NUMPY_INDEX_DIR)
+        index.build(
+            ids=[item["id"] for item in items],
+            vectors=self.hf_embedder.get_embeddings([item["nl_quest"] for item in items]),
+            payloads=[self._payload(item) for item in items],
+            meta={"embedder": self.hf_embedder.key, "kb": self._kb_hash() if from_kb else None}
         )
-        logger.info(f" >> Embedded {len(points)} points in the collection `{collection_name}`.")
+        index.save()
+        self.indexes[collection_name] = index
+        return index
+
+    def _get_index(self, collection_name: str="nl_to_sql") -> NumpyIndex:
+        """Memory-map the saved index on first use, building it when missing (empty for the learned/bulk collections).
+
+        A saved index built with another embedding model/backend, or (KB collections) from another KB, is rebuilt:
+        KB collections from the current KB, the learned/bulk ones by re-embedding their own questions.
+        """
+        if collection_name not in self.indexes:
+            own_points = collection_name in (config.LEARNED_COLLECTION, config.BULK_COLLECTION)
+            index = NumpyIndex(collection_name, index_dir=config.NUMPY_INDEX_DIR)
+            if not index.exists():
+                logger.info(f"Index `{collection_name}` not found. Building it...")
+                return self._build_index(collection_name, [] if own_points else None)
+
+            index.load()
+            if index.meta.get("embedder") != self.hf_embedder.key or (not own_points and index.meta.get("kb") != self._kb_hash()):
+                logger.info(f"Index `{collection_name}` built with another KB or embedding model ({index.meta}). Rebuilding it...")
+                items = [{"id": pid, **payload} for pid, payload in zip(index.ids, index.payloads)] if own_points else None
+                return self._build_index(collection_name, items)
+            self.indexes[collection_name] = index
+
+        return self.indexes[collection_name]
+
+    def _kb_hash(self) -> str:
+        """Fingerprint of the KB content: entry ids are hashes of their (question, sql)"""
+        return hashlib.sha256("\n".join(sorted(item["id"] for item in self.queries_kb)).encode()).hexdigest()[:16]
+
+    def _invalidate_kb(self) -> None:
+        """`KBIndex.reload` hook: the dense and sparse indexes of the curated collection are rebuilt on next use
+        (the saved dense index no longer matches the KB hash)"""
+        self.sparse_indexes.pop("nl_to_sql", None)
+        self.indexes.pop("nl_to_sql", None)
+
+    def add_items(self, items: list[dict], *, collection_name: str=config.LEARNED_COLLECTION) -> int:
+        """Embed and add `items` ({id, nl_quest, sql_answ}) to `collection_name`, creating it if needed"""
+        if self.backend == "numpy":
+            index = self._get_index(collection_name)
+            added = index.add(
+                ids=[item["id"] for item in items],
+                vectors=self.hf_embedder.get_embeddings([item["nl_quest"] for item in items]),
+                payloads=[self._payload(item) for item in items]
+            )
+            if added:
+                index.save()
+                self.sparse_indexes.pop(collection_name, None) # rebuilt with the new points
+            return added
+
+        self.ensure_collection(collection_name)
+        added = self._upsert_items(items, collection_name=collection_name)
+        self.sparse_indexes.pop(collection_name, None)
+        return added
+
+    def existing_ids(self, ids: list[str], *, collection_name: str) -> set[str]:
+        """The ones of `ids` that are points of `collection_name`"""
+        if self.backend == "numpy":
+            return set(ids) & set(self._get_index(collection_name).ids)
+        if not self.qclient.collection_exists(collection_name):
+            return set()
+        points = self.qclient.retrieve(collection_name, ids=ids, with_payload=False, with_vectors=False)
+        return {str(p.id) for p in points}
+
+    def ensure_collection(self, collection_name: str) -> None:
+        """Create `collection_name` if missing (once per process)"""
+        if self.backend == "numpy":
+            self._get_index(collection_name)
+
+        elif collection_name not in self.checked_collections:
+            self.create_collection(collection_name)
+            self.checked_collections.add(collection_name)
 
     
     def search(
@@ -122,11 +348,13 @@ class SQLRetriever:
     ) -> list[dict]:
         """Vector similarity search method"""
 
-        try:
-            self.qclient.collection_exists(collection_name)
-        
-        except Exception: # TODO: specialized exception
-            logger.error("Collection must exist.")
+        if self.backend == "numpy":
+            query = self.hf_embedder.get_embeddings([user_query,])[0]
+            hits = self._get_index(collection_name).search(query, top_k=top_k)
+            return [self._to_result(payload, score) for payload, score in hits]
+
+        if not self.check_collection(collection_name):
+            return []
 
         # User query embedding
         query = self.hf_embedder.get_embeddings([user_query,])[0]
@@ -136,28 +364,179 @@ class SQLRetriever:
             collection_name=collection_name,
             query=query,
             limit=top_k,
+            search_params=self._search_params(),
             with_payload=True
         )
 
-        return [
-            {
-                "nl": point.payload.get("nl_quest"),
-                "sql": point.payload.get("sql_answ"),
-                "dsc": point.payload.get("step_by_step"),
-                "score": point.score,
-            }
-            for point in results.points
-        ]
+        return [self._to_result(point.payload, point.score) for point in results.points]
+
+    async def asearch(
+            self,
+            user_query: str,
+            *,
+            collection_name: str="nl_to_sql",
+            top_k: int=5
+    ) -> list[dict]:
+        """Async vector similarity search: embedding runs in a worker thread, qdrant is queried with the async client"""
+
+        if self.backend == "numpy" or self.aqclient is None:
+            return await asyncio.to_thread(
+                self.search, user_query, collection_name=collection_name, top_k=top_k
+            )
+
+        if not await self.acheck_collection(collection_name):
+            return []
+
+        query = (await asyncio.to_thread(self.hf_embedder.get_embeddings, [user_query,]))[0]
+
+        results = await self.aqclient.query_points(
+            collection_name=collection_name,
+            query=query,
+            limit=top_k,
+            search_params=self._search_params(),
+            with_payload=True
+        )
+
+        return [self._to_result(point.payload, point.score) for point in results.points]
     
+    # HYBRID (sparse + dense)
+    def _collection_payloads(self, collection_name: str) -> list[dict]:
+        """Payloads of every point of `collection_name`: the local KB for the curated collection"""
+        if collection_name == "nl_to_sql":
+            return [self._payload(item) for item in self.queries_kb]
+
+        if self.backend == "numpy":
+            return list(self._get_index(collection_name).payloads)
+
+        if not self.check_collection(collection_name):
+            return []
+        payloads, offset = [], None
+        while True:
+            points, offset = self.qclient.scroll(
+                collection_name=collection_name,
+                limit=config.QDRANT_SCROLL_PAGE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            payloads.extend(p.payload for p in points)
+            if offset is None:
+                return payloads
+
+    def sparse_index(self, collection_name: str="nl_to_sql") -> BM25Index:
+        """BM25 index over nl question + sql of the points of `collection_name`, so identifiers like
+        `ST_DWithin` or `TCI_10m` match"""
+        if collection_name not in self.sparse_indexes:
+            payloads = self._collection_payloads(collection_name)
+            index = BM25Index()
+            index.build(
+                documents=[f"{p['nl_quest']}\n{p['sql_answ']}" for p in payloads],
+                payloads=payloads
+            )
+            self.sparse_indexes[collection_name] = index
+        return self.sparse_indexes[collection_name]
+
+    def hybrid_search(
+            self,
+            user_query: str,
+            *,
+            collection_name: str="nl_to_sql",
+            top_k: int=5
+    ) -> list[dict]:
+        """Dense search fused with BM25: score = alpha * cosine + (1 - alpha) * bm25 / max(bm25)"""
+        dense = self.search(user_query, collection_name=collection_name, top_k=top_k * config.HYBRID_CANDIDATES)
+        return self._fuse(user_query, dense, collection_name=collection_name, top_k=top_k)
+
+    async def ahybrid_search(
+            self,
+            user_query: str,
+            *,
+            collection_name: str="nl_to_sql",
+            top_k: int=5
+    ) -> list[dict]:
+        """Async twin of `hybrid_search`"""
+        dense = await self.asearch(user_query, collection_name=collection_name, top_k=top_k * config.HYBRID_CANDIDATES)
+        return await asyncio.to_thread(self._fuse, user_query, dense, collection_name=collection_name, top_k=top_k)
+
+    def _fuse(self, user_query: str, dense: list[dict], *, collection_name: str="nl_to_sql", top_k: int=5) -> list[dict]:
+        sparse = self.sparse_index(collection_name).search(user_query, top_k=top_k * config.HYBRID_CANDIDATES)
+        max_sparse = sparse[0][1] if sparse else 1.0
+
+        candidates = {r["nl"]: dict(r, dense_score=r["score"], sparse_score=0.0) for r in dense}
+        for payload, score in sparse:
+            candidate = candidates.setdefault(
+                payload["nl_quest"], dict(self._to_result(payload, 0.0), dense_score=None)
+            )
+            candidate["sparse_score"] = score / max_sparse
+
+        # sparse-only candidates: exact cosine from (cached) KB embeddings
+        missing = [nl for nl, c in candidates.items() if c["dense_score"] is None]
+        if missing:
+            query, *vectors = np.asarray(self.hf_embedder.get_embeddings([user_query, *missing]))
+            cosines = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+            for nl, cosine in zip(missing, cosines):
+                candidates[nl]["dense_score"] = float(cosine)
+
+        for c in candidates.values():
+            c["score"] = config.HYBRID_ALPHA * c["dense_score"] + (1 - config.HYBRID_ALPHA) * c["sparse_score"]
+
+        return sorted(candidates.values(), key=lambda c: c["score"], reverse=True)[:top_k]
+
+    def quantization_report(self, collection_name: str="nl_to_sql", *, top_k: int=5) -> dict:
+        """Vector RAM per point and recall@k of the default (quantized) search against the exact float32 baseline,
+        using the KB questions as probes"""
+
+        info = self.qclient.get_collection(collection_name)
+        params = info.config.params.vectors
+        q_cfg = info.config.quantization_config or params.quantization_config
+
+        if isinstance(q_cfg, ScalarQuantization):
+            quantization, ram_bytes = "scalar", params.size
+        elif isinstance(q_cfg, BinaryQuantization):
+            quantization, ram_bytes = "binary", params.size / 8
+        else:
+            quantization, ram_bytes = "none", 0
+
+        if not params.on_disk:
+            ram_bytes += 4 * params.size # float32 originals
+
+        questions = [item["nl_quest"] for item in self.queries_kb]
+        vectors = self.hf_embedder.get_embeddings(questions)
+        recalls = []
+        for vector in vectors:
+            found, expected = (
+                {
+                    p.id for p in self.qclient.query_points(
+                        collection_name=collection_name,
+                        query=vector,
+                        limit=top_k,
+                        search_params=self._search_params(exact=exact)
+                    ).points
+                }
+                for exact in (False, True)
+            )
+            recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+
+        return {
+            "quantization": quantization,
+            "vector_ram_bytes_per_point": ram_bytes,
+            f"recall@{top_k}": sum(recalls) / len(recalls) if recalls else None,
+        }
+
     def update_collection(self, collection_name: str="nl_to_sql") -> None:
-        """Update collection by inserting only new vectors"""
+        """Sync collection with the local KB: embed only added/changed entries and delete removed ones.
+
+        Point ids are content hashes (see `kb_point_id`), so an edited entry shows up as one removal plus one addition.
+        """
+        self.kb.reload() # the KB files as they are now
+
+        if self.backend == "numpy":
+            # unchanged entries are embedding-cache hits, so a full rebuild is cheap
+            self._build_index(collection_name)
+            return
 
         try:
-            points, _ = self.qclient.scroll(
-                collection_name=collection_name,
-                limit=10000
-            )
-            existing_ids = {p.id for p in points}
+            existing_ids = self._scroll_ids(collection_name)
 
         except UnexpectedResponse as e:
             logger.error(f"Unexpected response from qdrant: {e}")
@@ -167,32 +546,48 @@ class SQLRetriever:
             logger.error(f"Error while retrieving points: {e}")
             return
 
-        new_items = [i for i in self.queries_kb if i["id"] not in existing_ids]
+        local_ids = {item["id"] for item in self.queries_kb}
+        remote_ids = {str(pid) for pid in existing_ids}
+        new_items = [i for i in self.queries_kb if i["id"] not in remote_ids]
+        stale_ids = [pid for pid in existing_ids if str(pid) not in local_ids] # also legacy integer ids
 
-        if not new_items:
+        if not new_items and not stale_ids:
             logger.info("No new vectors found: collection still updated.")
             return
         
-        points = [
-            
-            PointStruct(
-                id=item["id"],
-                vector=self.hf_embedder.get_embeddings([item["nl_quest"],])[0],
-                payload={
-                    "nl_quest": item["nl_quest"],
-                    "nl_quest": item["nl_quest"],
-                    "step_by_step": "<placeholder>"
-                }
-            )
-            for item in new_items
-        ]
-
         try:
-            self.qclient.upsert(collection_name=collection_name, wait=True, points=points)
-            logger.info(f"Added {len(points)} new vectors to the collection `{collection_name}`.")
+            if new_items:
+                n_points = self._upsert_items(new_items, collection_name=collection_name)
+                logger.info(f"Added {n_points} new vectors to the collection `{collection_name}`.")
+
+            for j in range(0, len(stale_ids), config.QDRANT_UPSERT_BATCH):
+                self.qclient.delete(
+                    collection_name=collection_name,
+                    points_selector=PointIdsList(points=stale_ids[j:j + config.QDRANT_UPSERT_BATCH]),
+                    wait=True
+                )
+            if stale_ids:
+                logger.info(f"Deleted {len(stale_ids)} stale vectors from the collection `{collection_name}`.")
 
         except UnexpectedResponse as e:
-            logger.error(f"Error while upserting vectors: {e}")
+            logger.error(f"Error while syncing vectors: {e}")
+
+    def _scroll_ids(self, collection_name: str="nl_to_sql") -> set[int | str]:
+        """All point ids of `collection_name`, scrolled page by page without payloads nor vectors"""
+        ids, offset = set(), None
+
+        while True:
+            points, offset = self.qclient.scroll(
+                collection_name=collection_name,
+                limit=config.QDRANT_SCROLL_PAGE,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            ids.update(p.id for p in points)
+
+            if offset is None:
+                return ids
 
 
 # Singleton
@@ -1,14 +1,21 @@
+import asyncio
+from functools import lru_cache
+from itertools import chain
 from typing import Literal
 from pydantic import BaseModel, Field
-from agents import function_tool
+from agents import function_tool, RunContextWrapper
 from pandas import DataFrame, read_sql_query
 from psycopg2.extensions import connection
 from psycopg2 import connect
 
 from build.config import config
 from sql.utils.metadata_general_query import get_metadata_query
-from sql.utils.load_nl_sql_pairs import queries_dict
+from src.sql_agent.rag.kb import kb_index
 from src.sql_agent.rag.sql_rag import sql_retriever
+from src.sql_agent.rag.schema_rag import schema_retriever
+from src.sql_agent.utils.tokens import count_tokens
+from src.sql_agent.context import SQLContext
+from src.sql_agent.utils.limits import db_slots
 from src.logger import logger
 
 
@@ -23,34 +30,51 @@ class ExecQueryParams(BaseModel):
         description="Parameter for execute the query either via cursor or connection in Pandas"
     )
 
-@function_tool
-def executeQuery(params: ExecQueryParams) -> DataFrame:
-    """Tool function for directly execute a query on PostgresDB"""
+def fetch_query(query: str, mode: Literal['conn', 'cursor']="cursor") -> DataFrame:
+    """Aux function executing `query` on PostgresDB"""
+    conn, cursor = None, None
     try:
         conn: connection = connect(**config.DB_CONFIG)
         cursor = conn.cursor()
-        if params.mode == "cursor":
-            cursor.execute(params.query)
-            data = cursor.fetchall()
-            columns = [col[0] for col in cursor.description]
-            df = DataFrame(data=data, columns=columns)
-            return df.to_string()
+        if mode == "conn":
+            return read_sql_query(sql=query, con=conn)
 
-        elif params.mode == "conn":
-            df = read_sql_query(sql=params.query, con=conn)
-            return df.to_string()
-        else:
-            return params.mode
+        cursor.execute(query)
+        data = cursor.fetchall()
+        columns = [col[0] for col in cursor.description]
+        return DataFrame(data=data, columns=columns)
     finally:
-        logger.debug(f"Executed query:\n{params.query}")
-        cursor.close()
-        conn.close()
+        logger.debug(f"Executed query:\n{query}")
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+@function_tool
+async def executeQuery(ctx: RunContextWrapper[SQLContext], params: ExecQueryParams) -> DataFrame:
+    """Tool function for directly execute a query on PostgresDB"""
+    track = isinstance(ctx.context, SQLContext)
+    try:
+        async with db_slots: # off the event loop, bounded across sessions
+            df = await asyncio.to_thread(fetch_query, params.query, params.mode)
+
+    except Exception:
+        if track:
+            ctx.context.failed_queries.append(params.query)
+        raise
+
+    if track:
+        ctx.context.executed_queries.append(params.query)
+        ctx.context.last_rows = df.to_dict(orient="records")
+    return df.to_string()
 
 executeQuery.name = ("executeQuery")
 executeQuery.description = "Function for executing a PostgreSQL query on db"
 
 
 # Tool `getMetadata`
+@lru_cache(maxsize=8)
 def get_tables(*, schema: str='public') -> list[str]:
     """Aux function to get all the tables in the schema"""
     conn, cursor = None, None
@@ -73,6 +97,18 @@ def get_tables(*, schema: str='public') -> list[str]:
             cursor.close()
 
 
+def get_data_version() -> str:
+    """Aux function fingerprinting the catalog content: changes whenever scenes are ingested or removed"""
+    conn = connect(**config.DB_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT count(*), max(ingestion_time) FROM sentinel_scenes")
+            count, last_ingestion = cursor.fetchone()
+        return f"{count}@{last_ingestion}"
+    finally:
+        conn.close()
+
+
 # Tool getMetadata
 class FillTablesMetadata(BaseModel):
     retrieved_tables: list[str]=Field(
@@ -95,15 +131,19 @@ class FillTablesMetadata(BaseModel):
             ...
         """
     )
+    user_query: str=Field(
+        default=None,
+        description="The user request, used to return only the columns relevant to it"
+    )
 
-@function_tool
-def getMetadata(params: FillTablesMetadata) -> DataFrame:
+def get_full_metadata(tables: list[str]) -> str:
+    """Aux function dumping every column (type, key, comment) of `tables`"""
     metadata_res = ""
     try:
         conn: connection = connect(**config.DB_CONFIG)
         cursor = conn.cursor()
         
-        for table_name in params.retrieved_tables:
+        for table_name in tables:
             metadata_res += f"\n--- Tabella: {table_name} ---\n"
             
             query = get_metadata_query(table_name)
@@ -121,8 +161,30 @@ def getMetadata(params: FillTablesMetadata) -> DataFrame:
         cursor.close()
         conn.close()
 
+
+def get_metadata(tables: list[str], user_query: str | None=None) -> str:
+    """Aux function for `getMetadata`: only the relevant columns when `METADATA_MODE="relevant"` and the question is known"""
+    if config.METADATA_MODE == "relevant" and user_query:
+        try:
+            columns = schema_retriever.search(user_query, tables=tables or None)
+            if columns:
+                res = schema_retriever.format(columns)
+                logger.debug(f"Schema RAG: {len(columns)} columns, ~{count_tokens(res)} tokens.")
+                return res
+
+        except Exception as e: # missing schema collection, qdrant down...
+            logger.warning(f"Schema RAG unavailable, falling back to full metadata: {e}")
+
+    return get_full_metadata(tables)
+
+
+@function_tool
+async def getMetadata(params: FillTablesMetadata) -> DataFrame:
+    async with db_slots:
+        return await asyncio.to_thread(get_metadata, params.retrieved_tables, params.user_query)
+
 getMetadata.name = "getMetadata"
-getMetadata.description = "Function for getting metadata (fields, types, comments) from a list of schema tables"
+getMetadata.description = "Function for getting metadata (fields, types, comments) from a list of schema tables, restricted to the columns relevant to the user request"
 
 
 # Tool `retrieveQueriesRag`
@@ -130,18 +192,33 @@ class RetrieveQueriesParam(BaseModel):
     user_query: str = Field(description="The user request")
     top_k: int = Field(default=5, description="How many similar queries to retrieve") 
 
-@function_tool
-def retrieveQueries(param: RetrieveQueriesParam):
-    """Vector retrieval system for similar sql query samples"""
-    retrieved_queries = sql_retriever.search(
-        param.user_query,
-        top_k=param.top_k
-    )
+async def retrieve_examples(user_query: str, top_k: int=5) -> list[dict]:
+    """Aux function for `retrieveQueries`: curated + learned + bulk examples above the score threshold, best first.
+    All collections go through the same search (dense or hybrid), so their scores are on the same scale"""
+    if config.RETRIEVAL_HYBRID:
+        search, min_score = sql_retriever.ahybrid_search, config.HYBRID_MIN_SCORE
+    else:
+        search, min_score = sql_retriever.asearch, config.RETRIEVAL_MIN_SCORE
+
+    searches = [search(user_query, top_k=top_k)]
+    if config.KB_LEARNING:
+        searches.append(search(user_query, collection_name=config.LEARNED_COLLECTION, top_k=top_k))
+    if config.KB_BULK:
+        searches.append(search(user_query, collection_name=config.BULK_COLLECTION, top_k=top_k))
 
+    # one per question
+    retrieved_queries = {}
+    hits = (item for item in chain(*await asyncio.gather(*searches)) if float(item["score"]) >= min_score)
+    for item in sorted(hits, key=lambda i: i["score"], reverse=True):
+        retrieved_queries.setdefault(item["nl"], item)
+
+    return list(retrieved_queries.values())[:top_k]
+
+
+def format_examples(retrieved_queries: list[dict]) -> str:
     results = "\n".join(
         f"\nNL key: {item["nl"]}\nSQL value: {item["sql"]}\nScore: {item["score"]:.4f}"
         for item in retrieved_queries
-        if float(item["score"]) >= 0.5
     )
 
     if not results or results.strip() == "":
@@ -151,10 +228,30 @@ def retrieveQueries(param: RetrieveQueriesParam):
         return results
 
 
+@function_tool
+async def retrieveQueries(param: RetrieveQueriesParam):
+    """Vector retrieval system for similar sql query samples"""
+    return format_examples(await retrieve_examples(param.user_query, param.top_k))
+
+
 retrieveQueries.name = "retrieveQueries"
 retrieveQueries.description = "Function that runs a RAG system to retrieve similar sql query samples."
 
 
+# Tool `resolveHandle`
+class ResolveHandleParam(BaseModel):
+    handle: str = Field(description="Handle of an elided history item, e.g. `h-1a2b3c4d`")
+
+@function_tool
+def resolveHandle(ctx: RunContextWrapper[SQLContext], params: ResolveHandleParam) -> str:
+    """Full text of a tool output or answer elided from the older turns of the conversation"""
+    content = ctx.context.history_handles.get(params.handle) if isinstance(ctx.context, SQLContext) else None
+    return content if content is not None else f"Unknown handle `{params.handle}`: its item is no longer available."
+
+resolveHandle.name = "resolveHandle"
+resolveHandle.description = "Function returning the full text of an older history item elided behind a handle (`h-...`)"
+
+
 # Tool `retrieveQueries`
 class SQLQueriesParam(BaseModel):
     retrieved_nl: list[str]=Field(
@@ -170,7 +267,7 @@ class SQLQueriesParam(BaseModel):
             RULES:
             - Restituisci SOLO le chiavi esatte (nessun testo aggiuntivo)
             - Prioritizza intent match su keyword match
-        """.format(keys_list=list(queries_dict.keys()))
+        """.format(keys_list=[item["nl_quest"] for item in kb_index.entries])
     )
     score: list[float]=Field(
         default=None,
@@ -190,6 +287,7 @@ class SQLQueriesParam(BaseModel):
 
 @function_tool
 def retrieveQueriesCag(param: SQLQueriesParam):
+    queries_dict = kb_index.as_dict()
     res = "\n".join(
         f"\nNL key: {rkey}\nSQL value: {queries_dict[rkey]}\nScore: {param.score[j]:.4f}" 
         for j, rkey in enumerate(param.retrieved_nl)
@@ -1,14 +1,25 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
 from agents import RunContextWrapper
 
 from src.sql_agent.context import SQLContext
+from src.logger import logger
 
 # Handoff aux defs
 class SQLReport(BaseModel):
     report: str
+    confidence: Literal["high", "low"] = Field(
+        default="high", # a report without it still hands off
+        description="`low` when the schema and the examples do not clearly cover the request",
+        json_schema_extra=lambda schema: schema.pop("default", None) # strict tool schemas refuse `default`
+    )
 
 async def log_handoff(ctx: RunContextWrapper[SQLContext], input_data: SQLReport):
-    # print(f"Handoff call with input: {input_data.report}")
-    # print("Input tokens: ", ctx.usage.input_tokens)
-    # print("Output tokens: ", ctx.usage.output_tokens)
-    pass
\ No newline at end of file
+    if input_data.confidence == "low" and isinstance(ctx.context, SQLContext):
+        ctx.context.low_confidence = True # escalates the executor model tier
+    # timing and per-call tokens are recorded by `TelemetryHooks`
+    logger.debug(
+        f"Handoff with a {len(input_data.report)} chars report ({input_data.confidence} confidence) | "
+        f"tokens so far: input {ctx.usage.input_tokens}, output {ctx.usage.output_tokens}"
+    )
\ No newline at end of file
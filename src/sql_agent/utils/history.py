@@ -0,0 +1,123 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Literal
+
+from build.config import config
+from src.sql_agent.utils.tokens import count_tokens
+
+EntryKind = Literal["user", "answer", "tool", "handoff"]
+
+
+@dataclass
+class HistoryEntry:
+    role: str
+    content: str
+    kind: EntryKind
+    tokens: int
+    compacted: bool=False # already a placeholder/preview (e.g. reloaded from a session store)
+
+    def as_item(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+class HistoryManager:
+    """Conversation history of an `AgentRunner` with a token budget.
+
+    The last `keep_turns` turns are sent verbatim. In older turns tool outputs and handoff reports are replaced by
+    handles, and answers longer than `max_item_tokens` are cut to a preview + handle; the full text stays
+    retrievable with `resolve`, and by the agents with the `resolveHandle` tool. If the compacted history still
+    exceeds `budget` the oldest turns are dropped.
+    """
+
+    def __init__(
+            self,
+            *,
+            budget: int=config.HISTORY_TOKEN_BUDGET,
+            keep_turns: int=config.HISTORY_KEEP_TURNS,
+            max_item_tokens: int=config.HISTORY_MAX_ITEM_TOKENS,
+            max_handles: int=256
+        ):
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.max_item_tokens = max_item_tokens
+        self.max_handles = max_handles
+        self.entries: list[HistoryEntry] = []
+        self.handles: OrderedDict[str, str] = OrderedDict()
+
+    def add(self, role: str, content: str, *, kind: EntryKind) -> None:
+        content = content or ""
+        self.entries.append(HistoryEntry(role, content, kind, count_tokens(content)))
+
+    @property
+    def items(self) -> list[dict]:
+        """Full, uncompacted history"""
+        return [e.as_item() for e in self.entries]
+
+    def turns(self) -> list[list[HistoryEntry]]:
+        turns = []
+        for entry in self.entries:
+            if entry.kind == "user" or not turns:
+                turns.append([])
+            turns[-1].append(entry)
+        return turns
+
+    # COMPACTION
+    def _handle(self, content: str) -> str:
+        handle = "h-" + hashlib.sha1(content.encode()).hexdigest()[:8] # stable: same text -> same placeholder
+        self.handles[handle] = content
+        self.handles.move_to_end(handle)
+        while len(self.handles) > self.max_handles:
+            self.handles.popitem(last=False)
+        return handle
+
+    def _compact(self, entry: HistoryEntry) -> HistoryEntry:
+        if entry.compacted:
+            return entry
+        if entry.kind in ("tool", "handoff"):
+            content = f"[{entry.kind} output elided ({entry.tokens} tokens), `resolveHandle` handle `{self._handle(entry.content)}`]"
+        elif entry.kind == "answer" and entry.tokens > self.max_item_tokens:
+            preview = entry.content[:self.max_item_tokens * 2].rstrip()
+            content = f"{preview}... [truncated ({entry.tokens} tokens), `resolveHandle` handle `{self._handle(entry.content)}`]"
+        else:
+            return entry
+        return HistoryEntry(entry.role, content, entry.kind, count_tokens(content), compacted=True)
+
+    def _compacted(self) -> list[HistoryEntry]:
+        turns = self.turns()
+        split = max(0, len(turns) - self.keep_turns)
+        older = [[self._compact(e) for e in turn] for turn in turns[:split]]
+        recent = turns[split:]
+
+        total = sum(e.tokens for turn in older + recent for e in turn)
+        while older and total > self.budget:
+            total -= sum(e.tokens for e in older.pop(0))
+
+        return [e for turn in older + recent for e in turn]
+
+    def build(self) -> list[dict]:
+        """Input items for the next run, within `budget` tokens (recent turns are never dropped)"""
+        return [e.as_item() for e in self._compacted()]
+
+    # PERSISTENCE
+    def to_state(self) -> dict:
+        """Compacted history + handles, JSON serializable: what a session store persists"""
+        return {
+            "entries": [asdict(e) for e in self._compacted()],
+            "handles": dict(self.handles),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, **kwargs) -> "HistoryManager":
+        history = cls(**kwargs)
+        history.entries = [HistoryEntry(**e) for e in state.get("entries", [])]
+        history.handles = OrderedDict(state.get("handles", {}))
+        return history
+
+    def resolve(self, handle: str) -> str | None:
+        """Full text behind an elided item"""
+        return self.handles.get(handle)
+
+    def tokens(self, items: list[dict] | None=None) -> int:
+        """Estimated tokens of `items` (default: the compacted history)"""
+        return sum(count_tokens(item["content"]) for item in (items if items is not None else self.build()))
@@ -0,0 +1,40 @@
+"""
+Process-wide concurrency limits on LLM and db calls, shared by every session of the process (cli, ui, server, batch).
+Waiting on a slot is the backpressure: turns queue here instead of overloading the provider or Postgres.
+"""
+import asyncio
+from typing import Any, AsyncIterator
+
+from agents import Model, ModelResponse
+
+from build.config import config
+
+llm_slots = asyncio.Semaphore(config.LLM_MAX_CONCURRENCY)
+db_slots = asyncio.Semaphore(config.DB_MAX_CONCURRENCY)
+
+
+class LimitedModel(Model):
+    """`Model` wrapper holding an `llm_slots` slot for the whole request (stream included)"""
+
+    def __init__(self, model: Model, slots: asyncio.Semaphore=llm_slots):
+        self.inner = model
+        self.slots = slots
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name) # e.g. `.model`
+
+    async def get_response(self, *args: Any, **kwargs: Any) -> ModelResponse:
+        async with self.slots:
+            return await self.inner.get_response(*args, **kwargs)
+
+    async def stream_response(self, *args: Any, **kwargs: Any) -> AsyncIterator:
+        async with self.slots:
+            async for event in self.inner.stream_response(*args, **kwargs):
+                yield event
+
+
+def slots_in_use() -> dict[str, int]:
+    return {
+        "llm": config.LLM_MAX_CONCURRENCY - llm_slots._value,
+        "db": config.DB_MAX_CONCURRENCY - db_slots._value,
+    }
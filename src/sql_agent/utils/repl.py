@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import asyncio
 import time
 from dataclasses import dataclass
-from typing import Any, AsyncGenerator, Literal, Set
+from typing import Any, AsyncGenerator, Awaitable, Callable, Literal, Set
+
+import numpy as np
 
 from agents import Agent, Runner, RunHooks
 from agents.result import RunResultStreaming
 from openai.types.responses.response_text_delta_event import ResponseTextDeltaEvent
+from openai.types.responses.response_function_call_arguments_delta_event import ResponseFunctionCallArgumentsDeltaEvent
 from agents.stream_events import (
     RawResponsesStreamEvent,
     RunItemStreamEvent,
@@ -14,6 +18,15 @@ from agents.stream_events import (
 )
 from agents.items import ItemHelpers
 
+from src.sql_agent.context import SQLContext
+from src.sql_agent.utils.history import HistoryManager
+from src.sql_agent.utils.session_store import WriteBehindStore
+from src.sql_agent.utils.tiering import run_context, tier_report
+from src.sql_agent.utils.telemetry import TelemetryHooks
+from src.sql_agent.utils.semantic_cache import SemanticCache
+from src.sql_agent.rag.kb_writer import KBWriter
+from src.logger import logger
+
 
 # ------ COLORS ------
 class bcolors:
@@ -182,12 +195,52 @@ class AgentRunner:
         hooks: RunHooks | None = None,
         input_data_custom: InputDataMode = "nothing_else",
         enable_cli_prints: bool = True,
+        semantic_cache: SemanticCache | None = None,
+        replay_agent: Agent[Any] | None = None,
+        data_version: Callable[[], str] | None = None,
+        kb_writer: KBWriter | None = None,
+        router: Callable[[str], Awaitable[Any]] | None = None,
+        history: HistoryManager | None = None,
+        session_store: WriteBehindStore | None = None,
+        session_id: str | None = None,
     ):
+        """
+        Args:
+            semantic_cache: Optional cache of answered questions, checked before running the agents.
+            replay_agent: Agent re-executing the cached SQL when the data changed (e.g. the executor).
+            data_version: Callable fingerprinting the catalog content, required by `semantic_cache`.
+            kb_writer: Optional background writer fed with the (question, final SQL) of successful turns.
+            router: Optional async callable returning a `Route` (name, agent, pre-fetched context) for the question,
+                used to send simple questions straight to the executor. Started as soon as the message arrives,
+                concurrently with the semantic cache lookup.
+            history: Conversation history with a token budget (default: a new `HistoryManager`).
+            session_store: Optional durable store of the compacted history, saved after every turn. With a
+                `session_id` already in the store the history is reloaded lazily, at the first message.
+            session_id: Key of the conversation in `session_store`.
+        """
         self.agent = starting_agent
         self.hooks = hooks
-        self.input_items: list[dict] = []
+        self.telemetry = hooks if isinstance(hooks, TelemetryHooks) else None
+        self.history = history or HistoryManager()
+        self.session_store = session_store if session_id is not None else None
+        self.session_id = session_id
+        self.loaded = self.session_store is None # history still to be read from the store
         self.input_data_custom = input_data_custom
         self.enable_cli_prints = enable_cli_prints
+        self.semantic_cache = semantic_cache if data_version is not None else None
+        self.replay_agent = replay_agent
+        self.data_version = data_version
+        self.kb_writer = kb_writer
+        self.router = router
+        self.context = SQLContext()
+        self.latencies: dict[str, list[float]] = {} # seconds per turn, by route
+        self.turn_usage: list[dict] = [] # tokens per turn, to check the history growth
+        self.llm_calls: list[dict] = [] # model tier, latency and cost of every LLM call of the session
+
+    @property
+    def input_items(self) -> list[dict]:
+        """Full conversation (what is sent to the model is `history.build()`)"""
+        return self.history.items
 
     # POLICY METHODS
     def should_append_tool_output(self) -> bool:
@@ -201,9 +254,16 @@ class AgentRunner:
         self, user_input: str
     ) -> AsyncGenerator[ReplEvent, None]:
 
-        self.input_items.append(
-            {"role": "user", "content": user_input}
-        )
+        if not self.loaded:
+            await self.rehydrate()
+
+        # a follow-up ("and for Milan?") only makes sense with the previous turns: the shared semantic cache
+        # and the KB only see self-contained questions, i.e. the first of a conversation
+        standalone = not self.history.entries
+
+        self.history.add("user", user_input, kind="user")
+        self.context = SQLContext(user_query=user_input, history_handles=self.history.handles)
+        run_context.set(self.context) # read by the tiered models to pick the tier
 
         # if self.enable_cli_prints:
         #     print(
@@ -212,10 +272,80 @@ class AgentRunner:
         #     )
 
         start_time = time.time()
+        if self.telemetry is not None:
+            self.telemetry.start_turn()
+
+        agent, run_input, route = self.agent, self.history.build(), "default"
+
+        # speculative: routing and context prefetch run while the cache is checked
+        planning = asyncio.create_task(self._plan(user_input)) if self.router is not None else None
+        decision = None
+
+        lookup_start = time.perf_counter()
+        try:
+            cached, version = await self._lookup_cache(user_input) if standalone else (None, None)
+        except BaseException: # also a cancelled turn: the planning task must not outlive it
+            if planning is not None:
+                planning.cancel()
+            raise
+        if self.telemetry is not None and self.semantic_cache is not None and standalone:
+            self.telemetry.record("cache", "hit" if cached is not None else "miss", time.perf_counter() - lookup_start)
+
+        if cached is not None and cached.data_version == version:
+            # same data: serve the cached answer, no LLM nor DB call
+            if planning is not None:
+                planning.cancel()
+            self.semantic_cache.record_hit(stale=False)
+            self.context.cached_sql = cached.sql
+            self._log_cache(f"[semantic cache hit: `{cached.question}`]")
+            self.history.add("assistant", cached.answer, kind="answer")
+            self._persist()
+            self._record_latency("cache", time.time() - start_time)
+            yield ReplEvent(type="final", content=cached.answer)
+            return
+
+        if cached is not None and self.replay_agent is not None:
+            # data changed: skip the collector and let the executor re-run the validated SQL
+            if planning is not None:
+                planning.cancel()
+            self.semantic_cache.record_hit(stale=True)
+            self._log_cache(f"[semantic cache stale hit: `{cached.question}`, re-executing its SQL]")
+            agent, route = self.replay_agent, "replay"
+            run_input = run_input[:-1] + [{
+                "role": "user",
+                "content": (
+                    f"{user_input}\n\nValidated SQL for this request, "
+                    f"execute it with `executeQuery` and answer:\n```sql\n{cached.sql}\n```"
+                ),
+            }]
+
+        elif cached is not None: # stale and nothing to replay it: the full pipeline answers
+            self.semantic_cache.record_miss()
+
+        if planning is not None and route != "replay":
+            try:
+                decision = await planning
+            except Exception as e: # no prefetch: the default agent fetches its own context
+                self._log_cache(f"[routing failed, default pipeline: {e}]")
+
+        if decision is not None:
+            agent, route = decision.agent, decision.name
+            self._log_cache(f"[route: {route} -> `{agent.name}`]")
+            if decision.context:
+                run_input = run_input[:-1] + [
+                    {"role": "user", "content": user_input + decision.context}
+                ]
+
+        # version of the data the answer is computed on, fetched during the run: storing does not wait on the db
+        version_task = None
+        if self.semantic_cache is not None and standalone and version is None:
+            version_task = asyncio.ensure_future(asyncio.to_thread(self.data_version))
+            version_task.add_done_callback(lambda t: t.cancelled() or t.exception()) # failure handled at store
 
         result = Runner.run_streamed(
-            starting_agent=self.agent,
-            input=self.input_items,
+            starting_agent=agent,
+            input=run_input,
+            context=self.context,
             hooks=self.hooks,
         )
 
@@ -230,20 +360,52 @@ class AgentRunner:
         #         f"{result.final_output}"
         #     )
 
-        self.input_items.append(
-            {"role": "assistant", "content": result.final_output}
-        )
+        self.history.add("assistant", result.final_output, kind="answer")
+        self._persist()
+
+        if self.kb_writer is not None and standalone and self.context.executed_queries and result.final_output:
+            self.kb_writer.submit(user_input, self.context.executed_queries[-1])
+
+        if self.semantic_cache is not None and standalone and self.context.executed_queries and result.final_output:
+            try:
+                version = version or await version_task
+            except Exception as e:
+                logger.warning(f"Semantic cache: data version unavailable, answer not cached: {e}")
+            else:
+                self.semantic_cache.store(
+                    user_input,
+                    sql=self.context.executed_queries[-1],
+                    answer=result.final_output,
+                    data_version=version,
+                )
 
         elapsed = time.time() - start_time
+        self._record_latency(route, elapsed)
+
+        usage = result.context_wrapper.usage
+        self.llm_calls.extend(self.context.llm_calls)
+        self.turn_usage.append({
+            "turn": len(self.turn_usage) + 1,
+            "history_tokens": self.history.tokens(run_input), # estimate of what this turn re-sent
+            "input_tokens": usage.input_tokens, # all the LLM calls of the turn
+            "cached_tokens": usage.input_tokens_details.cached_tokens, # served from the provider prompt cache
+            "output_tokens": usage.output_tokens,
+            "requests": usage.requests,
+            "models": [c["model"] for c in self.context.llm_calls],
+            "cost": round(sum(c["cost"] for c in self.context.llm_calls), 6), # USD
+        })
 
         if self.enable_cli_prints:
             print(
                 f"\n{bcolors.PURPLE}Elapsed time: "
-                f"{elapsed:.4f} seconds{bcolors.ENDC}"
+                f"{elapsed:.4f} seconds ({route}){bcolors.ENDC}"
             )
             print(
-                f"\n{bcolors.DARK_GRAY}LOG INPUT ITEMs:\n"
-                f"{self.input_items}{bcolors.ENDC}"
+                f"{bcolors.DARK_GRAY}Tokens: history ~{self.turn_usage[-1]['history_tokens']} | "
+                f"input {usage.input_tokens} (cached {usage.input_tokens_details.cached_tokens}) | "
+                f"output {usage.output_tokens} | "
+                f"{usage.requests} LLM calls ({', '.join(dict.fromkeys(self.turn_usage[-1]['models']))}) | "
+                f"${self.turn_usage[-1]['cost']:.4f}{bcolors.ENDC}"
             )
 
         yield ReplEvent(
@@ -251,6 +413,93 @@ class AgentRunner:
             content=result.final_output or "",
         )
 
+    # SESSION STATE
+    async def rehydrate(self) -> bool:
+        """Load the history of `session_id` from the store; False if the session is not there"""
+        state = await asyncio.to_thread(self.session_store.load, self.session_id)
+        if state is not None:
+            h = self.history
+            self.history = HistoryManager.from_state(
+                state, budget=h.budget, keep_turns=h.keep_turns, max_item_tokens=h.max_item_tokens, max_handles=h.max_handles
+            )
+        self.loaded = True
+        return state is not None
+
+    def _persist(self) -> None:
+        if self.session_store is not None:
+            self.session_store.save(self.session_id, self.history.to_state()) # non-blocking, written behind
+
+    def release(self) -> None:
+        """Drop the in-memory history of an idle session: it is reloaded from the store at the next message"""
+        if self.session_store is None or not self.loaded:
+            return
+        h = self.history # already saved at the end of its last turn
+        self.history = HistoryManager(
+            budget=h.budget, keep_turns=h.keep_turns, max_item_tokens=h.max_item_tokens, max_handles=h.max_handles
+        )
+        self.context = SQLContext()
+        self.loaded = False
+
+    async def _plan(self, user_input: str) -> Any:
+        plan_start = time.perf_counter()
+        decision = await self.router(user_input)
+        if self.telemetry is not None:
+            self.telemetry.record("route", decision.name, time.perf_counter() - plan_start)
+        return decision
+
+    async def _lookup_cache(self, user_input: str) -> tuple[Any, str | None]:
+        """Semantic cache lookup: (entry or None, current data version when an entry was found)"""
+        if self.semantic_cache is None:
+            return None, None
+
+        hit = await asyncio.to_thread(self.semantic_cache.lookup, user_input)
+        if hit is None:
+            return None, None
+
+        entry, _ = hit
+        try:
+            return entry, await asyncio.to_thread(self.data_version)
+        except Exception as e: # cannot tell a fresh hit from a stale one: answer as on a miss
+            self.semantic_cache.record_miss()
+            logger.warning(f"Semantic cache: data version unavailable, hit treated as a miss: {e}")
+            return None, None
+
+    def _record_latency(self, route: str, elapsed: float) -> None:
+        self.latencies.setdefault(route, []).append(elapsed)
+        if self.telemetry is not None:
+            self.telemetry.end_turn(route, elapsed)
+
+    def latency_report(self) -> dict[str, dict]:
+        """Turns, p50 and p95 latency (seconds) per route"""
+        return {
+            route: {
+                "turns": len(values),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p95": round(float(np.percentile(values, 95)), 3),
+            }
+            for route, values in self.latencies.items()
+        }
+
+    def token_report(self) -> dict:
+        """Input tokens of the session split into cached and uncached"""
+        input_tokens = sum(u["input_tokens"] for u in self.turn_usage)
+        cached = sum(u["cached_tokens"] for u in self.turn_usage)
+        return {
+            "turns": len(self.turn_usage),
+            "input_tokens": input_tokens,
+            "cached_tokens": cached,
+            "uncached_tokens": input_tokens - cached,
+            "cache_ratio": round(cached / input_tokens, 4) if input_tokens else 0.0,
+        }
+
+    def tier_report(self) -> dict[str, dict]:
+        """Calls, latency, tokens and cost per agent and model tier"""
+        return tier_report(self.llm_calls)
+
+    def _log_cache(self, msg: str) -> None:
+        if self.enable_cli_prints:
+            print(f"\n{bcolors.DARK_GRAY}{bcolors.BOLD}{msg}{bcolors.ENDC}", flush=True)
+
     # STREAM EVENT HANDLER
     async def _handle_stream_events(
         self, result: RunResultStreaming
@@ -260,6 +509,12 @@ class AgentRunner:
 
             # TEXT STREAM
             if isinstance(event, RawResponsesStreamEvent):
+                # first generated token (text or tool call arguments), not the `response.created` bookkeeping
+                if self.telemetry is not None and isinstance(
+                    event.data, (ResponseTextDeltaEvent, ResponseFunctionCallArgumentsDeltaEvent)
+                ):
+                    self.telemetry.mark_first_token(result.current_agent)
+
                 if isinstance(event.data, ResponseTextDeltaEvent):
                     if self.enable_cli_prints:
                         print(event.data.delta, end="", flush=True)
@@ -300,9 +555,7 @@ class AgentRunner:
                         )
 
                     if self.should_append_tool_output():
-                        self.input_items.append(
-                            {"role": "assistant", "content": output}
-                        )
+                        self.history.add("assistant", output, kind="tool")
 
                     yield ReplEvent("tool_output", output)
 
@@ -327,12 +580,7 @@ class AgentRunner:
                         )
 
                     if self.should_append_handoff_args():
-                        self.input_items.append(
-                            {
-                                "role": "assistant",
-                                "content": item.raw_item.arguments,
-                            }
-                        )
+                        self.history.add("assistant", item.raw_item.arguments, kind="handoff")
 
             # AGENT SWITCH
             elif isinstance(event, AgentUpdatedStreamEvent):
@@ -0,0 +1,265 @@
+"""
+Offline stand-in for the LLM: replays scripted tool calls and answers per agent, streaming text token by token
+with a configurable latency. Tools, handoffs, retrieval and the db run for real, so a turn measures the framework
+overhead without network nor cost.
+
+Script format (JSON):
+    {
+        "token_latency": 0.01,   # seconds per streamed token
+        "first_token_latency": 0.3,   # seconds before the first event of every call
+        "scenarios": [
+            {
+                "match": "rome|milan",   # regex on the user question, first match wins
+                "agents": {
+                    "Galileo": [{"tool_calls": [{"name": "getMetadata", "arguments": {...}}]}, ...],
+                    "Executor": [{"tool_calls": [...]}, {"text": "..."}]
+                }
+            }
+        ]
+    }
+`{question}` in arguments and text is replaced by the user question.
+"""
+import asyncio
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from agents import Model, ModelResponse, ModelSettings, Tool, Handoff, Usage
+from agents.agent_output import AgentOutputSchemaBase
+from agents.models.interface import ModelTracing
+from agents.usage import InputTokensDetails, OutputTokensDetails
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseContentPartAddedEvent,
+    ResponseContentPartDoneEvent,
+    ResponseCreatedEvent,
+    ResponseFunctionCallArgumentsDeltaEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputItemAddedEvent,
+    ResponseOutputItemDoneEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import (
+    InputTokensDetails as ResponseInputTokensDetails,
+    OutputTokensDetails as ResponseOutputTokensDetails,
+)
+
+from src.sql_agent.utils.tokens import count_tokens
+
+SCRIPTED_ID = "__scripted__"
+TOKEN_REGEX = re.compile(r"\S+\s*|\s+")
+PREFETCH_MARKER = "\n\n## Pre-fetched context"
+NESTED_HISTORY = "<CONVERSATION HISTORY>"
+NESTED_USER_REGEX = re.compile(r"^\d+\. user: (.*?)(?=\n\d+\. \w+: |\n</CONVERSATION HISTORY>)", re.MULTILINE | re.DOTALL)
+
+
+class ScriptedModel(Model):
+    """`Model` replaying a script, stateless across calls: the step of an agent is the number of its own
+    function calls since the last user message, so concurrent sessions can share one instance"""
+
+    def __init__(self, script: dict, *, name: str="scripted", token_latency: float | None=None):
+        self.model = name
+        self.scenarios = [
+            (re.compile(s.get("match", ".*"), re.IGNORECASE | re.DOTALL), s["agents"])
+            for s in script["scenarios"]
+        ]
+        self.token_latency = script.get("token_latency", 0.0) if token_latency is None else token_latency
+        self.first_token_latency = script.get("first_token_latency", 0.0)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> "ScriptedModel":
+        return cls(json.loads(Path(path).read_text(encoding="utf-8")), **kwargs)
+
+    # SCRIPT
+    @staticmethod
+    def _question(input: str | list) -> tuple[str, list]:
+        """Last user message (without the appended pre-fetched context) and the items after it.
+        After a handoff the SDK nests the previous conversation in a single summary message: read it from there"""
+        if isinstance(input, str):
+            return input, []
+        for j in range(len(input) - 1, -1, -1):
+            item = input[j]
+            if not isinstance(item, dict) or not isinstance(item.get("content"), str):
+                continue
+            if item.get("role") == "user":
+                return item["content"].split(PREFETCH_MARKER)[0].strip(), input[j + 1:]
+            if NESTED_HISTORY in item["content"]:
+                users = NESTED_USER_REGEX.findall(item["content"])
+                return (users[-1].split(PREFETCH_MARKER)[0].strip() if users else ""), input[j + 1:]
+        return "", list(input)
+
+    def _step(self, agent_name: str, input: str | list) -> tuple[dict, str, int]:
+        question, turn_items = self._question(input)
+        steps = next((agents.get(agent_name, []) for regex, agents in self.scenarios if regex.search(question)), [])
+
+        prefix = f"call_{agent_name}_"
+        done = sum(
+            1 for item in turn_items
+            if isinstance(item, dict) and item.get("type") == "function_call" and item.get("call_id", "").startswith(prefix)
+        )
+        # one step per model call: tool steps are consumed by the calls they issued, a text step ends the turn
+        index, issued = 0, 0
+        while index < len(steps) and steps[index].get("tool_calls") and issued + len(steps[index]["tool_calls"]) <= done:
+            issued += len(steps[index]["tool_calls"])
+            index += 1
+
+        if index >= len(steps):
+            return {"text": "I have no scripted answer for this request."}, question, done
+        return steps[index], question, done
+
+    @staticmethod
+    def _fill(value: Any, question: str) -> Any:
+        if isinstance(value, str):
+            return value.replace("{question}", question)
+        if isinstance(value, dict):
+            return {k: ScriptedModel._fill(v, question) for k, v in value.items()}
+        if isinstance(value, list):
+            return [ScriptedModel._fill(v, question) for v in value]
+        return value
+
+    def _output(self, agent_name: str, input: str | list) -> list:
+        step, question, done = self._step(agent_name, input)
+        step = self._fill(step, question)
+
+        output = []
+        for j, call in enumerate(step.get("tool_calls", [])):
+            output.append(ResponseFunctionToolCall(
+                id=SCRIPTED_ID,
+                call_id=f"call_{agent_name}_{done + j}",
+                name=call["name"],
+                arguments=json.dumps(call.get("arguments", {})),
+                type="function_call",
+                status="completed",
+            ))
+        if step.get("text"):
+            output.append(ResponseOutputMessage(
+                id=SCRIPTED_ID,
+                content=[ResponseOutputText(text=step["text"], type="output_text", annotations=[], logprobs=[])],
+                role="assistant",
+                type="message",
+                status="completed",
+            ))
+        return output
+
+    @staticmethod
+    def _usage(system_instructions: str | None, input: str | list, output: list) -> Usage:
+        input_tokens = count_tokens((system_instructions or "") + json.dumps(input, default=str))
+        output_tokens = count_tokens(json.dumps([o.model_dump() for o in output]))
+        return Usage(
+            requests=1,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            total_tokens=input_tokens + output_tokens,
+            input_tokens_details=InputTokensDetails(cached_tokens=0),
+            output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+        )
+
+    @staticmethod
+    def _agent_name(system_instructions: str | None, tools: list[Tool], handoffs: list[Handoff]) -> str:
+        # the SDK does not pass the agent: recognize it by its tools
+        names = {t.name for t in tools} | {h.tool_name for h in handoffs}
+        return "Executor" if "executeQuery" in names else "Galileo"
+
+    # MODEL
+    async def get_response(
+            self,
+            system_instructions: str | None,
+            input: str | list,
+            model_settings: ModelSettings,
+            tools: list[Tool],
+            output_schema: AgentOutputSchemaBase | None,
+            handoffs: list[Handoff],
+            tracing: ModelTracing,
+            *,
+            previous_response_id: str | None=None,
+            conversation_id: str | None=None,
+            prompt: Any=None
+        ) -> ModelResponse:
+        output = self._output(self._agent_name(system_instructions, tools, handoffs), input)
+        await asyncio.sleep(self.first_token_latency + self.token_latency * sum(
+            len(TOKEN_REGEX.findall(o.arguments if isinstance(o, ResponseFunctionToolCall) else o.content[0].text))
+            for o in output
+        ))
+        return ModelResponse(output=output, usage=self._usage(system_instructions, input, output), response_id=None)
+
+    async def stream_response(
+            self,
+            system_instructions: str | None,
+            input: str | list,
+            model_settings: ModelSettings,
+            tools: list[Tool],
+            output_schema: AgentOutputSchemaBase | None,
+            handoffs: list[Handoff],
+            tracing: ModelTracing,
+            *,
+            previous_response_id: str | None=None,
+            conversation_id: str | None=None,
+            prompt: Any=None
+        ) -> AsyncIterator:
+        output = self._output(self._agent_name(system_instructions, tools, handoffs), input)
+        response = Response(
+            id=SCRIPTED_ID,
+            created_at=time.time(),
+            model=self.model,
+            object="response",
+            output=[],
+            tool_choice="auto",
+            tools=[],
+            parallel_tool_calls=False,
+        )
+        seq = iter(range(1_000_000))
+
+        await asyncio.sleep(self.first_token_latency)
+        yield ResponseCreatedEvent(response=response, type="response.created", sequence_number=next(seq))
+
+        for index, item in enumerate(output):
+            if isinstance(item, ResponseOutputMessage):
+                text = item.content[0].text
+                empty = ResponseOutputMessage(id=SCRIPTED_ID, content=[], role="assistant", type="message", status="in_progress")
+                yield ResponseOutputItemAddedEvent(item=empty, output_index=index, type="response.output_item.added", sequence_number=next(seq))
+                yield ResponseContentPartAddedEvent(
+                    content_index=0, item_id=SCRIPTED_ID, output_index=index,
+                    part=ResponseOutputText(text="", type="output_text", annotations=[], logprobs=[]),
+                    type="response.content_part.added", sequence_number=next(seq)
+                )
+                for token in TOKEN_REGEX.findall(text):
+                    await asyncio.sleep(self.token_latency)
+                    yield ResponseTextDeltaEvent(
+                        content_index=0, delta=token, item_id=SCRIPTED_ID, output_index=index, logprobs=[],
+                        type="response.output_text.delta", sequence_number=next(seq)
+                    )
+                yield ResponseContentPartDoneEvent(
+                    content_index=0, item_id=SCRIPTED_ID, output_index=index, part=item.content[0],
+                    type="response.content_part.done", sequence_number=next(seq)
+                )
+            else:
+                yield ResponseOutputItemAddedEvent(
+                    item=item.model_copy(update={"arguments": ""}), output_index=index,
+                    type="response.output_item.added", sequence_number=next(seq)
+                )
+                for token in TOKEN_REGEX.findall(item.arguments):
+                    await asyncio.sleep(self.token_latency)
+                    yield ResponseFunctionCallArgumentsDeltaEvent(
+                        delta=token, item_id=SCRIPTED_ID, output_index=index,
+                        type="response.function_call_arguments.delta", sequence_number=next(seq)
+                    )
+
+            yield ResponseOutputItemDoneEvent(item=item, output_index=index, type="response.output_item.done", sequence_number=next(seq))
+
+        usage = self._usage(system_instructions, input, output)
+        final = response.model_copy()
+        final.output = output
+        final.usage = ResponseUsage(
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            total_tokens=usage.total_tokens,
+            input_tokens_details=ResponseInputTokensDetails(cached_tokens=0),
+            output_tokens_details=ResponseOutputTokensDetails(reasoning_tokens=0),
+        )
+        yield ResponseCompletedEvent(response=final, type="response.completed", sequence_number=next(seq))
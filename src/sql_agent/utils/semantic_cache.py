@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from build.config import config
+from src.sql_agent.rag.embedder import Embedder
+from src.sql_agent.rag.sql_rag import sql_retriever
+from src.logger import logger
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    vector: np.ndarray # L2-normalized question embedding
+    sql: str
+    answer: str
+    data_version: str
+    created_at: float = field(default_factory=time.time)
+
+
+class SemanticCache:
+    """Semantic answer cache in front of the agent pipeline, shared by all sessions: only self-contained
+    questions (the first of a conversation) are looked up and stored.
+
+    Questions are matched by cosine similarity of their embeddings; a hit carries the SQL that answered the
+    original question and its final answer, valid as long as the catalog `data_version` is unchanged.
+    Entries expire after `ttl` seconds and the least recently used ones are evicted beyond `max_items`.
+    """
+
+    def __init__(
+            self,
+            embedder: Embedder,
+            *,
+            threshold: float=config.SEMANTIC_CACHE_THRESHOLD,
+            ttl: float=config.SEMANTIC_CACHE_TTL,
+            max_items: int=config.SEMANTIC_CACHE_SIZE
+        ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max_items
+        self.entries: OrderedDict[str, CachedAnswer] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0 # hits whose data version changed: SQL re-executed
+        self.misses = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.get_embeddings([question,])[0], dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1)
+
+    def _evict(self) -> None:
+        now = time.time()
+        for key in [k for k, e in self.entries.items() if now - e.created_at > self.ttl]:
+            del self.entries[key]
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
+
+    def lookup(self, question: str) -> tuple[CachedAnswer, float] | None:
+        """Most similar live entry above `threshold`, if any"""
+        vector = self._embed(question)
+
+        with self._lock:
+            self._evict()
+            if not self.entries:
+                self.misses += 1
+                return None
+
+            keys = list(self.entries)
+            scores = np.stack([self.entries[k].vector for k in keys]) @ vector
+            best = int(np.argmax(scores))
+
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(keys[best])
+            return self.entries[keys[best]], float(scores[best])
+
+    def store(self, question: str, *, sql: str, answer: str, data_version: str) -> None:
+        entry = CachedAnswer(question, self._embed(question), sql, answer, data_version)
+        with self._lock:
+            self.entries[question] = entry
+            self.entries.move_to_end(question)
+            self._evict()
+        logger.debug(f"Semantic cache: stored answer for `{question}` ({len(self.entries)} entries).")
+
+    def record_miss(self) -> None:
+        """A hit that could not be used (stale, without a replay agent)"""
+        self.misses += 1
+
+    def record_hit(self, *, stale: bool) -> None:
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "entries": len(self.entries),
+        }
+
+
+# Singleton
+semantic_cache = SemanticCache(sql_retriever.hf_embedder)
@@ -0,0 +1,226 @@
+"""
+Durable conversation state of `AgentRunner` sessions: the compacted history and its handles (`HistoryManager.to_state`),
+keyed by session id, so a restarted or another replica of the app can resume a conversation.
+
+`WriteBehindStore` keeps the last state of each session in memory and writes it to the backend (SQLite or Postgres)
+from a daemon thread, so a turn never waits on the database.
+"""
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import psycopg2
+
+from build.config import config
+from src.logger import logger
+
+
+class SessionStore(ABC):
+    """Backend interface: JSON-serializable state per session id"""
+
+    @abstractmethod
+    def load(self, session_id: str) -> dict | None:
+        pass
+
+    @abstractmethod
+    def save_many(self, states: dict[str, dict]) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def purge(self, older_than: float) -> int:
+        """Delete the sessions not updated in the last `older_than` seconds"""
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path: str=config.SESSION_DB_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL") # readers do not wait on the writer thread
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def load(self, session_id: str) -> dict | None:
+        with self.lock:
+            row = self.conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, states: dict[str, dict]) -> None:
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO sessions (id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                [(session_id, json.dumps(state, ensure_ascii=False), now) for session_id, state in states.items()]
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge(self, older_than: float) -> int:
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - older_than,)).rowcount
+
+
+class PostgresSessionStore(SessionStore):
+    """Sessions in the app database, shared by all the replicas"""
+
+    TABLE = "galileo_sessions"
+
+    def __init__(self, db_config: dict=config.DB_CONFIG):
+        self.db_config = db_config
+        self._ready = False # table created at the first use, not at import
+
+    def _run(self, sql: str, params: tuple | list=(), *, many: bool=False, fetch: bool=False):
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            with conn, conn.cursor() as cur:
+                if not self._ready:
+                    cur.execute(
+                        f"CREATE TABLE IF NOT EXISTS {self.TABLE} "
+                        "(id TEXT PRIMARY KEY, state JSONB NOT NULL, updated_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+                    )
+                    self._ready = True
+                if many:
+                    cur.executemany(sql, params)
+                else:
+                    cur.execute(sql, params)
+                return cur.fetchone() if fetch else cur.rowcount
+        finally:
+            conn.close()
+
+    def load(self, session_id: str) -> dict | None:
+        row = self._run(f"SELECT state FROM {self.TABLE} WHERE id = %s", (session_id,), fetch=True)
+        return row[0] if row else None # JSONB -> dict
+
+    def save_many(self, states: dict[str, dict]) -> None:
+        self._run(
+            f"INSERT INTO {self.TABLE} (id, state, updated_at) VALUES (%s, %s, now()) "
+            "ON CONFLICT (id) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at",
+            [(session_id, json.dumps(state, ensure_ascii=False)) for session_id, state in states.items()],
+            many=True
+        )
+
+    def delete(self, session_id: str) -> None:
+        self._run(f"DELETE FROM {self.TABLE} WHERE id = %s", (session_id,))
+
+    def purge(self, older_than: float) -> int:
+        return self._run(f"DELETE FROM {self.TABLE} WHERE updated_at < now() - %s * interval '1 second'", (older_than,))
+
+
+class WriteBehindStore:
+    """In-memory write-behind cache in front of a `SessionStore`.
+
+    `save` only records the latest state of the session (overwriting a pending one), a daemon thread writes the
+    pending states in one batch every `flush_interval` seconds. `load` sees pending states before the backend.
+    Backend writes and deletes are serialized (`write_lock`), so a flush in progress cannot resurrect a deleted session.
+    """
+
+    def __init__(self, backend: SessionStore, *, flush_interval: float=config.SESSION_FLUSH_INTERVAL):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.pending: dict[str, dict] = {}
+        self.inflight: dict[str, dict] = {} # taken by a flush, not yet in the backend
+        self.lock = threading.Lock() # pending/inflight
+        self.write_lock = threading.Lock() # backend writes vs deletes
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.writes = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None=None) -> None:
+        """Write what is pending and stop the worker"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def load(self, session_id: str) -> dict | None:
+        with self.lock:
+            state = self.pending.get(session_id) or self.inflight.get(session_id)
+        return state if state is not None else self.backend.load(session_id)
+
+    def save(self, session_id: str, state: dict) -> None:
+        self.start()
+        with self.lock:
+            self.pending[session_id] = state
+
+    def delete(self, session_id: str) -> None:
+        with self.write_lock: # waits for a running flush, whose batch may hold this session
+            with self.lock:
+                self.pending.pop(session_id, None)
+            self.backend.delete(session_id)
+
+    def purge(self, older_than: float) -> int:
+        return self.backend.purge(older_than)
+
+    def flush(self) -> None:
+        with self.write_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+                self.inflight = batch
+            if not batch:
+                return
+            try:
+                self.backend.save_many(batch)
+                self.writes += len(batch)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Session store: failed to write {len(batch)} sessions: {e}")
+                with self.lock: # retried at the next flush, unless a newer state arrived meanwhile
+                    self.pending = {**batch, **self.pending}
+            finally:
+                with self.lock:
+                    self.inflight = {}
+
+    # WORKER
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def _backend(kind: str) -> SessionStore | None:
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind == "postgres":
+        return PostgresSessionStore()
+    return None
+
+
+# Singleton, built on first use (None when SESSION_STORE=none: sessions live only in memory)
+_session_store: WriteBehindStore | None = None
+_session_store_built = False
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> WriteBehindStore | None:
+    global _session_store, _session_store_built
+    with _session_store_lock:
+        if not _session_store_built:
+            backend = _backend(config.SESSION_STORE)
+            _session_store = WriteBehindStore(backend) if backend is not None else None
+            _session_store_built = True
+        return _session_store
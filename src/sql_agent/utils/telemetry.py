@@ -0,0 +1,286 @@
+import json
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Iterable, Literal
+
+import numpy as np
+from agents import Agent, RunContextWrapper, RunHooks, Tool
+from agents.items import ModelResponse
+
+from build.config import config
+from src.logger import logger
+
+Stage = Literal["turn", "cache", "route", "agent", "llm", "tool", "handoff"]
+
+
+@dataclass
+class Span:
+    session: str
+    turn: int
+    stage: Stage
+    name: str # agent, tool or route name
+    agent: str | None
+    start: float # epoch seconds
+    duration: float # seconds
+    ttft: float | None = None # llm only: seconds to the first token delta
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    cached_tokens: int | None = None
+    model: str | None = None # llm only: model tier that served the call
+    cost: float | None = None # llm only: USD
+
+
+class TelemetryHooks(RunHooks):
+    """`RunHooks` recording a span for every LLM call, tool call, handoff and agent run, tagged by session and turn.
+
+    LLM spans carry time to first token (marked by `AgentRunner` on the first text or tool call delta) and token usage.
+    Spans are appended to `<export_dir>/spans-<session>.jsonl` at the end of each turn, the file is rotated above
+    `max_file_bytes` and old files are pruned (see `prune`); `prometheus` renders the in-memory window as Prometheus
+    text, without a per-session label.
+    """
+
+    def __init__(
+            self,
+            session_id: str | None=None,
+            *,
+            export_dir: str=config.TELEMETRY_DIR,
+            window: int=10_000,
+            max_file_bytes: int=config.TELEMETRY_MAX_FILE_BYTES
+        ):
+        self.session_id = session_id or uuid.uuid4().hex[:8]
+        self.export_dir = Path(export_dir)
+        self.max_file_bytes = max_file_bytes
+        self.spans: deque[Span] = deque(maxlen=window)
+        self.turn = 0
+        self._pending: list[Span] = [] # not exported yet
+        self._open: dict[tuple, list[float]] = {} # (stage, agent, name) -> start times, tools may run in parallel
+        self._first_token: dict[str, float] = {}
+        self._handoff: tuple[str, str, float] | None = None
+
+    # SPANS
+    def record(self, stage: Stage, name: str, duration: float, *, agent: str | None=None, **fields: Any) -> Span:
+        span = Span(self.session_id, self.turn, stage, name, agent, time.time() - duration, duration, **fields)
+        self.spans.append(span)
+        self._pending.append(span)
+        return span
+
+    def _start(self, *key: str) -> None:
+        self._open.setdefault(key, []).append(time.perf_counter())
+
+    def _stop(self, *key: str) -> float:
+        starts = self._open.get(key)
+        return time.perf_counter() - starts.pop() if starts else 0.0
+
+    def start_turn(self) -> None:
+        self.turn += 1
+        self._open.clear()
+        self._first_token.clear()
+        self._handoff = None
+
+    def end_turn(self, route: str, elapsed: float) -> None:
+        self.record("turn", route, elapsed)
+        self.flush()
+
+    def mark_first_token(self, agent: Agent[Any]) -> None:
+        """First token delta (text or tool call arguments) of the current LLM call of `agent`"""
+        if ("llm", agent.name, agent.name) in self._open and agent.name not in self._first_token:
+            self._first_token[agent.name] = time.perf_counter()
+
+    # HOOKS
+    async def on_agent_start(self, context: RunContextWrapper[Any], agent: Agent[Any]) -> None:
+        self._start("agent", agent.name, agent.name)
+
+    async def on_agent_end(self, context: RunContextWrapper[Any], agent: Agent[Any], output: Any) -> None:
+        self.record("agent", agent.name, self._stop("agent", agent.name, agent.name), agent=agent.name)
+
+    async def on_llm_start(
+            self,
+            context: RunContextWrapper[Any],
+            agent: Agent[Any],
+            system_prompt: str | None,
+            input_items: list
+        ) -> None:
+        if self._handoff is not None and self._handoff[1] == agent.name:
+            # handoff span: from the transfer call to the first request of the new agent
+            source, target, started = self._handoff
+            self.record("handoff", f"{source}->{target}", time.perf_counter() - started, agent=source)
+            self._handoff = None
+
+        self._first_token.pop(agent.name, None)
+        self._start("llm", agent.name, agent.name)
+
+    async def on_llm_end(self, context: RunContextWrapper[Any], agent: Agent[Any], response: ModelResponse) -> None:
+        starts = self._open.get(("llm", agent.name, agent.name))
+        started = starts[-1] if starts else None
+        duration = self._stop("llm", agent.name, agent.name)
+        first_token = self._first_token.pop(agent.name, None)
+
+        usage = response.usage
+        calls = getattr(context.context, "llm_calls", None) # appended by `TieredModel`
+        call = calls[-1] if calls and calls[-1]["agent"] == agent.name else {}
+        self.record(
+            "llm", agent.name, duration,
+            agent=agent.name,
+            ttft=first_token - started if first_token and started else None,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cached_tokens=usage.input_tokens_details.cached_tokens,
+            model=call.get("model"),
+            cost=call.get("cost"),
+        )
+
+    async def on_tool_start(self, context: RunContextWrapper[Any], agent: Agent[Any], tool: Tool) -> None:
+        self._start("tool", agent.name, tool.name)
+
+    async def on_tool_end(self, context: RunContextWrapper[Any], agent: Agent[Any], tool: Tool, result: str) -> None:
+        self.record("tool", tool.name, self._stop("tool", agent.name, tool.name), agent=agent.name)
+
+    async def on_handoff(self, context: RunContextWrapper[Any], from_agent: Agent[Any], to_agent: Agent[Any]) -> None:
+        self._handoff = (from_agent.name, to_agent.name, time.perf_counter())
+
+    # EXPORT
+    def flush(self) -> None:
+        """Append the spans recorded since the last flush to the session JSONL, rotating it when too large"""
+        if not self._pending:
+            return
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        path = self.export_dir / f"spans-{self.session_id}.jsonl"
+
+        created = not path.exists()
+        if not created and path.stat().st_size > self.max_file_bytes:
+            path.rename(path.with_name(f"spans-{self.session_id}.{time.time_ns() // 1_000_000}.jsonl"))
+            created = True
+
+        with open(path, "a", encoding="utf-8") as f:
+            for span in self._pending:
+                f.write(json.dumps(asdict(span)) + "\n")
+        self._pending.clear()
+
+        if created: # once per session file, not on every turn
+            prune(self.export_dir)
+
+    def summary(self) -> dict[str, dict]:
+        return summarize(self.spans)
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition of the current window.
+
+        No `session` label: one series per session id would grow without bound, the per-session
+        breakdown stays in the span files (`scripts/telemetry_report.py --session`).
+        """
+        lines = [
+            "# HELP galileo_stage_seconds Duration of agent pipeline stages.",
+            "# TYPE galileo_stage_seconds summary",
+        ]
+        for key, stats in summarize(self.spans).items():
+            stage, _, name = key.partition(":")
+            name, _, model = name.partition("@")
+            labels = f'stage="{stage}",name="{name}"' + (f',model="{model}"' if model else "")
+            lines += [
+                f'galileo_stage_seconds{{{labels},quantile="0.5"}} {stats["p50"]}',
+                f'galileo_stage_seconds{{{labels},quantile="0.95"}} {stats["p95"]}',
+                f"galileo_stage_seconds_sum{{{labels}}} {stats['sum']}",
+                f"galileo_stage_seconds_count{{{labels}}} {stats['count']}",
+            ]
+
+        lines += [
+            "# HELP galileo_llm_tokens_total LLM tokens by agent and kind.",
+            "# TYPE galileo_llm_tokens_total counter",
+        ]
+        tokens: dict[tuple[str, str, str], int] = {}
+        costs: dict[tuple[str, str], float] = {}
+        for span in self.spans:
+            if span.stage == "llm":
+                model = span.model or ""
+                for kind in ("input", "output", "cached"):
+                    key = (span.name, model, kind)
+                    tokens[key] = tokens.get(key, 0) + (getattr(span, f"{kind}_tokens") or 0)
+                costs[(span.name, model)] = costs.get((span.name, model), 0.0) + (span.cost or 0.0)
+        for (agent, model, kind), value in tokens.items():
+            lines.append(f'galileo_llm_tokens_total{{agent="{agent}",model="{model}",kind="{kind}"}} {value}')
+
+        lines += [
+            "# HELP galileo_llm_cost_usd_total LLM cost by agent and model tier.",
+            "# TYPE galileo_llm_cost_usd_total counter",
+        ]
+        for (agent, model), value in costs.items():
+            lines.append(f'galileo_llm_cost_usd_total{{agent="{agent}",model="{model}"}} {value:.6f}')
+
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str | None=None) -> Path:
+        path = Path(path) if path else self.export_dir / f"metrics-{self.session_id}.prom"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.prometheus(), encoding="utf-8")
+        return path
+
+
+def prune(
+        export_dir: str | Path,
+        *,
+        max_files: int=config.TELEMETRY_MAX_FILES,
+        retention: float=config.TELEMETRY_RETENTION
+    ) -> int:
+    """Delete the exported files (spans and metrics) older than `retention` seconds, then the oldest beyond `max_files`"""
+    files = []
+    for file in [*Path(export_dir).glob("spans-*.jsonl"), *Path(export_dir).glob("metrics-*.prom")]:
+        try:
+            files.append((file.stat().st_mtime, file))
+        except FileNotFoundError: # pruned by another process
+            pass
+    files.sort(reverse=True)
+
+    cutoff = time.time() - retention
+    stale = [file for i, (mtime, file) in enumerate(files) if mtime < cutoff or i >= max_files]
+    for file in stale:
+        file.unlink(missing_ok=True)
+    if stale:
+        logger.debug(f"Telemetry: pruned {len(stale)} files from `{export_dir}`.")
+    return len(stale)
+
+
+def summarize(spans: Iterable[Span | dict]) -> dict[str, dict]:
+    """count, sum, p50 and p95 (seconds) per `stage:name` (`llm:agent@model` for tiered LLM calls), plus ttft for LLM calls"""
+    durations: dict[str, list[float]] = {}
+    ttfts: dict[str, list[float]] = {}
+    for span in spans:
+        span = asdict(span) if isinstance(span, Span) else span
+        key = f"{span['stage']}:{span['name']}" + (f"@{span['model']}" if span.get("model") else "")
+        durations.setdefault(key, []).append(span["duration"])
+        if span.get("ttft") is not None:
+            ttfts.setdefault(key, []).append(span["ttft"])
+
+    report = {}
+    for key, values in sorted(durations.items()):
+        report[key] = {
+            "count": len(values),
+            "sum": round(float(np.sum(values)), 4),
+            "p50": round(float(np.percentile(values, 50)), 4),
+            "p95": round(float(np.percentile(values, 95)), 4),
+        }
+        if key in ttfts:
+            report[key]["ttft_p50"] = round(float(np.percentile(ttfts[key], 50)), 4)
+            report[key]["ttft_p95"] = round(float(np.percentile(ttfts[key], 95)), 4)
+    return report
+
+
+def format_summary(report: dict[str, dict]) -> str:
+    rows = [f"{'stage:name':<48}{'count':>7}{'p50 s':>10}{'p95 s':>10}{'ttft p50':>10}{'ttft p95':>10}"]
+    for key, stats in report.items():
+        rows.append(
+            f"{key:<48}{stats['count']:>7}{stats['p50']:>10.3f}{stats['p95']:>10.3f}"
+            f"{stats.get('ttft_p50', float('nan')):>10.3f}{stats.get('ttft_p95', float('nan')):>10.3f}"
+        )
+    return "\n".join(rows)
+
+
+def load_spans(path: str) -> list[dict]:
+    spans = []
+    for file in sorted(Path(path).glob("spans-*.jsonl")) if Path(path).is_dir() else [Path(path)]:
+        with open(file, encoding="utf-8") as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    logger.debug(f"Loaded {len(spans)} spans from `{path}`.")
+    return spans
@@ -0,0 +1,133 @@
+"""
+Per-agent model tiers: every LLM call of an agent goes to the cheapest tier of its chain, and moves one tier up for
+every failed `executeQuery` of the turn and when the collector flagged its report as low confidence.
+
+The SDK does not pass the run context to the model: `AgentRunner` publishes the turn's `SQLContext` in `run_context`
+(copied into the run task), where `TieredModel` reads the escalation signals and appends one record per call.
+"""
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable
+
+import numpy as np
+from agents import Model, ModelResponse, ModelSettings
+from openai.types.responses import ResponseCompletedEvent
+
+from build.config import config
+from src.sql_agent.context import SQLContext
+from src.logger import logger
+
+run_context: ContextVar[SQLContext | None] = ContextVar("run_context", default=None)
+
+# last LLM calls of the process, all sessions (see `tier_report`)
+llm_calls: deque[dict] = deque(maxlen=10_000)
+
+
+def llm_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """USD cost of a call from `config.MODEL_PRICES` (0 for unpriced models)"""
+    price_in, price_cached, price_out = config.MODEL_PRICES.get(model, (0.0, 0.0, 0.0))
+    return ((input_tokens - cached_tokens) * price_in + cached_tokens * price_cached + output_tokens * price_out) / 1e6
+
+
+class TieredModel(Model):
+    """`Model` dispatching each call to a tier of `tiers` (name, model), cheapest first.
+
+    `settings(model)` gives the provider-specific settings of a tier (e.g. prompt caching), layered on the agent's
+    own `model_settings` at every call, so a chain may mix providers.
+    """
+
+    def __init__(
+            self,
+            tiers: list[tuple[str, Model]],
+            *,
+            agent: str,
+            settings: Callable[[Model], ModelSettings] | None=None
+        ):
+        self.tiers = tiers
+        self.agent = agent
+        self.settings = settings
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.tiers[0][1], name) # e.g. `.model`
+
+    def _tier(self, ctx: SQLContext | None) -> int:
+        if ctx is None:
+            return 0
+        return min(len(ctx.failed_queries) + int(ctx.low_confidence), len(self.tiers) - 1)
+
+    def _record(self, ctx: SQLContext | None, tier: int, seconds: float, usage: Any) -> None:
+        """`usage`: agents `Usage` or the `ResponseUsage` of a stream, same fields"""
+        name = self.tiers[tier][0]
+        input_tokens = usage.input_tokens if usage else 0
+        cached = (getattr(usage.input_tokens_details, "cached_tokens", 0) or 0) if usage else 0
+        output_tokens = usage.output_tokens if usage else 0
+        call = {
+            "agent": self.agent,
+            "model": name,
+            "tier": tier,
+            "seconds": round(seconds, 4),
+            "input_tokens": input_tokens,
+            "cached_tokens": cached,
+            "output_tokens": output_tokens,
+            "cost": llm_cost(name, input_tokens, cached, output_tokens),
+        }
+        llm_calls.append(call)
+        if ctx is not None:
+            ctx.llm_calls.append(call)
+
+    def _tier_args(self, tier: int, args: tuple, kwargs: dict) -> tuple[tuple, dict]:
+        """Call arguments with the tier settings over the agent ones (`model_settings` is the 3rd parameter)"""
+        if self.settings is None:
+            return args, kwargs
+        tier_settings = self.settings(self.tiers[tier][1])
+        if "model_settings" in kwargs:
+            return args, {**kwargs, "model_settings": kwargs["model_settings"].resolve(tier_settings)}
+        return (*args[:2], args[2].resolve(tier_settings), *args[3:]), kwargs
+
+    def _select(self) -> tuple[SQLContext | None, int]:
+        ctx = run_context.get()
+        tier = self._tier(ctx)
+        if tier > 0 and not any(c["agent"] == self.agent and c["tier"] == tier for c in (ctx.llm_calls if ctx else [])):
+            logger.info(f"{self.agent}: escalating to `{self.tiers[tier][0]}` "
+                        f"({len(ctx.failed_queries)} failed queries, low confidence: {ctx.low_confidence})")
+        return ctx, tier
+
+    async def get_response(self, *args: Any, **kwargs: Any) -> ModelResponse:
+        ctx, tier = self._select()
+        args, kwargs = self._tier_args(tier, args, kwargs)
+        start = time.perf_counter()
+        response = await self.tiers[tier][1].get_response(*args, **kwargs)
+        self._record(ctx, tier, time.perf_counter() - start, response.usage)
+        return response
+
+    async def stream_response(self, *args: Any, **kwargs: Any) -> AsyncIterator:
+        ctx, tier = self._select()
+        args, kwargs = self._tier_args(tier, args, kwargs)
+        start, usage = time.perf_counter(), None
+        async for event in self.tiers[tier][1].stream_response(*args, **kwargs):
+            if isinstance(event, ResponseCompletedEvent):
+                usage = event.response.usage
+            yield event
+        self._record(ctx, tier, time.perf_counter() - start, usage)
+
+
+def tier_report(calls: list[dict] | deque[dict]=llm_calls) -> dict[str, dict]:
+    """Calls, p50/p95 latency (seconds), tokens and USD cost per `agent@model`"""
+    groups: dict[str, list[dict]] = {}
+    for call in calls:
+        groups.setdefault(f"{call['agent']}@{call['model']}", []).append(call)
+
+    report = {}
+    for key, group in sorted(groups.items()):
+        seconds = [c["seconds"] for c in group]
+        report[key] = {
+            "calls": len(group),
+            "p50": round(float(np.percentile(seconds, 50)), 3),
+            "p95": round(float(np.percentile(seconds, 95)), 3),
+            "input_tokens": sum(c["input_tokens"] for c in group),
+            "cached_tokens": sum(c["cached_tokens"] for c in group),
+            "output_tokens": sum(c["output_tokens"] for c in group),
+            "cost": round(sum(c["cost"] for c in group), 6),
+        }
+    return report
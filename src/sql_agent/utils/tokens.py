@@ -0,0 +1,22 @@
+from functools import lru_cache
+
+from src.logger import logger
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken `o200k_base` encoding when available (it may need a download), `None` otherwise"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.debug(f"tiktoken not available, falling back to ~4 chars/token: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of `text` (exact for OpenAI models, close enough for Claude)"""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,81 @@
+# Usage: python -m pytest test/cache_test.py
+import hashlib
+import multiprocessing as mp
+
+import numpy as np
+
+from src.sql_agent.rag.cache import EmbeddingCache
+
+DIM = 8
+
+
+def vector(text: str) -> np.ndarray:
+    """Deterministic fake embedding of `text`"""
+    return np.random.default_rng(int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)).random(DIM, dtype=np.float32)
+
+
+def write(cache_dir: str, prefix: str, n: int) -> None:
+    cache = EmbeddingCache("model", DIM, cache_dir=cache_dir, max_items=1)
+    for j in range(n):
+        texts = [f"{prefix}-{j}-{k}" for k in range(3)]
+        cache.put_many(texts, np.stack([vector(t) for t in texts]))
+
+
+def test_round_trip(tmp_path):
+    cache = EmbeddingCache("model", DIM, cache_dir=str(tmp_path))
+    texts = ["a", "b"]
+    cache.put_many(texts, np.stack([vector(t) for t in texts]))
+
+    found = cache.get_many(["a", "b", "c"])
+    assert np.allclose(found[0], vector("a")) and np.allclose(found[1], vector("b"))
+    assert found[2] is None
+    assert cache.memory_hits == 2 and cache.misses == 1
+
+
+def test_reload_from_disk(tmp_path):
+    write(str(tmp_path), "x", 2)
+    cache = EmbeddingCache("model", DIM, cache_dir=str(tmp_path))
+    found = cache.get_many(["x-0-0", "x-1-2"])
+    assert np.allclose(found[0], vector("x-0-0")) and np.allclose(found[1], vector("x-1-2"))
+    assert cache.disk_hits == 2
+
+
+def test_orphan_rows_are_trimmed(tmp_path):
+    write(str(tmp_path), "x", 1)
+    cache = EmbeddingCache("model", DIM, cache_dir=str(tmp_path))
+    with open(cache.vectors_file, "ab") as f: # vectors written, keys not: interrupted append
+        f.write(vector("lost").tobytes())
+
+    cache.put_many(["y"], vector("y")[None])
+    fresh = EmbeddingCache("model", DIM, cache_dir=str(tmp_path))
+    assert np.allclose(fresh.get_many(["y"])[0], vector("y"))
+    assert fresh.stats()["disk_items"] == 4
+
+
+def test_interleaved_instances(tmp_path):
+    """Two instances on the same directory, as two processes: rows appended by one are seen by the other"""
+    first = EmbeddingCache("model", DIM, cache_dir=str(tmp_path), max_items=1)
+    second = EmbeddingCache("model", DIM, cache_dir=str(tmp_path), max_items=1)
+
+    first.put_many(["a"], vector("a")[None])
+    second.put_many(["b"], vector("b")[None])
+    first.put_many(["c"], vector("c")[None])
+
+    for cache in (first, second):
+        found = cache.get_many(["a", "b", "c"])
+        assert all(np.allclose(v, vector(t)) for v, t in zip(found, "abc"))
+
+
+def test_concurrent_processes(tmp_path):
+    ctx = mp.get_context("spawn")
+    workers = [ctx.Process(target=write, args=(str(tmp_path), f"p{j}", 30)) for j in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    cache = EmbeddingCache("model", DIM, cache_dir=str(tmp_path), max_items=1)
+    texts = [f"p{j}-{n}-{k}" for j in range(3) for n in range(30) for k in range(3)]
+    found = cache.get_many(texts)
+    assert all(v is not None and np.allclose(v, vector(t)) for v, t in zip(found, texts))
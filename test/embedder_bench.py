@@ -0,0 +1,52 @@
+# Usage: python -m test.embedder_bench   (onnx backends need `sentence-transformers[onnx]`; parity gate in test/embedder_parity_test.py)
+import time
+from statistics import median
+
+import numpy as np
+
+from build.config import config
+from build.embedding import load_embedding_model
+from test.embedder_parity_test import cosine_matrix
+from src.sql_agent.rag.kb import kb_index
+from src.logger import logger
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+sentences = [item["nl_quest"] for item in kb_index.entries]
+batch = sentences * max(1, 512 // len(sentences))
+
+reference = None
+for backend in BACKENDS:
+    try:
+        model = load_embedding_model(config.EMBEDDING_MODEL_NAME, backend, config.EMBEDDING_ONNX_INT8_FILE)
+    except Exception as e:
+        logger.warning(f"Backend `{backend}` not available: {e}")
+        continue
+
+    model.encode(sentences[:1]) # warm up
+
+    # Single query latency
+    latencies = []
+    for sentence in sentences * 5:
+        start = time.perf_counter()
+        model.encode([sentence,])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # Batch throughput
+    start = time.perf_counter()
+    model.encode(batch, batch_size=config.EMBEDDING_BATCH_SIZE)
+    throughput = len(batch) / (time.perf_counter() - start)
+
+    # Parity on cosine scores against the torch reference
+    scores = cosine_matrix(model.encode(sentences))
+    if reference is None:
+        reference = scores
+    drift = float(np.abs(scores - reference).max())
+    top1 = float(np.mean(
+        np.argsort(-scores, axis=1)[:, 1] == np.argsort(-reference, axis=1)[:, 1]
+    ))
+
+    logger.info(
+        f"{backend:>9}: single p50={median(latencies):.2f}ms | batch={throughput:.1f} sentences/s | "
+        f"max cosine drift={drift:.4f} | nearest-neighbour agreement={top1:.2%}"
+    )
@@ -0,0 +1,30 @@
+# Usage: python -m pytest test/embedder_parity_test.py   (needs `sentence-transformers[onnx]`)
+import numpy as np
+
+from build.embedding import load_embedding_model
+from build.config import config
+from src.sql_agent.rag.kb import kb_index
+
+MAX_COSINE_DRIFT = 0.02 # parity tolerance on pairwise cosine scores against torch
+
+
+def cosine_matrix(vectors: np.ndarray) -> np.ndarray:
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors @ vectors.T
+
+
+def cosine_drift(backend: str) -> float:
+    sentences = [item["nl_quest"] for item in kb_index.entries]
+    reference = cosine_matrix(load_embedding_model(config.EMBEDDING_MODEL_NAME, "torch").encode(sentences))
+    model = load_embedding_model(config.EMBEDDING_MODEL_NAME, backend, config.EMBEDDING_ONNX_INT8_FILE)
+    return float(np.abs(cosine_matrix(model.encode(sentences)) - reference).max())
+
+
+def test_onnx_parity():
+    drift = cosine_drift("onnx")
+    assert drift <= MAX_COSINE_DRIFT, f"`onnx` cosine drift {drift:.4f} > {MAX_COSINE_DRIFT}"
+
+
+def test_onnx_int8_parity():
+    drift = cosine_drift("onnx-int8")
+    assert drift <= MAX_COSINE_DRIFT, f"`onnx-int8` cosine drift {drift:.4f} > {MAX_COSINE_DRIFT}"
@@ -0,0 +1,36 @@
+# Usage: python -m test.embedding_bench
+import time
+
+from src.sql_agent.rag.embedder import Embedder
+from src.sql_agent.rag.kb import kb_index
+from src.logger import logger
+
+embedder = Embedder(use_cache=False)
+sentences = [item["nl_quest"] for item in kb_index.entries]
+sentences = sentences * max(1, 1000 // len(sentences)) # ~1k sentences
+
+# Per-item encoding (one forward pass per sentence)
+start = time.perf_counter()
+for sentence in sentences:
+    embedder.get_embeddings([sentence,])
+per_item = time.perf_counter() - start
+logger.info(f"Per-item: {len(sentences)} sentences in {per_item:.3f}s ({len(sentences) / per_item:.1f} sentences/s)")
+
+# Batched encoding
+for batch_size in (16, 32, 64, 128):
+    start = time.perf_counter()
+    embedder.get_embeddings(sentences, batch_size=batch_size)
+    batched = time.perf_counter() - start
+    logger.info(
+        f"Batched (batch_size={batch_size}): {len(sentences)} sentences in {batched:.3f}s "
+        f"({len(sentences) / batched:.1f} sentences/s, x{per_item / batched:.1f} speed-up)"
+    )
+
+# Cached encoding: second pass over the same sentences is a lookup
+cached_embedder = Embedder()
+for label in ("cold cache", "warm cache"):
+    start = time.perf_counter()
+    cached_embedder.get_embeddings(sentences)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Cached ({label}): {len(sentences)} sentences in {elapsed:.3f}s")
+logger.info(f"Cache stats: {cached_embedder.cache_stats()}")
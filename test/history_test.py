@@ -0,0 +1,59 @@
+# Usage: python -m pytest test/history_test.py
+from src.sql_agent.utils.history import HistoryManager
+
+LONG_ANSWER = "the scenes are " + ", ".join(f"S2A_{j:05d}" for j in range(400))
+TOOL_OUTPUT = "\n".join(f"| {j} | 2024-01-{j % 28 + 1:02d} | 0.{j} |" for j in range(200))
+
+
+def turn(history: HistoryManager, question: str, *, answer: str="done", tool: str | None=None) -> None:
+    history.add("user", question, kind="user")
+    if tool is not None:
+        history.add("assistant", tool, kind="tool")
+    history.add("assistant", answer, kind="answer")
+
+
+def test_recent_turns_are_verbatim():
+    history = HistoryManager(budget=100_000, keep_turns=2, max_item_tokens=50)
+    turn(history, "q1", tool=TOOL_OUTPUT)
+    turn(history, "q2", tool=TOOL_OUTPUT, answer=LONG_ANSWER)
+    assert history.build() == history.items
+
+
+def test_older_turns_are_compacted_to_handles():
+    history = HistoryManager(budget=100_000, keep_turns=1, max_item_tokens=50)
+    turn(history, "q1", tool=TOOL_OUTPUT, answer=LONG_ANSWER)
+    turn(history, "q2", tool=TOOL_OUTPUT)
+
+    items = history.build()
+    assert [i["content"] for i in items[:1] + items[3:]] == ["q1", "q2", TOOL_OUTPUT, "done"]
+    assert "tool output elided" in items[1]["content"]
+    assert items[2]["content"].startswith(LONG_ANSWER[:40]) and "truncated" in items[2]["content"]
+    assert history.tokens() < history.tokens(history.items)
+
+    handles = [c.split("`")[-2] for c in (items[1]["content"], items[2]["content"])]
+    assert history.resolve(handles[0]) == TOOL_OUTPUT
+    assert history.resolve(handles[1]) == LONG_ANSWER
+
+
+def test_budget_drops_the_oldest_turns():
+    history = HistoryManager(budget=100_000, keep_turns=1, max_item_tokens=50)
+    for j in range(4):
+        turn(history, f"question {j}", tool=TOOL_OUTPUT)
+
+    history.budget = history.tokens() - 1 # one token short: only the oldest turn goes
+    contents = [i["content"] for i in history.build()]
+    assert "question 0" not in contents and "question 1" in contents
+
+    history.budget = 1 # the recent turns are never dropped, even above budget
+    assert [i["content"] for i in history.build()] == ["question 3", TOOL_OUTPUT, "done"]
+
+
+def test_state_round_trip():
+    history = HistoryManager(budget=100_000, keep_turns=1, max_item_tokens=50)
+    turn(history, "q1", tool=TOOL_OUTPUT)
+    turn(history, "q2")
+
+    restored = HistoryManager.from_state(history.to_state(), budget=100_000, keep_turns=1, max_item_tokens=50)
+    assert restored.build() == history.build() # placeholders are not compacted twice
+    handle = restored.build()[1]["content"].split("`")[-2]
+    assert restored.resolve(handle) == TOOL_OUTPUT
@@ -0,0 +1,33 @@
+# Usage: python -m test.hybrid_bench
+import time
+from statistics import median
+
+from src.sql_agent.rag.sql_rag import sql_retriever
+from src.sql_agent.rag.sparse import tokenize
+from src.logger import logger
+
+K = (1, 3, 5)
+
+# Keyword-heavy probes: a few words of the question + the two rarest identifiers of its SQL
+index = sql_retriever.sparse_index()
+probes = []
+for item in sql_retriever.queries_kb:
+    sql_tokens = sorted(set(tokenize(item["sql_answ"])), key=index._idf, reverse=True)[:2]
+    probes.append((" ".join(item["nl_quest"].split()[:5] + sql_tokens), item["nl_quest"]))
+
+for name, search in (("dense", sql_retriever.search), ("hybrid", sql_retriever.hybrid_search)):
+    search(probes[0][0]) # warm up
+    hits = {k: 0 for k in K}
+    latencies = []
+
+    for probe, target in probes:
+        start = time.perf_counter()
+        results = search(probe, top_k=max(K))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        ranked = [r["nl"] for r in results]
+        for k in K:
+            hits[k] += target in ranked[:k]
+
+    recalls = " | ".join(f"recall@{k}={hits[k] / len(probes):.2f}" for k in K)
+    logger.info(f"{name:>6}: {recalls} | p50={median(latencies):.2f}ms | max={max(latencies):.2f}ms")
@@ -0,0 +1,72 @@
+# Usage: python -m pytest test/hybrid_test.py
+import numpy as np
+import pytest
+
+from build.config import config
+from sql.utils.load_nl_sql_pairs import KBIndex
+from src.sql_agent.rag.sparse import BM25Index, tokenize
+from src.sql_agent.rag.sql_rag import SQLRetriever
+
+PAYLOADS = [
+    {"nl_quest": "scenes near rome", "sql_answ": "SELECT * FROM scenes WHERE ST_DWithin(geom, rome, 1000);"},
+    {"nl_quest": "true color previews", "sql_answ": "SELECT tci_10m FROM bands;"},
+    {"nl_quest": "count the scenes", "sql_answ": "SELECT count(*) FROM scenes;"},
+]
+
+
+class FakeEmbedder:
+    """Fixed vectors per text, orthogonal to the query unless listed"""
+    key = "fake"
+    embedding_dim = 2
+    vectors = {"query tci_10m": [1.0, 0.0], "true color previews": [0.6, 0.8]}
+
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return [self.vectors.get(t, [0.0, 1.0]) for t in texts]
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("ST_DWithin(geom)") == ["st_dwithin", "st", "dwithin", "geom"]
+
+
+def test_bm25_ranks_rare_identifiers_first():
+    index = BM25Index()
+    index.build([f"{p['nl_quest']}\n{p['sql_answ']}" for p in PAYLOADS], PAYLOADS)
+
+    results = index.search("TCI_10m previews of scenes")
+    assert results[0][0] is PAYLOADS[1]
+    assert [p["nl_quest"] for p, _ in index.search("dwithin")] == ["scenes near rome"]
+    assert index.search("nothing shared") == []
+
+
+@pytest.fixture
+def retriever(tmp_path, monkeypatch):
+    (tmp_path / "kb.sql").write_text("--count scenes\nSELECT count(*) FROM scenes;\n")
+    monkeypatch.setattr(config, "NUMPY_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(config, "HYBRID_ALPHA", 0.5)
+    retriever = SQLRetriever(None, aqclient=None, backend="numpy", embedder=FakeEmbedder(),
+                             kb=KBIndex([str(tmp_path)], cache_file=str(tmp_path / "kb.json")))
+    index = BM25Index()
+    index.build([f"{p['nl_quest']}\n{p['sql_answ']}" for p in PAYLOADS], PAYLOADS)
+    retriever.sparse_indexes["nl_to_sql"] = index
+    return retriever
+
+
+def test_fusion_scores(retriever):
+    dense = [retriever._to_result(PAYLOADS[0], 0.9)]
+    results = {r["nl"]: r for r in retriever._fuse("query tci_10m", dense, top_k=5)}
+
+    # dense-only: no BM25 contribution
+    assert results["scenes near rome"]["score"] == pytest.approx(0.5 * 0.9)
+    # sparse-only: best BM25 normalized to 1, dense score from an exact cosine of the embeddings
+    assert results["true color previews"]["sparse_score"] == pytest.approx(1.0)
+    assert results["true color previews"]["dense_score"] == pytest.approx(0.6)
+    assert results["true color previews"]["score"] == pytest.approx(0.5 * 0.6 + 0.5 * 1.0)
+    assert list(results)[0] == "true color previews"
+
+
+def test_fusion_top_k(retriever):
+    dense = [retriever._to_result(p, s) for p, s in zip(PAYLOADS, (0.9, 0.8, 0.7))]
+    results = retriever._fuse("scenes", dense, top_k=2)
+    assert len(results) == 2
+    assert results[0]["score"] >= results[1]["score"]
+    assert all(np.isfinite(r["score"]) for r in results)
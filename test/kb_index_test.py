@@ -0,0 +1,36 @@
+# Usage: python -m pytest test/kb_index_test.py
+import os
+
+from sql.utils.load_nl_sql_pairs import KBIndex
+
+KB = "--count scenes\nSELECT count(*) FROM sentinel_scenes;\n--last scene\nSELECT * FROM sentinel_scenes LIMIT 1;\n"
+
+
+def test_parse_and_warm_cache(tmp_path):
+    (tmp_path / "kb.sql").write_text(KB)
+    cache_file = str(tmp_path / "cache.json")
+    assert [e["nl_quest"] for e in KBIndex([str(tmp_path)], cache_file=cache_file).entries] == ["count scenes", "last scene"]
+    assert len(KBIndex([str(tmp_path)], cache_file=cache_file).entries) == 2 # from the parse cache
+
+
+def test_edits_are_picked_up_and_notified(tmp_path):
+    kb_file = tmp_path / "kb.sql"
+    kb_file.write_text(KB)
+    kb = KBIndex([str(tmp_path)], cache_file=str(tmp_path / "cache.json"), check_interval=0)
+    reloads = []
+    kb.on_reload(lambda: reloads.append(len(kb.entries)))
+    assert len(kb.entries) == 2
+
+    kb_file.write_text(KB + "--all platforms\nSELECT DISTINCT platform FROM sentinel_scenes;\n")
+    os.utime(kb_file, ns=(1, 1)) # mtime resolution of the filesystem
+    assert len(kb.entries) == 3
+    assert reloads == [3]
+
+
+def test_unchanged_files_do_not_reload(tmp_path):
+    (tmp_path / "kb.sql").write_text(KB)
+    kb = KBIndex([str(tmp_path)], cache_file=str(tmp_path / "cache.json"), check_interval=0)
+    reloads = []
+    kb.on_reload(lambda: reloads.append(1))
+    kb.entries, kb.entries
+    assert reloads == []
@@ -0,0 +1,45 @@
+# Usage: python -m pytest test/numpy_index_test.py
+import numpy as np
+
+from src.sql_agent.rag.numpy_index import NumpyIndex
+
+VECTORS = [[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [3.0, 3.0, 0.0]]
+PAYLOADS = [{"nl_quest": "x"}, {"nl_quest": "y"}, {"nl_quest": "xy"}]
+
+
+def test_exact_cosine_top_k():
+    index = NumpyIndex()
+    index.build([1, 2, 3], VECTORS, PAYLOADS)
+
+    results = index.search([5.0, 0.0, 0.0], top_k=2) # not normalized
+    assert [p["nl_quest"] for p, _ in results] == ["x", "xy"]
+    assert np.isclose(results[0][1], 1.0) and np.isclose(results[1][1], np.sqrt(0.5))
+    assert len(index.search([0.0, 1.0, 0.0], top_k=10)) == 3
+
+
+def test_add_skips_known_ids():
+    index = NumpyIndex()
+    assert index.add([1, 2], VECTORS[:2], PAYLOADS[:2]) == 2
+    assert index.add([2, 3], VECTORS[1:], PAYLOADS[1:]) == 1
+    assert index.ids == [1, 2, 3] and index.vectors.shape == (3, 3)
+    assert index.search([1.0, 1.0, 0.0], top_k=1)[0][0]["nl_quest"] == "xy"
+
+
+def test_empty_index():
+    index = NumpyIndex()
+    index.build([], [], [])
+    assert index.search([1.0, 0.0, 0.0]) == []
+
+
+def test_save_and_load(tmp_path):
+    index = NumpyIndex("kb", index_dir=str(tmp_path))
+    index.build([1, 2, 3], VECTORS, PAYLOADS, meta={"model": "m", "kb": "h1"})
+    index.save()
+
+    loaded = NumpyIndex("kb", index_dir=str(tmp_path))
+    assert loaded.exists() and not loaded.loaded
+    loaded.load()
+    assert loaded.meta == {"model": "m", "kb": "h1"}
+    assert loaded.ids == [1, 2, 3] and loaded.payloads == PAYLOADS
+    assert loaded.search([0.0, 1.0, 0.0], top_k=1)[0][0]["nl_quest"] == "y"
+    assert not list(tmp_path.glob("kb/*.tmp"))
@@ -0,0 +1,78 @@
+# Usage: LLM_OFFLINE=true python -m test.pipeline_bench [--turns 20]
+"""
+End-to-end turn latency with the scripted model: framework, retrieval and db overhead, no LLM network time.
+Compare runs on the same machine (and script) to catch regressions.
+"""
+import asyncio
+import json
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+from agents import set_tracing_disabled
+set_tracing_disabled(disabled=True)
+
+from build.config import config
+from src.sql_agent.agent import collector, executor, route_question
+from src.sql_agent.utils.repl import AgentRunner
+from src.sql_agent.utils.scripted_model import ScriptedModel
+from src.sql_agent.utils.telemetry import TelemetryHooks, format_summary
+from src.logger import logger
+
+QUESTIONS = [
+    "Find scenes covering Rome.",
+    "Show me the clearest images of Milan from the last three months.",
+    "How many scenes are in the catalog?",
+    "Give me the latest scenes with less than 10% clouds.",
+]
+
+
+async def main():
+    parser = ArgumentParser(description="Benchmark agent turns with the scripted model.")
+    parser.add_argument('--turns', type=int, default=20, help="Turns to run (questions are cycled).")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="Seconds per streamed token (0: pure overhead).")
+    args = parser.parse_args()
+
+    assert isinstance(config.MODEL, ScriptedModel), "Run with LLM_OFFLINE=true."
+    config.MODEL.token_latency = args.token_latency
+    config.MODEL.first_token_latency = args.token_latency
+
+    telemetry = TelemetryHooks(session_id="bench")
+    runner = AgentRunner(
+        starting_agent=collector,
+        hooks=telemetry,
+        enable_cli_prints=False,
+        replay_agent=executor,
+        router=route_question if config.ROUTER or config.PREFETCH else None,
+    )
+
+    latencies = []
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        async for _ in runner.stream_turn(QUESTIONS[turn % len(QUESTIONS)]):
+            pass
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    report = {
+        "turns": args.turns,
+        "token_latency": args.token_latency,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "first_turn_ms": round(latencies[0], 2), # cold caches
+        "by_route": runner.latency_report(),
+        "tokens": runner.token_report(),
+        "stages": telemetry.summary(),
+    }
+
+    logger.info(f"Turn latency: p50={report['p50_ms']}ms | p95={report['p95_ms']}ms | first={report['first_turn_ms']}ms")
+    print(format_summary(report["stages"]))
+
+    out = Path("data/bench") / f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    logger.info(f"Report saved to `{out}`")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+# Usage: python -m test.rag_benchmark --help
+"""
+Offline retrieval benchmark for SQLRetriever: recall@k, MRR and search latency
+on rule-based paraphrases of every KB question, across retriever backends,
+search modes (dense / hybrid) and embedding backends.
+
+No network needed: `numpy` is the in-process index and `qdrant-local` is the
+qdrant-client local mode (`QdrantClient(":memory:")`) standing in for the server.
+"""
+import json
+import random
+import re
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from build.config import config
+from build.embedding import load_embedding_model
+from src.sql_agent.rag.embedder import Embedder
+from src.sql_agent.rag.sql_rag import SQLRetriever
+from src.logger import logger
+
+K = (1, 3, 5)
+THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7)
+
+SYNONYMS = {
+    r"\bfind\b": ["show me", "list", "get"],
+    r"\bshow me\b": ["find", "give me"],
+    r"\bselect\b": ["get", "retrieve"],
+    r"\bsatellite scenes\b": ["satellite images", "sentinel acquisitions", "scenes"],
+    r"\bsatellite images?\b": ["satellite pictures", "sentinel scenes"],
+    r"\bscenes\b": ["images", "acquisitions"],
+    r"\bcovering\b": ["over", "that cover", "intersecting"],
+    r"\bclearest\b": ["least cloudy", "most cloud-free"],
+    r"\bclouds\b": ["cloud cover"],
+    r"\blast\b": ["past", "previous"],
+    r"\bfootprints?\b": ["coverage polygons", "scene geometries"],
+    r"\bwithin\b": ["closer than", "inside"],
+}
+TEMPLATES = ["{q}", "Could you {q}?", "I need to {q}", "{q}, please", "hey, {q}"]
+
+
+def paraphrases(question: str, *, n: int=4, seed: int=0) -> list[str]:
+    """Deterministic paraphrases: synonym substitutions wrapped in conversational templates"""
+    rng = random.Random(f"{seed}:{question}")
+    base = question.rstrip("?.").lower()
+    rules = [rule for rule in SYNONYMS if re.search(rule, base)]
+
+    variants = set()
+    for _ in range(n * 10):
+        text = base
+        for rule in rng.sample(rules, k=rng.randint(1, len(rules))) if rules else []:
+            text = re.sub(rule, rng.choice(SYNONYMS[rule]), text, count=1)
+        variant = rng.choice(TEMPLATES).format(q=text)
+        if variant.lower() != base:
+            variants.add(variant)
+        if len(variants) >= n:
+            break
+
+    return sorted(variants)
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def evaluate(retriever: SQLRetriever, search, probes: list[tuple[str, str]], collection_name: str) -> dict:
+    """Run every probe once (after a warm-up) and aggregate ranking metrics and latencies"""
+    search(probes[0][0], collection_name=collection_name, top_k=max(K))
+
+    hits = {k: 0 for k in K}
+    reciprocal_ranks, latencies = [], []
+    above = {t: 0 for t in THRESHOLDS}
+    wrong_above = {t: 0 for t in THRESHOLDS}
+
+    for probe, target in probes:
+        start = time.perf_counter()
+        results = search(probe, collection_name=collection_name, top_k=max(K))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        ranked = [r["nl"] for r in results]
+        rank = ranked.index(target) + 1 if target in ranked else None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        for k in K:
+            hits[k] += rank is not None and rank <= k
+
+        # what the retrieveQueries threshold would let through
+        for t in THRESHOLDS:
+            kept = [r for r in results if r["score"] >= t]
+            above[t] += any(r["nl"] == target for r in kept)
+            wrong_above[t] += sum(r["nl"] != target for r in kept)
+
+    n = len(probes)
+    return {
+        **{f"recall@{k}": hits[k] / n for k in K},
+        f"mrr@{max(K)}": sum(reciprocal_ranks) / n,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "mean": float(np.mean(latencies)),
+        },
+        "thresholds": {
+            str(t): {"recall": above[t] / n, "wrong_per_query": wrong_above[t] / n}
+            for t in THRESHOLDS
+        },
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Offline retrieval benchmark for the SQL few-shot RAG.")
+    parser.add_argument('--backends', nargs="+", default=["numpy", "qdrant-local"], choices=["numpy", "qdrant-local", "qdrant"], help="Retriever backends (`qdrant` needs the server).")
+    parser.add_argument('--embedders', nargs="+", default=[config.EMBEDDING_BACKEND], choices=["torch", "onnx", "onnx-int8"], help="Embedding backends.")
+    parser.add_argument('--paraphrases', type=int, default=4, help="Paraphrases per KB entry.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default="data/bench/rag_benchmark.json", help="Where to write the JSON report.")
+    args = parser.parse_args()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embedding_model": config.EMBEDDING_MODEL_NAME,
+        "hybrid_alpha": config.HYBRID_ALPHA,
+        "runs": [],
+    }
+
+    for embedder_backend in args.embedders:
+        model = (
+            config.EMBEDDING_MODEL if embedder_backend == config.EMBEDDING_BACKEND
+            else load_embedding_model(config.EMBEDDING_MODEL_NAME, embedder_backend, config.EMBEDDING_ONNX_INT8_FILE)
+        )
+        embedder = Embedder(model=model, backend=embedder_backend)
+
+        for backend in args.backends:
+            collection_name = f"bench_{embedder_backend.replace('-', '_')}"
+
+            if backend == "numpy":
+                retriever = SQLRetriever(backend="numpy", embedder=embedder)
+            else:
+                qclient = QdrantClient(":memory:") if backend == "qdrant-local" else config.QCLIENT
+                retriever = SQLRetriever(qclient, aqclient=None, backend="qdrant", embedder=embedder)
+
+            retriever.create_collection(collection_name, force_rebuild=True, quantization="none")
+            retriever.embed(collection_name)
+
+            probes = [
+                (p, item["nl_quest"])
+                for item in retriever.queries_kb
+                for p in paraphrases(item["nl_quest"], n=args.paraphrases, seed=args.seed)
+            ]
+
+            for mode, search in (("dense", retriever.search), ("hybrid", retriever.hybrid_search)):
+                metrics = evaluate(retriever, search, probes, collection_name)
+                report["runs"].append({
+                    "embedder": embedder_backend,
+                    "backend": backend,
+                    "mode": mode,
+                    "probes": len(probes),
+                    **metrics,
+                })
+                logger.info(
+                    f"{embedder_backend:>9} | {backend:>12} | {mode:>6} | "
+                    f"R@1={metrics['recall@1']:.2f} R@5={metrics['recall@5']:.2f} MRR={metrics['mrr@5']:.2f} | "
+                    f"p50={metrics['latency_ms']['p50']:.2f}ms p99={metrics['latency_ms']['p99']:.2f}ms"
+                )
+
+            if backend == "qdrant":
+                retriever.qclient.delete_collection(collection_name)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    logger.info(f"Report written to `{out}`.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# Usage: python -m test.retrieval_bench
+import time
+from statistics import median, quantiles
+
+from src.sql_agent.rag.sql_rag import SQLRetriever
+from src.logger import logger
+
+RUNS = 20
+
+backends = {name: SQLRetriever(backend=name) for name in ("numpy", "qdrant")}
+questions = [item["nl_quest"] for item in backends["numpy"].queries_kb]
+
+# Warm up: embedding cache, index mmap, http connection
+for retriever in backends.values():
+    retriever.search(questions[0])
+
+top1 = {}
+for name, retriever in backends.items():
+    latencies = []
+    for _ in range(RUNS):
+        for question in questions:
+            start = time.perf_counter()
+            results = retriever.search(question, top_k=5)
+            latencies.append((time.perf_counter() - start) * 1000)
+    top1[name] = [retriever.search(q, top_k=1)[0]["nl"] for q in questions]
+
+    p95 = quantiles(latencies, n=20)[-1]
+    logger.info(f"{name:>6}: {len(latencies)} searches | p50={median(latencies):.3f}ms | p95={p95:.3f}ms")
+
+agreement = sum(a == b for a, b in zip(top1["numpy"], top1["qdrant"])) / len(questions)
+logger.info(f"Top-1 agreement numpy vs qdrant: {agreement:.2%}")
@@ -0,0 +1,18 @@
+# Usage: python -m test.schema_rag_bench
+from src.sql_agent.tools import get_tables, get_full_metadata
+from src.sql_agent.rag.schema_rag import schema_retriever
+from src.sql_agent.utils.tokens import count_tokens
+from src.sql_agent.rag.kb import kb_index
+from src.logger import logger
+
+tables = get_tables()
+full_tokens = count_tokens(get_full_metadata(tables))
+
+reductions = []
+for item in kb_index.entries:
+    relevant = schema_retriever.format(schema_retriever.search(item["nl_quest"], tables=tables))
+    relevant_tokens = count_tokens(relevant)
+    reductions.append(1 - relevant_tokens / full_tokens)
+    logger.info(f"{full_tokens:>5} -> {relevant_tokens:>5} tokens | {item['nl_quest']}")
+
+logger.info(f"Mean metadata token reduction per question: {sum(reductions) / len(reductions):.1%}")
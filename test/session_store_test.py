@@ -0,0 +1,101 @@
+# Usage: python -m pytest test/session_store_test.py
+import threading
+
+from src.sql_agent.utils.session_store import SessionStore, SQLiteSessionStore, WriteBehindStore
+
+
+class MemoryStore(SessionStore):
+    """In-memory backend; `save_many` can be held open on `release` or made to fail"""
+
+    def __init__(self):
+        self.states: dict[str, dict] = {}
+        self.batches: list[dict] = []
+        self.fail = False
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def load(self, session_id: str) -> dict | None:
+        return self.states.get(session_id)
+
+    def save_many(self, states: dict[str, dict]) -> None:
+        self.entered.set()
+        self.release.wait()
+        if self.fail:
+            raise RuntimeError("backend down")
+        self.batches.append(dict(states))
+        self.states.update(states)
+
+    def delete(self, session_id: str) -> None:
+        self.states.pop(session_id, None)
+
+    def purge(self, older_than: float) -> int:
+        return 0
+
+
+def test_saves_are_coalesced_into_one_batch():
+    backend = MemoryStore()
+    store = WriteBehindStore(backend, flush_interval=3600)
+    store.save("a", {"turn": 1})
+    store.save("a", {"turn": 2})
+    store.save("b", {"turn": 1})
+    assert store.load("a") == {"turn": 2} and backend.states == {} # pending, seen before the backend
+
+    store.stop()
+    assert backend.batches == [{"a": {"turn": 2}, "b": {"turn": 1}}]
+    assert store.load("a") == {"turn": 2} and store.writes == 2
+
+
+def test_failed_flush_is_retried_without_overwriting_newer_states():
+    backend = MemoryStore()
+    store = WriteBehindStore(backend, flush_interval=3600)
+    store.save("a", {"turn": 1})
+    store.save("b", {"turn": 1})
+
+    backend.fail = True
+    backend.release.clear()
+    flush = threading.Thread(target=store.flush)
+    flush.start()
+    backend.entered.wait(5)
+    assert store.load("a") == {"turn": 1} # in flight, still visible
+    store.save("a", {"turn": 2})
+    backend.release.set()
+    flush.join(5)
+    assert store.errors == 1
+
+    backend.fail = False
+    store.stop()
+    assert backend.states == {"a": {"turn": 2}, "b": {"turn": 1}}
+
+
+def test_delete_during_a_flush_is_not_resurrected():
+    backend = MemoryStore()
+    store = WriteBehindStore(backend, flush_interval=3600)
+    store.save("a", {"turn": 1})
+
+    backend.release.clear()
+    flush = threading.Thread(target=store.flush)
+    flush.start()
+    backend.entered.wait(5)
+    delete = threading.Thread(target=store.delete, args=("a",))
+    delete.start()
+    delete.join(0.05)
+    assert delete.is_alive() # waits for the flush holding "a"
+    backend.release.set()
+    flush.join(5)
+    delete.join(5)
+
+    store.stop()
+    assert store.load("a") is None and backend.states == {}
+
+
+def test_background_writer_and_sqlite_backend(tmp_path):
+    store = WriteBehindStore(SQLiteSessionStore(str(tmp_path / "sessions.sqlite3")), flush_interval=0.01)
+    store.save("a", {"entries": [{"role": "user", "content": "ciao"}]})
+    store.stop(timeout=5)
+
+    reopened = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    assert reopened.load("a") == {"entries": [{"role": "user", "content": "ciao"}]}
+    assert reopened.purge(older_than=3600) == 0
+    reopened.delete("a")
+    assert reopened.load("a") is None
@@ -0,0 +1,61 @@
+# Usage: python -m pytest test/turn_gate_test.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from scripts.server import TurnGate
+
+
+async def hold(gate: TurnGate, release: asyncio.Event) -> None:
+    async with gate.turn():
+        await release.wait()
+
+
+async def until(condition) -> None:
+    while not condition():
+        await asyncio.sleep(0.001)
+
+
+def test_queue_limit_and_timeout():
+    async def scenario():
+        gate = TurnGate(max_active=1, max_queued=1, timeout=0.05)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(gate, release))
+        await until(lambda: gate.active == 1)
+
+        queued = asyncio.create_task(hold(gate, release))
+        await until(lambda: gate.waiting == 1)
+        with pytest.raises(HTTPException) as refused: # queue full
+            gate.check()
+        assert refused.value.status_code == 503
+
+        with pytest.raises(HTTPException): # waited longer than `timeout`
+            await queued
+        assert gate.waiting == 0 and gate.rejected == 2
+
+        release.set()
+        await running
+        assert gate.active == 0 and len(gate.latencies) == 1
+
+    asyncio.run(scenario())
+
+
+def test_drain_waits_for_running_turns_and_refuses_new_ones():
+    async def scenario():
+        gate = TurnGate(max_active=2, max_queued=2, timeout=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(gate, release))
+        await until(lambda: gate.active == 1)
+
+        assert not await gate.drain(0.05) # still running
+        with pytest.raises(HTTPException) as refused:
+            async with gate.turn():
+                pass
+        assert refused.value.detail == "Server shutting down."
+
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        assert await gate.drain(1)
+        await running
+
+    asyncio.run(scenario())